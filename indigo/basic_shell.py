@@ -1,26 +1,234 @@
-
+import sys
+import asyncio
 import subprocess
+from os import cpu_count
+from queue import Queue
+from threading import Thread, Lock
+from collections import deque
+from concurrent.futures import Future, CancelledError
 from typing import Callable
-from dataclasses import dataclass
+from functools import cache
+from dataclasses import dataclass, field
 
 from indigo.filesystem import PathLike, get_file_name
 
+# lines of stdout/stderr kept in memory per watched command
+_Output_Tail_Lines = 256
+# longest output line kept in memory, longer ones are only spilled to log
+_Output_Line_Limit = 1 << 20
+# bytes read from stdout/stderr at once
+_Output_Chunk_Size = 1 << 16
+
+class _Shell_Timeout(TimeoutError):
+    pass
+
+@cache
+def _Kernel32():
+    import ctypes
+    from ctypes import wintypes
+
+    class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+        _fields_ = [
+            ('cb', wintypes.DWORD),
+            ('PageFaultCount', wintypes.DWORD),
+            ('PeakWorkingSetSize', ctypes.c_size_t),
+            ('WorkingSetSize', ctypes.c_size_t),
+            ('QuotaPeakPagedPoolUsage', ctypes.c_size_t),
+            ('QuotaPagedPoolUsage', ctypes.c_size_t),
+            ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t),
+            ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+            ('PagefileUsage', ctypes.c_size_t),
+            ('PeakPagefileUsage', ctypes.c_size_t),
+        ]
+
+    kernel32 = ctypes.WinDLL('kernel32')
+    kernel32.OpenProcess.argtypes = [ wintypes.DWORD, wintypes.BOOL, wintypes.DWORD ]
+    kernel32.OpenProcess.restype = wintypes.HANDLE
+    kernel32.CloseHandle.argtypes = [ wintypes.HANDLE ]
+    kernel32.K32GetProcessMemoryInfo.argtypes = [ wintypes.HANDLE, ctypes.POINTER(PROCESS_MEMORY_COUNTERS), wintypes.DWORD ]
+    kernel32.PROCESS_MEMORY_COUNTERS = PROCESS_MEMORY_COUNTERS
+    return kernel32
+
+# PROCESS_QUERY_LIMITED_INFORMATION, enough for memory counters
+_Process_Query_Access = 0x1000
+
+def _Open_Process(pid: int) -> int|None:
+    """
+        Opens handle of process @pid, its counters stay readable after it exits until the handle is closed.
+        Only available on Windows, None elsewhere or if the process can't be opened.
+    """
+    if sys.platform != 'win32' or not pid:
+        return None
+    try:
+        return _Kernel32().OpenProcess(_Process_Query_Access, False, pid) or None
+    except (AttributeError, OSError):
+        return None
+
+def _Close_Process(handle: int):
+    _Kernel32().CloseHandle(handle)
+
+def _Peak_Rss(handle: int) -> int|None:
+    """
+        Returns peak working set in bytes of exited process opened by _Open_Process().
+    """
+    import ctypes
+    kernel32 = _Kernel32()
+    counters = kernel32.PROCESS_MEMORY_COUNTERS()
+    counters.cb = ctypes.sizeof(counters)
+    try:
+        if kernel32.K32GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+            return counters.PeakWorkingSetSize
+    except (AttributeError, OSError, ValueError):
+        pass
+    return None
+
+_Shell_Engine_Instance = None
+_Shell_Engine_Lock = Lock()
+class _Shell_Engine:
+    """
+        Runs subprocesses on an asyncio event loop in a background thread.
+        At most @slots processes run at once, the others wait on a semaphore.
+        Coroutines are the engine, _Shell_Exec and _Async_Command are the synchronous facade.
+    """
+    def __init__(self, slots: int = 0):
+        self.slots = slots or cpu_count()
+        self._loop = asyncio.new_event_loop()
+        self._semaphore: asyncio.Semaphore = None
+        self._thread = Thread(target=self._loop.run_forever, name='indigo: shell engine', daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def _Instance() -> '_Shell_Engine':
+        global _Shell_Engine_Instance
+        with _Shell_Engine_Lock:
+            if not _Shell_Engine_Instance:
+                _Shell_Engine_Instance = _Shell_Engine()
+            return _Shell_Engine_Instance
+
+    def resize(self, slots: int):
+        """
+            Sets number of concurrent processes, processes that are already running are not affected.
+        """
+        self.slots = slots or cpu_count()
+        self._semaphore = None
+
+    def _Semaphore(self) -> asyncio.Semaphore:
+        # created lazily on the loop thread
+        if not self._semaphore:
+            self._semaphore = asyncio.Semaphore(self.slots)
+        return self._semaphore
+
+    async def run_async(self,
+        executable: PathLike,
+        args: tuple|list,
+        line_parser: Callable[[str], None] = None,
+        log: PathLike = None,
+        timeout: float = None,
+        tail_lines: int|None = _Output_Tail_Lines,
+        on_exit: Callable[[int|None], None] = None
+    ) -> tuple[str, str, int]:
+        """
+            Runs @executable with @args (args[0] is the program name) once a slot is free.
+            Streams stdout lines to @line_parser, spills raw output to @log
+                and keeps only the last @tail_lines lines in memory, all of them if None.
+            Kills the process and raises _Shell_Timeout if it runs longer than @timeout seconds.
+            Kills the process if cancelled.
+            @on_exit is called with peak working set of the exited process in bytes, None if it's unknown.
+        """
+        async with self._Semaphore():
+            process = await asyncio.create_subprocess_exec(
+                *args,
+                executable=executable,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+            # counters of exited process are read through own handle
+            handle = _Open_Process(process.pid) if on_exit else None
+            spill = open(log, 'wb') if log else None
+            try:
+                stdout = deque(maxlen=tail_lines)
+                stderr = deque(maxlen=tail_lines)
+
+                async def pump(stream: asyncio.StreamReader, tail: deque, feed: Callable[[str], None]):
+                    # every byte is spilled, lines longer than _Output_Line_Limit are left out of tail
+                    def line(raw: bytes, complete: bool = True):
+                        if spill:
+                            spill.write(raw + b'\n' if complete else raw)
+                        if len(raw) > _Output_Line_Limit:
+                            return
+                        text = raw.decode(errors='replace').rstrip('\r')
+                        tail.append(text)
+                        if feed:
+                            feed(text)
+
+                    pending = b''
+                    overlong = False
+                    while True:
+                        chunk = await stream.read(_Output_Chunk_Size)
+                        if not chunk:
+                            if overlong and spill:
+                                spill.write(pending)
+                            elif pending and not overlong:
+                                line(pending, complete=False)
+                            return
+                        *lines, pending = (pending + chunk).split(b'\n')
+                        for raw in lines:
+                            if overlong:
+                                # rest of the dropped line
+                                overlong = False
+                                if spill:
+                                    spill.write(raw + b'\n')
+                                continue
+                            line(raw)
+                        if len(pending) > _Output_Line_Limit:
+                            if spill:
+                                spill.write(pending)
+                            pending = b''
+                            overlong = True
+
+                try:
+                    _, _, returncode = await asyncio.wait_for(
+                        asyncio.gather(pump(process.stdout, stdout, line_parser), pump(process.stderr, stderr, None), process.wait()),
+                        timeout
+                    )
+                except asyncio.TimeoutError:
+                    raise _Shell_Timeout(f'{get_file_name(executable)} timed out after {timeout}s')
+                if on_exit:
+                    on_exit(_Peak_Rss(handle) if handle else None)
+                return '\n'.join(stdout).strip(), '\n'.join(stderr).strip(), returncode
+            finally:
+                if process.returncode is None:
+                    process.kill()
+                    await process.wait()
+                if spill:
+                    spill.close()
+                if handle:
+                    _Close_Process(handle)
+
+    def submit(self, coroutine) -> Future:
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+    def run(self, executable: PathLike, args: tuple|list, timeout: float = None) -> tuple[str, str, int]:
+        """
+            Synchronous facade of run_async(), whole output is returned.
+        """
+        return self.submit(self.run_async(executable, args, timeout=timeout, tail_lines=None)).result()
+
 def _Shell_Exec(
     executable: PathLike,
     args: tuple|str = tuple(), 
     logger: Callable[[str, str, str], None] = None,
-    parser: Callable[[str, str, int], tuple[str, str, int]] = None
+    parser: Callable[[str, str, int], tuple[str, str, int]] = None,
+    timeout: float = None
 ) -> tuple[str, str, int]:
     assert executable
 
     if logger:
         logger(get_file_name(executable), None, ' '.join(args))
 
-    r = subprocess.run(executable=executable, args=args, capture_output=True)
-    
-    stdout = r.stdout.decode().strip()
-    stderr = r.stderr.decode().strip()
-    returncode = r.returncode
+    if isinstance(args, str):
+        args = args.split(' ')
+    stdout, stderr, returncode = _Shell_Engine._Instance().run(executable, args, timeout)
 
     if parser:
         return parser(stdout, stderr, returncode)
@@ -31,41 +239,45 @@ def _Shell_Exec(
 class _Async_Command:
     name: str
     executable: PathLike
-    process: subprocess.Popen = None
     logger: Callable[[str, str, tuple|str], None] = None
     parser: Callable[[str, str, int], tuple[str, str, int]] = None
+    # called for every stdout line while the process runs
+    line_parser: Callable[[str], None] = None
+    # raw output is spilled to this file
+    log: PathLike = None
+    # peak working set of the process in bytes, set once it exits if known
+    peak_rss: int = None
 
-    def _Await(self, input = None, timeout = None) -> tuple[str, str, int]:
-        returncode = 0
-        stdout = b''
-        stderr = b''
-        with self.process:
-            try:
-                stdout, stderr = self.process.communicate(input=input, timeout=timeout)
-            except subprocess.TimeoutExpired as exc:
-                self.process.kill()
-                if subprocess._mswindows:
-                    # Windows accumulates the output in a single blocking
-                    # read() call run on child threads, with the timeout
-                    # being done in a join() on those threads.  communicate()
-                    # _after_ kill() is required to collect that and add it
-                    # to the exception.
-                    exc.stdout, exc.stderr = self.process.communicate()
-                else:
-                    # POSIX _communicate already populated the output so
-                    # far into the TimeoutExpired exception.
-                    self.process.wait()
-                raise
-            except:  # Including KeyboardInterrupt, communicate handled that.
-                self.process.kill()
-                # We don't call process.wait() as .__exit__ does that for us.
-                raise
-            returncode = self.process.poll()
-
-        self.logger('await', self.name, '')
-        
-        stdout = stdout.decode().strip()
-        stderr = stderr.decode().strip()
+    _future: Future = field(default=None, init=False, repr=False)
+
+    def _Start(self, args: tuple|list, timeout: float = None):
+        def on_exit(peak_rss: int|None):
+            self.peak_rss = peak_rss
+
+        self._future = _Shell_Engine._Instance().submit(
+            _Shell_Engine._Instance().run_async(self.executable, args, self.line_parser, self.log, timeout, on_exit=on_exit)
+        )
+
+    def _Watch(self, completed: Queue, token = None):
+        """
+            Puts @token (or self) onto @completed as soon as the process exits, is killed or fails to start,
+                so that the caller can reap whichever command finishes first.
+        """
+        assert self._future
+        self._future.add_done_callback(lambda _: completed.put(self if token is None else token))
+
+    def _Cancel(self):
+        """
+            Kills the process, or drops it if it still waits for a slot. _Await() raises CancelledError then.
+        """
+        self._future.cancel()
+
+    def _Await(self) -> tuple[str, str, int]:
+        return self._Parse(*self._future.result())
+
+    def _Parse(self, stdout: str, stderr: str, returncode: int) -> tuple[str, str, int]:
+        if self.logger:
+            self.logger('await', self.name, '')
 
         if self.parser:
             return self.parser(stdout, stderr, returncode)
@@ -77,19 +289,26 @@ def _Shell_Exec_Async(
     executable: PathLike,
     args: tuple|str = tuple(), 
     logger: Callable[[str, str, str], None] = None,
-    parser: Callable[[str, str, int], tuple[str, str, int]] = None
+    parser: Callable[[str, str, int], tuple[str, str, int]] = None,
+    line_parser: Callable[[str], None] = None,
+    log: PathLike = None,
+    timeout: float = None
 ) -> _Async_Command:
+    """
+        Starts @executable on the shell engine, process is launched once a slot is free.
+    """
     if logger:
         logger('async', name, ' '.join(args))
 
-    return _Async_Command(
+    if isinstance(args, str):
+        args = args.split(' ')
+    command = _Async_Command(
         name=name,
         executable=executable,
-        process=subprocess.Popen(executable=executable, 
-                                args=args, 
-                                stdout=subprocess.PIPE, 
-                                stderr=subprocess.PIPE
-                                ),
         logger=logger,
-        parser=parser
+        parser=parser,
+        line_parser=line_parser,
+        log=log
     )
+    command._Start(args, timeout)
+    return command
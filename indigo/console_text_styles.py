@@ -1,4 +1,8 @@
 from typing import Iterable, Callable
+from threading import RLock
+
+# build jobs print their output from background threads
+_Print_Lock = RLock()
 
 # https://svn.blender.org/svnroot/bf-blender/trunk/blender/build_files/scons/tools/bcolors.py
 class _Console_Text_Styles:
@@ -80,23 +84,24 @@ def cts_print(
         prefix += f': {subsection_style(subsection)} '
     prefix += '>'
 
-    for textline in (text.split('\n') if isinstance(text, str) else text):
-        line = prefix
-        current_width = width - len(tab)
-        for textword in (textline.split(' ') if isinstance(text, str) else text):
-            if not isinstance(textword, str):
-                textword = str(textword)
-
-            new_line_length = len(line) + len(textword) + 1
-            
-            if new_line_length < current_width:
-                line += ' '
-                line += text_style(textword)
-                continue
-            
+    with _Print_Lock:
+        for textline in (text.split('\n') if isinstance(text, str) else text):
+            line = prefix
+            current_width = width - len(tab)
+            for textword in (textline.split(' ') if isinstance(text, str) else text):
+                if not isinstance(textword, str):
+                    textword = str(textword)
+
+                new_line_length = len(line) + len(textword) + 1
+                
+                if new_line_length < current_width:
+                    line += ' '
+                    line += text_style(textword)
+                    continue
+                
+                print(line)
+                line = f'{tab}  ` ' + text_style(textword)
             print(line)
-            line = f'{tab}  ` ' + text_style(textword)
-        print(line)
 
 def cts_print_info(text: str, section: str = '', tab='  '):
     cts_print(text=text, section=section, tab=tab)
@@ -112,9 +117,10 @@ def cts_print_note(text: str, section: str = '', tab: str = '  '):
 
 def cts_print_subprocess(result: tuple[str, str, int], tab: str = '  '):
     stdout, stderr, returncode = result
-    cts_print(text=stdout, section='out', section_style=cts_okgreen, tab=tab)
-    cts_print(text=stderr, section='err', section_style=cts_fail, tab=tab)
-    cts_print(text=str(returncode), section='int', section_style=cts_okcyan, tab=tab)
+    with _Print_Lock:
+        cts_print(text=stdout, section='out', section_style=cts_okgreen, tab=tab)
+        cts_print(text=stderr, section='err', section_style=cts_fail, tab=tab)
+        cts_print(text=str(returncode), section='int', section_style=cts_okcyan, tab=tab)
 
 
 def cts_print_config_category(category: str):
@@ -0,0 +1,311 @@
+import os
+import json
+from time import time
+from typing import Callable, NamedTuple
+
+from indigo.filesystem import PathLike, get_file_name
+from indigo.console_text_styles import *
+
+class TargetStarted(NamedTuple):
+    target: str
+    configuration: str|None
+    # False if there were no changes since last build
+    building: bool
+
+class TargetFinished(NamedTuple):
+    target: str
+    configuration: str|None
+    elapsed: float
+    succeeded: bool
+
+class TargetCleaned(NamedTuple):
+    target: str
+    configuration: str|None
+
+class TestsStarted(NamedTuple):
+    target: str
+    configuration: str|None
+    # False if there were no changes since last build
+    running: bool
+
+class TestStarted(NamedTuple):
+    target: str
+    configuration: str|None
+    test: PathLike
+
+class TestFinished(NamedTuple):
+    target: str
+    configuration: str|None
+    test: PathLike
+    returncode: int
+
+class JobQueued(NamedTuple):
+    name: str
+    # f.e. 'CL.EXE', or path of executed unit test
+    tool: str
+
+class JobStarted(NamedTuple):
+    name: str
+    tool: str
+    # host:port of remote worker, None if the job runs locally
+    worker: str|None
+
+class JobFinished(NamedTuple):
+    name: str
+    tool: str
+    succeeded: bool
+    # None if the job was not launched or output was not parsed
+    returncode: int|None
+    # seconds between launch and reap, 0 if the job was not launched
+    duration: float
+    # peak working set of the process in bytes, None if unknown
+    peak_rss: int|None
+    worker: str|None
+    # False if outputs were up to date or a dependency failed
+    launched: bool
+
+class CacheLookup(NamedTuple):
+    name: str
+    tool: str
+    key: str|None
+    hit: bool
+
+class Linked(NamedTuple):
+    name: str
+    # 'LINK.EXE' or 'LIB.EXE'
+    tool: str
+    output: PathLike
+    succeeded: bool
+    duration: float
+    # False if inputs were unchanged and the output was kept
+    launched: bool
+
+Event = TargetStarted|TargetFinished|TargetCleaned|TestsStarted|TestStarted|TestFinished \
+    |JobQueued|JobStarted|JobFinished|CacheLookup|Linked
+
+# event type => handlers, None => handlers of every event
+_Subscribers: dict[type|None, list[Callable[[Event], None]]] = dict()
+# event types with at least one handler, checked before an event is even constructed
+_Listened: set[type] = set()
+_Events = (TargetStarted, TargetFinished, TargetCleaned, TestsStarted, TestStarted, TestFinished,
+           JobQueued, JobStarted, JobFinished, CacheLookup, Linked)
+
+def _Update_Listened():
+    _Listened.clear()
+    for kind, handlers in _Subscribers.items():
+        if handlers:
+            _Listened.update(_Events if kind is None else (kind, ))
+
+def subscribe(handler: Callable[[Event], None], *kinds: type) -> Callable[[Event], None]:
+    """
+        Calls @handler with every emitted event of @kinds, or of any kind if none are given.
+        Handlers run on the thread that emits, i.e. the one awaiting build jobs.
+        Returns @handler.
+    """
+    for kind in kinds or (None, ):
+        assert kind is None or kind in _Events, f'not an event type: {kind}'
+        _Subscribers.setdefault(kind, list()).append(handler)
+    _Update_Listened()
+    return handler
+
+def unsubscribe(handler: Callable[[Event], None]):
+    """
+        Detaches @handler from all event kinds, calls its close() if it has one.
+    """
+    for handlers in _Subscribers.values():
+        while handler in handlers:
+            handlers.remove(handler)
+    _Update_Listened()
+    if hasattr(handler, 'close'):
+        handler.close()
+
+def close_subscribers():
+    """
+        Detaches all handlers, subscribers flush their files on close().
+    """
+    handlers = dict.fromkeys(h for handlers in _Subscribers.values() for h in handlers)
+    for handler in handlers:
+        unsubscribe(handler)
+
+def listening(kind: type) -> bool:
+    """
+        Returns False if no handler would receive event of @kind, emitters skip building it then.
+    """
+    return kind in _Listened
+
+def emit(event: Event):
+    if type(event) not in _Listened:
+        return
+    for handler in (*_Subscribers.get(type(event), ()), *_Subscribers.get(None, ())):
+        try:
+            handler(event)
+        except Exception as e:
+            # broken hook must not break the build
+            cts_print_warning(section='events', text=f'{handler} :: {type(e).__name__}: {e}, unsubscribed')
+            unsubscribe(handler)
+
+
+def _Display_Name(event: Event) -> str:
+    return f'{event.target}:{event.configuration}' if event.configuration else event.target
+
+def _Test_Case(test: PathLike) -> str:
+    return get_file_name(test, strip_ext=True)[len('test_'):]
+
+class ConsoleSubscriber:
+    """
+        Prints target and test progress.
+    """
+    kinds = (TargetStarted, TargetFinished, TargetCleaned, TestsStarted, TestStarted, TestFinished)
+
+    def __call__(self, event: Event):
+        display_name = _Display_Name(event)
+        match event:
+            case TargetStarted(building=True):
+                text = f'building :: {cts_warning("started")}'
+            case TargetStarted():
+                text = f'building :: {cts_underline("no changes since last build")}'
+            case TargetFinished(succeeded=True):
+                text = f'building :: {cts_okgreen("finished")} in {event.elapsed:.3f}s'
+            case TargetFinished():
+                # failures are reported by the jobs
+                return
+            case TargetCleaned():
+                text = f'cleaning :: {cts_okgreen("successful")}'
+            case TestsStarted(running=True):
+                text = 'testing ;;'
+            case TestsStarted():
+                text = f'testing :: {cts_underline("no changes since last build")}'
+            case TestStarted():
+                text = f'testing :: case {_Test_Case(event.test)}'
+            case TestFinished():
+                result = cts_okgreen('SUCCESS') if event.returncode == 0 else cts_fail('FAILURE')
+                text = f'testing :: case {_Test_Case(event.test)} ;; {result}'
+            case _:
+                return
+        cts_print(section='project', subsection=display_name, text=text)
+
+class JsonLinesSubscriber:
+    """
+        Appends every event to @path as a JSON object per line, with its type and unix time.
+    """
+    def __init__(self, path: PathLike):
+        self.path = path
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def __call__(self, event: Event):
+        record = dict(event=type(event).__name__, time=round(time(), 6), **event._asdict())
+        self._file.write(json.dumps(record, separators=(',', ':')) + '\n')
+
+    def close(self):
+        self._file.close()
+
+def _Value(value: float) -> str:
+    # integral values are printed without exponent, f.e. peak rss
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+def _Label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class PrometheusSubscriber:
+    """
+        Aggregates events into metrics written to @path in Prometheus text format,
+            f.e. for node_exporter textfile collector.
+        File is replaced atomically whenever a target finishes and on close().
+    """
+    # name => (type, help)
+    _Metrics = {
+        'indigo_jobs_total': ('counter', 'Finished build jobs by tool and result.'),
+        'indigo_job_duration_seconds_sum': ('counter', 'Total duration of launched jobs.'),
+        'indigo_job_duration_seconds_count': ('counter', 'Number of launched jobs.'),
+        'indigo_job_peak_rss_bytes': ('gauge', 'Largest peak working set of a job.'),
+        'indigo_remote_jobs_total': ('counter', 'Jobs run by remote workers.'),
+        'indigo_cache_lookups_total': ('counter', 'Remote cache lookups by result.'),
+        'indigo_links_total': ('counter', 'Links and archives by tool and result.'),
+        'indigo_tests_total': ('counter', 'Unit test runs by result.'),
+        'indigo_target_build_seconds': ('gauge', 'Duration of the last build of a target.'),
+        'indigo_targets_total': ('counter', 'Finished target builds by result.'),
+    }
+
+    def __init__(self, path: PathLike):
+        self.path = path
+        # name => labels => value
+        self._samples: dict[str, dict[tuple, float]] = { name: dict() for name in self._Metrics }
+
+    def _Add(self, name: str, value: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        self._samples[name][key] = self._samples[name].get(key, 0) + value
+
+    def _Set(self, name: str, value: float, **labels):
+        self._samples[name][tuple(sorted(labels.items()))] = value
+
+    def __call__(self, event: Event):
+        match event:
+            case JobFinished():
+                result = ('succeeded' if event.succeeded else 'failed') if event.launched else 'skipped'
+                self._Add('indigo_jobs_total', tool=event.tool, result=result)
+                if event.launched:
+                    self._Add('indigo_job_duration_seconds_sum', event.duration, tool=event.tool)
+                    self._Add('indigo_job_duration_seconds_count', tool=event.tool)
+                if event.peak_rss:
+                    key = (('tool', event.tool), )
+                    peaks = self._samples['indigo_job_peak_rss_bytes']
+                    peaks[key] = max(peaks.get(key, 0), event.peak_rss)
+                if event.worker:
+                    self._Add('indigo_remote_jobs_total', worker=event.worker)
+            case CacheLookup():
+                self._Add('indigo_cache_lookups_total', result='hit' if event.hit else 'miss')
+            case Linked():
+                self._Add('indigo_links_total', tool=event.tool, result='succeeded' if event.succeeded else 'failed')
+            case TestFinished():
+                self._Add('indigo_tests_total', result='passed' if event.returncode == 0 else 'failed')
+            case TargetFinished():
+                self._Add('indigo_targets_total', result='succeeded' if event.succeeded else 'failed')
+                self._Set('indigo_target_build_seconds', event.elapsed,
+                          target=event.target, configuration=event.configuration or '')
+                self.write()
+
+    def write(self):
+        lines = []
+        for name, (kind, help) in self._Metrics.items():
+            if not self._samples[name]:
+                continue
+            lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in sorted(self._samples[name].items()):
+                labels = ','.join(f'{k}="{_Label(v)}"' for k, v in labels)
+                lines.append(f'{name}{{{labels}}} {_Value(value)}' if labels else f'{name} {_Value(value)}')
+        temporary = f'{self.path}.{os.getpid()}'
+        with open(temporary, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        # collectors must never read a partial file
+        os.replace(temporary, self.path)
+
+    def close(self):
+        self.write()
+
+# target and test progress is printed unless console subscriber is detached
+_Console = subscribe(ConsoleSubscriber(), *ConsoleSubscriber.kinds)
+
+
+if __name__ == '__main__':
+    import tempfile
+
+    received = []
+    hook = subscribe(received.append, JobFinished)
+    assert listening(JobFinished) and not listening(JobQueued)
+    emit(JobQueued('a.obj', 'CL.EXE'))
+    emit(JobFinished('a.obj', 'CL.EXE', True, 0, 0.5, 1 << 20, None, True))
+    assert [ type(e) for e in received ] == [ JobFinished ], received
+    unsubscribe(hook)
+    assert not listening(JobFinished)
+
+    with tempfile.TemporaryDirectory() as directory:
+        metrics = subscribe(PrometheusSubscriber(os.path.join(directory, 'indigo.prom')))
+        emit(CacheLookup('a.obj', 'CL.EXE', None, True))
+        emit(TargetFinished('a', None, 1.5, True))
+        unsubscribe(metrics)
+        with open(metrics.path) as f:
+            content = f.read()
+        assert 'indigo_cache_lookups_total{result="hit"} 1' in content, content
+        assert 'indigo_target_build_seconds{configuration="",target="a"} 1.5' in content, content
+    print('ok')
@@ -1,12 +1,52 @@
 from os import PathLike
+from typing import Iterable
 import os
+import re
+import sys
+import json
+import mmap
 import shutil
+from functools import cache
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# directory root => resolved root, once per invocation
+_Resolved_Roots: dict[PathLike, PathLike] = dict()
+# join() arguments => interned result
+_Joined_Paths: dict[tuple[PathLike], PathLike] = dict()
+
+def _Resolve_Root(root: PathLike) -> PathLike:
+    resolved = _Resolved_Roots.get(root)
+    if resolved is None:
+        resolved = sys.intern(os.path.normpath(os.path.realpath(root)))
+        _Resolved_Roots[root] = resolved
+    return resolved
+
+def _Realpath_Join(*parts: PathLike) -> PathLike:
+    """
+        Reference implementation of join(), resolves every path with realpath.
+    """
+    return os.path.normpath(os.path.realpath(os.path.join(*parts)))
 
 def join(*parts: PathLike) -> PathLike:
     """
         f.e. ("a", "b", "c") => "a/b/c" ("a\\b\\c" on Windows)
+        Resolves the root (first or last absolute part) once per invocation, 
+            joins the rest of the parts lexically and interns the result.
+        Unlike _Realpath_Join(), symbolic links below the root are not resolved.
     """
-    return os.path.normpath(os.path.realpath(os.path.join(*parts)))
+    joined = _Joined_Paths.get(parts)
+    if joined is None:
+        root_index = 0
+        for index, part in enumerate(parts):
+            if os.path.isabs(part):
+                root_index = index
+        
+        joined = _Resolve_Root(os.fspath(parts[root_index]))
+        if root_index + 1 < len(parts):
+            joined = sys.intern(os.path.normpath(os.path.join(joined, *parts[root_index + 1:])))
+        _Joined_Paths[parts] = joined
+    return joined
 
 def get_parent_directory(path: PathLike) -> PathLike:
     """
@@ -47,21 +87,195 @@ def get_dot_path(path: PathLike, add_ext: str = "", strip_ext: bool = False) ->
     parts = os.path.normpath(path).split(os.sep)
     return '.'.join( (p for p in parts if p) )
 
+class _Snapshot:
+    """
+        Filesystem state read once per directory with os.scandir.
+        Answers existence and stat queries from memory.
+        Paths written by indigo have to be invalidated.
+    """
+    def __init__(self):
+        # directory => { name => os.DirEntry|os.stat_result }, None if directory does not exist
+        self._directories: dict[PathLike, dict[str, os.DirEntry|os.stat_result]|None] = dict()
+
+    @staticmethod
+    def _Split(path: PathLike) -> tuple[PathLike, str]:
+        directory, name = os.path.split(os.path.normcase(os.fspath(path)))
+        return (directory, name) if name and os.path.isabs(directory) else (None, None)
+
+    def _Entries(self, directory: PathLike) -> dict[str, os.DirEntry|os.stat_result]|None:
+        try:
+            return self._directories[directory]
+        except KeyError:
+            pass
+        try:
+            with os.scandir(directory) as it:
+                entries = { os.path.normcase(entry.name): entry for entry in it }
+        except (FileNotFoundError, NotADirectoryError):
+            entries = None
+        self._directories[directory] = entries
+        return entries
+
+    def stat(self, path: PathLike) -> os.stat_result|None:
+        """
+            Returns None if @path does not exist.
+        """
+        directory, name = _Snapshot._Split(path)
+        if not directory:
+            try:
+                return os.stat(path)
+            except OSError:
+                return None
+
+        entries = self._Entries(directory)
+        if entries is None:
+            return None
+        entry = entries.get(name)
+        if entry is None:
+            return None
+        if isinstance(entry, os.stat_result):
+            return entry
+        try:
+            return entry.stat()
+        except OSError:
+            return None
+
+    def list_directory(self, path: PathLike) -> list[str]|None:
+        directory = os.path.normcase(os.fspath(path))
+        if not os.path.isabs(directory):
+            return None
+        entries = self._Entries(directory)
+        if entries is None:
+            raise FileNotFoundError(path)
+        return [ entry.name if isinstance(entry, os.DirEntry) else name for name, entry in entries.items() ]
+
+    def invalidate(self, path: PathLike):
+        directory, name = _Snapshot._Split(path)
+        if not directory:
+            return
+
+        # path might be a directory itself
+        prefix = os.path.join(directory, name)
+        for cached in [ d for d in self._directories if d == prefix or d.startswith(prefix + os.sep) ]:
+            del self._directories[cached]
+
+        entries = self._directories.get(directory)
+        if entries is None:
+            self._directories.pop(directory, None)
+            return
+        try:
+            st = os.stat(path)
+            entries[name] = st
+        except OSError:
+            entries.pop(name, None)
+
+_Active_Snapshot: _Snapshot = None
+
+@contextmanager
+def snapshot():
+    """
+        Serves existence and modification time queries from a per-build snapshot.
+        ```
+            with snapshot():
+                if is_modified_after("main.c", "main.obj"):
+                    _Rebuild_("main.c")
+                    invalidate("main.obj")
+        ```
+    """
+    global _Active_Snapshot
+    if _Active_Snapshot:
+        yield _Active_Snapshot
+        return
+    _Active_Snapshot = _Snapshot()
+    try:
+        yield _Active_Snapshot
+    finally:
+        _Active_Snapshot = None
+
+def invalidate(*paths: PathLike):
+    """
+        Drops cached state of files and directories that were written.
+    """
+    if _Active_Snapshot:
+        for path in paths:
+            _Active_Snapshot.invalidate(path)
+
+def _Stat(path: PathLike) -> os.stat_result|None:
+    if _Active_Snapshot:
+        return _Active_Snapshot.stat(path)
+    try:
+        return os.stat(path)
+    except OSError:
+        return None
+
 def path_exists(path: PathLike) -> bool:
+    if _Active_Snapshot:
+        return _Active_Snapshot.stat(path) is not None
     return os.path.exists(path)
 
 def remove_file(path: PathLike):
     if path_exists(path):
         os.remove(path)
+        invalidate(path)
+
+# path => (mtime_ns, size, offsets of line starts)
+_Line_Indices: dict[PathLike, tuple[int, int, list[int]]] = dict()
+
+def _Line_Index(path: PathLike, st: os.stat_result, mm: mmap.mmap) -> list[int]:
+    cached = _Line_Indices.get(path)
+    if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+        return cached[2]
+
+    offsets = [ 0 ]
+    offset = mm.find(b'\n')
+    while offset >= 0:
+        offsets.append(offset + 1)
+        offset = mm.find(b'\n', offset + 1)
+
+    _Line_Indices[path] = (st.st_mtime_ns, st.st_size, offsets)
+    return offsets
+
+def get_file_lines(path: PathLike, lines: Iterable[int]) -> dict[int, str]:
+    """
+        Reads given zero-based @lines of a file with a single mapping.
+        Line offsets are indexed once per file version (mtime and size).
+        Lines that are out of range are omitted from the result.
+    """
+    result = dict()
+    try:
+        st = os.stat(path)
+        if not st.st_size:
+            return result
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            offsets = _Line_Index(path, st, mm)
+            for line in lines:
+                if 0 <= line < len(offsets) and offsets[line] < st.st_size:
+                    end = offsets[line + 1] if line + 1 < len(offsets) else st.st_size
+                    result[line] = mm[offsets[line]:end].decode(errors='replace').strip()
+    except OSError:
+        pass
+    return result
 
 def get_file_line(path: PathLike, line: int) -> str:
-    if path_exists(path):
-        with open(path, 'r') as f:
-            # its retarded, but whatever
-            lines = f.readlines()
-            if len(lines) > line:
-                return lines[line].strip()
-    return ''
+    return get_file_lines(path, (line, )).get(line, '')
+
+def write_file_if_changed(path: PathLike, content: str, encoding: str = 'utf-8') -> bool:
+    """
+        Writes @content to file unless it already has exactly the same content.
+        Keeps modification time of unchanged files.
+        Returns True if file was written.
+    """
+    data = content.encode(encoding)
+    try:
+        if os.path.getsize(path) == len(data):
+            with open(path, 'rb') as f:
+                if f.read() == data:
+                    return False
+    except OSError:
+        pass
+    with open(path, 'wb') as f:
+        f.write(data)
+    invalidate(path)
+    return True
 
 def current_directory() -> PathLike:
     return os.getcwd()
@@ -71,9 +285,11 @@ def relative_directory(path: PathLike, root: PathLike) -> PathLike:
 
 def create_directory(path: PathLike):
     os.makedirs(path, exist_ok=True)
+    invalidate(path)
 
 def remove_directory(path: PathLike):
     shutil.rmtree(path, ignore_errors=True)
+    invalidate(path)
 
 def clean_directory(path: PathLike):
     if path_exists(path):
@@ -86,7 +302,10 @@ def list_directory(path: PathLike, prefix: str = None, suffix: str = None):
             p = str(p)
         return (not prefix or p.startswith(prefix)) and (not suffix or p.endswith(suffix))
     
-    return [ os.path.normpath(p) for p in os.listdir(path) if cond(p) ]
+    names = _Active_Snapshot.list_directory(path) if _Active_Snapshot else None
+    if names is None:
+        names = os.listdir(path)
+    return [ os.path.normpath(p) for p in names if cond(p) ]
 
 def is_modified_after(src: PathLike, dst: PathLike) -> bool:
     """
@@ -97,5 +316,303 @@ def is_modified_after(src: PathLike, dst: PathLike) -> bool:
                 ...
         ```
     """
-    assert os.path.exists(src), f'no such file or directory: {src}'
-    return (not os.path.exists(dst)) or (os.path.getmtime(src) > os.path.getmtime(dst))
+    src_stat = _Stat(src)
+    assert src_stat, f'no such file or directory: {src}'
+    dst_stat = _Stat(dst)
+    return (not dst_stat) or (src_stat.st_mtime > dst_stat.st_mtime)
+
+def copy_file_if_newer(src: PathLike, dst: PathLike) -> bool:
+    """
+        Copies @src to @dst unless @dst was modified after @src.
+        Keeps modification time of @src.
+        Returns True if file was copied.
+    """
+    if not is_modified_after(src, dst):
+        return False
+    shutil.copy2(src, dst)
+    invalidate(dst)
+    return True
+
+# ioctl of Linux filesystems with copy-on-write extents (btrfs, xfs)
+_FICLONE = 0x40049409
+
+def _Reflink(src: PathLike, dst: PathLike) -> bool:
+    try:
+        import fcntl
+    except ImportError:
+        # block cloning on Windows is limited to ReFS volumes, hardlinks are used instead
+        return False
+    try:
+        with open(src, 'rb') as s, open(dst, 'wb') as d:
+            fcntl.ioctl(d.fileno(), _FICLONE, s.fileno())
+    except OSError:
+        if os.path.exists(dst):
+            os.remove(dst)
+        return False
+    shutil.copystat(src, dst)
+    return True
+
+def materialize_file(src: PathLike, dst: PathLike) -> bool:
+    """
+        Makes @dst a copy of @src that shares its data if possible:
+            Reflink, then hardlink, then a plain copy f.e. across devices.
+        @dst is skipped if it is the same file or has the same size and modification time as @src,
+            otherwise it is replaced atomically and readers of the previous version keep it.
+        Returns True if @dst was updated.
+    """
+    src_stat = _Stat(src)
+    assert src_stat, f'no such file or directory: {src}'
+    dst_stat = _Stat(dst)
+    if dst_stat and (os.path.samestat(src_stat, dst_stat) 
+        or (dst_stat.st_size == src_stat.st_size and dst_stat.st_mtime_ns == src_stat.st_mtime_ns)):
+        return False
+
+    temporary = f'{dst}.materializing'
+    if os.path.exists(temporary):
+        os.remove(temporary)
+    if not _Reflink(src, temporary):
+        try:
+            os.link(src, temporary)
+        except OSError:
+            shutil.copy2(src, temporary)
+    os.replace(temporary, dst)
+    invalidate(src, dst)
+    return True
+
+def detach_hardlinks(*paths: PathLike):
+    """
+        Replaces files hardlinked elsewhere by private copies, 
+            so that tools updating them in place (f.e. incremental links) don't modify published files.
+    """
+    for path in paths:
+        try:
+            if os.stat(path).st_nlink < 2:
+                continue
+        except OSError:
+            continue
+        temporary = f'{path}.detaching'
+        shutil.copy2(path, temporary)
+        os.replace(temporary, path)
+        invalidate(path)
+
+@cache
+def _Glob_Pattern(pattern: str) -> re.Pattern:
+    """
+        Translates glob @pattern to regex that matches relative paths with '/' separators.
+            '**/' matches zero or more directories, a trailing '/**' matches the directory itself too,
+            '*' and '?' do not match '/'
+    """
+    pattern = os.path.normcase(pattern).replace('\\', '/')
+    result = ''
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith('**/', i):
+            result += '(?:.*/)?'
+            i += 3
+        elif pattern.startswith('/**', i) and i + 3 == len(pattern):
+            result += '(?:/.*)?'
+            i += 3
+        elif pattern.startswith('**', i):
+            result += '.*'
+            i += 2
+        elif pattern[i] == '*':
+            result += '[^/]*'
+            i += 1
+        elif pattern[i] == '?':
+            result += '[^/]'
+            i += 1
+        elif pattern[i] == '[' and ']' in pattern[i + 2:]:
+            end = pattern.index(']', i + 2)
+            result += '[' + pattern[i + 1:end].replace('!', '^', 1) + ']'
+            i = end + 1
+        else:
+            result += re.escape(pattern[i])
+            i += 1
+    return re.compile(result + r'\Z', re.DOTALL)
+
+def match_glob(path: str, patterns: Iterable[str]) -> bool:
+    """
+        Checks if relative @path matches any of glob @patterns.
+    """
+    path = os.path.normcase(path).replace('\\', '/')
+    return any(_Glob_Pattern(pattern).match(path) for pattern in patterns)
+
+class _Directory_Index:
+    """
+        Persistent listing of directory tree: relative directory => (mtime_ns, files, subdirectories).
+        Directories are only listed again when their mtime changes, 
+            unchanged directories cost one stat.
+    """
+    def __init__(self, path: PathLike = None):
+        self.path = path
+        self._root: PathLike = None
+        self._directories: dict[str, list] = dict()
+        if path:
+            try:
+                with open(path, 'r') as f:
+                    self._root, self._directories = json.load(f)
+            except (OSError, ValueError):
+                pass
+        self._visited: dict[str, list] = dict()
+
+    def _List(self, root: PathLike, relative: str) -> list:
+        directory = os.path.join(root, relative) if relative else root
+        # not through snapshot, it would list every parent directory the index is meant to skip
+        try:
+            st = os.stat(directory)
+        except OSError:
+            return None
+        entry = self._directories.get(relative)
+        if entry is None or entry[0] != st.st_mtime_ns:
+            files = []
+            subdirectories = []
+            with os.scandir(directory) as it:
+                for e in it:
+                    (subdirectories if e.is_dir() else files).append(e.name)
+            entry = [ st.st_mtime_ns, sorted(files), sorted(subdirectories) ]
+        self._visited[relative] = entry
+        return entry
+
+    def find(self, root: PathLike, include: Iterable[str], exclude: Iterable[str] = ()) -> list[str]:
+        """
+            Returns sorted relative paths ('/' separated) of files in @root that match @include but not @exclude.
+            Excluded directories are not walked.
+        """
+        if root != self._root:
+            self._root = root
+            self._directories = dict()
+        result = []
+        stack = [ '' ]
+        while stack:
+            relative = stack.pop()
+            entry = self._List(root, relative)
+            if entry is None:
+                continue
+            _, files, subdirectories = entry
+            prefix = relative + '/' if relative else ''
+            for file in files:
+                file = prefix + file
+                if match_glob(file, include) and not match_glob(file, exclude):
+                    result.append(file)
+            for subdirectory in reversed(subdirectories):
+                subdirectory = prefix + subdirectory
+                if not match_glob(subdirectory, exclude):
+                    stack.append(subdirectory)
+        return sorted(result)
+
+    def save(self):
+        """
+            Keeps only directories visited since construction.
+        """
+        if self.path and self._visited != self._directories:
+            create_directory(get_parent_directory(self.path))
+            write_file_if_changed(self.path, json.dumps([ self._root, self._visited ], separators=(',', ':'), sort_keys=True))
+        self._directories = self._visited
+        self._visited = dict()
+
+def find_files(root: PathLike, include: Iterable[str], exclude: Iterable[str] = (), index_path: PathLike = None) -> list[str]:
+    """
+        Finds files in @root matching glob patterns.
+        f.e. find_files("src", ["**/*.cxx"], ["vendor/**"]) => ["a.cxx", "sub/b.cxx"]
+        Directory listings are persisted in @index_path so unchanged directories are not listed again.
+    """
+    index = _Directory_Index(index_path)
+    result = index.find(root, include, exclude)
+    index.save()
+    return result
+
+class _Ignore_Rules:
+    """
+        Gitignore-style rules, the last matching rule wins:
+            'name' matches at any depth, '/name' or 'a/name' is anchored to the root,
+            'name/' only matches directories, '!rule' re-includes.
+    """
+    def __init__(self, rules: Iterable[str]):
+        self._rules: list[tuple[str, bool, bool, bool]] = []
+        for rule in rules:
+            rule = rule.strip()
+            if not rule or rule.startswith('#'):
+                continue
+            negated = rule.startswith('!')
+            rule = rule.removeprefix('!')
+            directory_only = rule.endswith('/')
+            rule = rule.rstrip('/')
+            anchored = '/' in rule
+            self._rules.append((rule.lstrip('/'), negated, directory_only, anchored))
+
+    def ignored(self, relative: str, is_directory: bool) -> bool:
+        result = False
+        name = relative.rpartition('/')[2]
+        for rule, negated, directory_only, anchored in self._rules:
+            if directory_only and not is_directory:
+                continue
+            if _Glob_Pattern(rule).match(os.path.normcase(relative if anchored else name)):
+                result = not negated
+        return result
+
+def scan_directory(root: PathLike, ignore: Iterable[str] = (), workers: int = None) -> list[str]:
+    """
+        Lists files in @root recursively, scanning subdirectories in parallel.
+        Returns sorted relative paths ('/' separated) that are not ignored by gitignore-style @ignore rules.
+        Ignored directories are not scanned.
+    """
+    rules = _Ignore_Rules(ignore)
+
+    def scan(relative: str) -> tuple[list[str], list[str]]:
+        files = []
+        subdirectories = []
+        prefix = relative + '/' if relative else ''
+        with os.scandir(os.path.join(root, relative) if relative else root) as it:
+            for entry in it:
+                is_directory = entry.is_dir()
+                path = prefix + entry.name
+                if rules.ignored(path, is_directory):
+                    continue
+                (subdirectories if is_directory else files).append(path)
+        return files, subdirectories
+
+    result = []
+    with ThreadPoolExecutor(workers) as pool:
+        pending = { pool.submit(scan, '') }
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                files, subdirectories = future.result()
+                result += files
+                pending |= { pool.submit(scan, subdirectory) for subdirectory in subdirectories }
+    return sorted(result)
+
+if __name__ == '__main__':
+    def test():
+        """
+            Checks join() against the reference realpath implementation.
+        """
+        import tempfile
+        with tempfile.TemporaryDirectory() as tmp:
+            real = os.path.join(tmp, 'real')
+            os.makedirs(os.path.join(real, 'src', 'sub'))
+            linked = os.path.join(tmp, 'linked')
+            try:
+                os.symlink(real, linked, target_is_directory=True)
+            except OSError:
+                # no privilege to create symbolic links
+                linked = real
+
+            cases = []
+            for root in (tmp, real, linked, os.path.relpath(real)):
+                cases += [
+                    (root, ),
+                    (root, 'src'),
+                    (root, 'src', 'sub', 'file.cpp'),
+                    (root, 'src/sub/../file.cpp'),
+                    (root, './src', '.', 'file.ixx'),
+                    (root, 'src', 'missing', 'file.obj'),
+                    ('ignored', root, 'src'),
+                ]
+
+            for case in cases:
+                expected = _Realpath_Join(*case)
+                assert join(*case) == expected, f'{case}: {join(*case)} != {expected}'
+                assert join(*case) is join(*case)
+            print(f'[join() matches realpath for {len(cases)} cases]')
+    test()
@@ -1,52 +1,307 @@
 from importlib.util import spec_from_file_location, module_from_spec
 import sys
-from dataclasses import is_dataclass
+import ast
+import json
+import atexit
+import hashlib
+from dataclasses import is_dataclass, fields
 
 import indigo.filesystem as fs
 from indigo.templates import *
 from indigo.console_text_styles import *
 
+def _Exported_Fields(object):
+    return [ f for f in fields(object) if f.init and f.repr ]
+
+def _Format_Value(value, tab: str, replaced_directory: fs.PathLike, result: list[str]):
+    if is_dataclass(value):
+        exported_fields = _Exported_Fields(value)
+        if not exported_fields:
+            result.append(f'{type(value).__name__}()')
+            return
+        result.append(f'{type(value).__name__}(\n')
+        inner = tab + '    '
+        for i, f in enumerate(exported_fields):
+            result.append(f'{inner}{f.name} = ')
+            _Format_Value(getattr(value, f.name), inner, replaced_directory, result)
+            result.append(',\n' if i + 1 < len(exported_fields) else '\n')
+        result.append(f'{tab})')
+    elif isinstance(value, (list, tuple, set)):
+        if isinstance(value, set):
+            value = sorted(value)
+        if not value:
+            result.append('[]')
+            return
+        result.append('[\n')
+        inner = tab + '    '
+        for i, item in enumerate(value):
+            result.append(inner)
+            _Format_Value(item, inner, replaced_directory, result)
+            result.append(',\n' if i + 1 < len(value) else '\n')
+        result.append(f'{tab}]')
+    elif isinstance(value, dict):
+        if not value:
+            result.append('{}')
+            return
+        result.append('{\n')
+        inner = tab + '    '
+        for i, (k, item) in enumerate(value.items()):
+            result.append(f'{inner}{k!r}: ')
+            _Format_Value(item, inner, replaced_directory, result)
+            result.append(',\n' if i + 1 < len(value) else '\n')
+        result.append(f'{tab}}}')
+    elif replaced_directory and isinstance(value, str) and value == replaced_directory:
+        result.append('fs.get_parent_directory(__file__)')
+    elif value is None or isinstance(value, (str, bool, int, float)):
+        result.append(repr(value))
+    else:
+        raise TypeError(f'could not format value of type {type(value)}: {value!r}')
+
 def format_dataclass(object, replaced_directory: fs.PathLike = None):
     """
+        Formats dataclass as a Python constructor expression.
         Assumes that dataclass object only contains:
             - builtin types 
             - dataclasses that only contain builtin types
     """
-    s = str(object)
-    s = s.replace('(', '(\n')
-    s = s.replace('=', ' = ')
-    s = s.replace(')', '\n)')
-    s = s.replace(', ', ',\n')
-    s = s.replace('[\'', '[\n\'')
-    s = s.replace('\']', '\'\n]')
-    s = s.replace('{\'', '{\n\'')
-    s = s.replace('\'}', '\'\n}')
+    result = []
+    _Format_Value(object, '', replaced_directory, result)
+    result.append('\n')
+    return ''.join(result)
+
+def dataclass_to_dict(object) -> dict:
+    """
+        Like dataclasses.asdict() but only keeps fields that are exported to manifests.
+    """
+    result = dict()
+    for f in _Exported_Fields(object):
+        value = getattr(object, f.name)
+        if is_dataclass(value):
+            value = dataclass_to_dict(value)
+        elif isinstance(value, (list, tuple, set)):
+            value = [ dataclass_to_dict(v) if is_dataclass(v) else v for v in value ]
+        elif isinstance(value, dict):
+            value = { k: dataclass_to_dict(v) if is_dataclass(v) else v for k, v in value.items() }
+        result[f.name] = value
+    return result
+
+# string value that stands for the directory of a json or toml manifest
+_Manifest_Directory = '{manifest_directory}'
+
+def _Replace_Directory(data, old: str, new: str):
+    if isinstance(data, str):
+        return new if data == old else data
+    if isinstance(data, list):
+        return [ _Replace_Directory(v, old, new) for v in data ]
+    if isinstance(data, dict):
+        return { k: _Replace_Directory(v, old, new) for k, v in data.items() }
+    return data
+
+def _Toml_Value(value, tab: str = '') -> str:
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (int, float)):
+        return repr(value)
+    if isinstance(value, str):
+        return json.dumps(value)
+    if isinstance(value, (list, tuple)):
+        # toml has no null, drop None entries like top-level fields
+        value = [ v for v in value if v is not None ]
+        if not value:
+            return '[]'
+        inner = tab + '    '
+        return '[\n' + ''.join(f'{inner}{_Toml_Value(v, inner)},\n' for v in value) + f'{tab}]'
+    if isinstance(value, dict):
+        value = { k: v for k, v in value.items() if v is not None }
+        if not value:
+            return '{}'
+        return '{ ' + ', '.join(f'{json.dumps(str(k))} = {_Toml_Value(v)}' for k, v in value.items()) + ' }'
+    raise TypeError(f'could not format toml value of type {type(value)}: {value!r}')
+
+def _Format_Toml_Table(name: str, object, replaced_directory: fs.PathLike, result: list[str]):
+    result.append(f'[{name}]\n')
+    tables = []
+    for f in _Exported_Fields(object):
+        value = getattr(object, f.name)
+        if value is None:
+            # toml has no null, missing keys keep dataclass defaults
+            continue
+        if is_dataclass(value):
+            tables.append((f.name, value))
+            continue
+        if replaced_directory:
+            value = _Replace_Directory(value, replaced_directory, _Manifest_Directory)
+        result.append(f'{f.name} = {_Toml_Value(value)}\n')
+    for table, value in tables:
+        result.append('\n')
+        _Format_Toml_Table(f'{name}.{table}', value, replaced_directory, result)
+
+def format_dataclass_toml(property: str, object, replaced_directory: fs.PathLike = None) -> str:
+    """
+        Formats dataclass as a toml table named @property.
+    """
+    result = []
+    _Format_Toml_Table(property, object, replaced_directory, result)
+    return ''.join(result)
+
+def format_dataclass_json(property: str, object, replaced_directory: fs.PathLike = None) -> str:
+    """
+        Formats dataclass as a json object under key @property.
+    """
+    data = dataclass_to_dict(object)
     if replaced_directory:
-        s = s.replace(replaced_directory.__repr__(), "fs.get_parent_directory(__file__)")
-
-    result = ''
-    tab = ''
-    for line in s.splitlines():
-        if line.strip().endswith('(') \
-            or line.strip().endswith(' = [') \
-            or line.strip().endswith(' = {'):
-            result += f'{tab}{line}\n'
-            tab += '    '
+        data = _Replace_Directory(data, replaced_directory, _Manifest_Directory)
+    return json.dumps({ property: data }, indent=4) + '\n'
+
+def _Import_Data_Manifest(path: fs.PathLike, property: str, class_type: type):
+    extension = fs.get_file_extension(path)
+    if extension == '.toml':
+        try:
+            import tomllib
+        except ImportError:
+            raise ImportError(f'could not import {path}: toml manifests require Python 3.11 or newer')
+        with open(path, 'rb') as f:
+            data = tomllib.load(f)
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    if property not in data:
+        raise ImportError(f'property {property} not found in {path}')
+    data = _Replace_Directory(data[property], _Manifest_Directory, fs.get_parent_directory(fs.join(fs.current_directory(), path)))
+    return dataclass_from_dict(class_type, data)
+
+# names that declarative manifests are allowed to call
+_Declarative_Calls = { 'Solution', 'Subproject', 'Options' }
+
+def _Is_Declarative_Expression(node: ast.expr) -> bool:
+    match node:
+        case ast.Constant():
+            return True
+        case ast.List(elts=elts) | ast.Tuple(elts=elts) | ast.Set(elts=elts):
+            return all(_Is_Declarative_Expression(e) for e in elts)
+        case ast.Dict(keys=keys, values=values):
+            return all(k is not None and _Is_Declarative_Expression(k) for k in keys) \
+                and all(_Is_Declarative_Expression(v) for v in values)
+        case ast.UnaryOp(op=ast.USub(), operand=ast.Constant()):
+            return True
+        case ast.Call(
+            func=ast.Attribute(value=ast.Name(id='fs'), attr='get_parent_directory'), 
+            args=[ ast.Name(id='__file__') ], 
+            keywords=[]
+        ):
+            return True
+        case ast.Call(func=ast.Name(id=name), args=[], keywords=keywords):
+            return name in _Declarative_Calls \
+                and all(k.arg and _Is_Declarative_Expression(k.value) for k in keywords)
+        case _:
+            return False
+
+def is_declarative_manifest(source: str|bytes, property: str) -> bool:
+    """
+        Checks that manifest only imports from indigo and assigns @property a plain dataclass expression.
+        Such manifests evaluate to the same object for the same content, 
+            others contain Python logic and have to be executed every time.
+    """
+    try:
+        module = ast.parse(source)
+    except SyntaxError:
+        return False
+
+    assigned = False
+    for statement in module.body:
+        match statement:
+            case ast.ImportFrom(module='indigo', level=0):
+                continue
+            case ast.Assign(targets=[ ast.Name(id=name) ], value=value) if name == property and not assigned:
+                if not _Is_Declarative_Expression(value):
+                    return False
+                assigned = True
+            case _:
+                return False
+    return assigned
+
+def _Dataclass_Schema(class_type: type) -> str:
+    return ','.join( 
+        f.name + (f'({_Dataclass_Schema(f.type)})' if is_dataclass(f.type) else '') 
+        for f in fields(class_type) if f.init 
+    )
+
+def dataclass_from_dict(class_type: type, data: dict):
+    """
+        Reverses dataclasses.asdict() for dataclasses that only contain:
+            - builtin types 
+            - dataclasses that only contain builtin types
+    """
+    kwargs = dict()
+    for f in fields(class_type):
+        if not f.init or f.name not in data:
             continue
-        elif line.strip() in ('),', ')') \
-            or line.strip() in ('],', ']') \
-            or line.strip() in ('},', '}'):
-            tab = tab[:-4]
-        
-        result += f'{tab}{line}\n'
+        value = data[f.name]
+        if is_dataclass(f.type) and isinstance(value, dict):
+            value = dataclass_from_dict(f.type, value)
+        kwargs[f.name] = value
+    return class_type(**kwargs)
 
-    return result
+class _Manifest_Cache:
+    """
+        Evaluated declarative manifests keyed on their content hash.
+        Stored as compact json, written once at exit.
+    """
+    def __init__(self, path: fs.PathLike = None):
+        self.path = path
+        self._entries: dict[str, dict] = None
+        self._modified = False
+
+    def _Load(self) -> dict[str, dict]:
+        if self._entries is None:
+            if not self.path:
+                self.path = fs.join(fs.current_directory(), '.build', 'manifests.json')
+            self._entries = dict()
+            try:
+                with open(self.path, 'r') as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError):
+                pass
+        return self._entries
+
+    @staticmethod
+    def _Key(content: bytes, property: str, class_type: type) -> str:
+        h = hashlib.sha256(content)
+        h.update(f'{property}:{class_type.__name__}({_Dataclass_Schema(class_type)})'.encode())
+        return h.hexdigest()
+
+    def get(self, path: fs.PathLike, content: bytes, property: str, class_type: type):
+        entry = self._Load().get(path)
+        if entry and entry['key'] == _Manifest_Cache._Key(content, property, class_type):
+            return dataclass_from_dict(class_type, entry['object'])
+        return None
+
+    def put(self, path: fs.PathLike, content: bytes, property: str, class_type: type, object):
+        self._Load()[path] = {
+            'key': _Manifest_Cache._Key(content, property, class_type),
+            'object': dataclass_to_dict(object)
+        }
+        if not self._modified:
+            self._modified = True
+            atexit.register(self.flush)
+
+    def flush(self):
+        if not self._modified:
+            return
+        fs.create_directory(fs.get_parent_directory(self.path))
+        fs.write_file_if_changed(self.path, json.dumps(self._entries, separators=(',', ':'), sort_keys=True))
+        self._modified = False
+
+_Manifests = _Manifest_Cache()
 
 def import_dataclass(path: fs.PathLike, property: str, class_type: type = None):
     """
-        Imports dataclass from property in .py file.
+        Imports dataclass from property in .py, .json or .toml file.
+        Declarative .py manifests are loaded from the manifest cache when their content is unchanged.
     """
     assert path and property and class_type
+    if fs.get_file_extension(path) in ('.json', '.toml'):
+        return _Import_Data_Manifest(path, property, class_type)
     _ = path
     if fs.os.path.isabs(path):
         path = fs.relative_directory(path, fs.current_directory())
@@ -64,6 +319,21 @@ def import_dataclass(path: fs.PathLike, property: str, class_type: type = None):
     rel_path = fs.os.sep.join((".", fs.relative_directory(path, fs.current_directory())))
     import_type = class_type.__name__
 
+    abs_path = fs.join(fs.current_directory(), path)
+    content = None
+    declarative = False
+    try:
+        with open(abs_path, 'rb') as f:
+            content = f.read()
+        declarative = is_declarative_manifest(content, property)
+        if declarative:
+            object = _Manifests.get(abs_path, content, property, class_type)
+            if object is not None:
+                return object
+    except OSError:
+        pass
+
+    spec = None
     try:
         assert fs.path_exists(path), f'no such file: {path}'
         cts_print(
@@ -81,6 +351,8 @@ def import_dataclass(path: fs.PathLike, property: str, class_type: type = None):
         object = getattr(module, property)
         if class_type and not isinstance(object, class_type):
             raise ImportError(f'property {property} actual type is {type(object)} but expected {class_type}')
+        if declarative:
+            _Manifests.put(abs_path, content, property, class_type, object)
         return object
     finally:
         if spec and hasattr(sys.modules, spec.name):
@@ -95,16 +367,98 @@ def export_dataclass(
     force: bool = True
 ):
     """
-        Exports dataclass as property in .py file.
+        Exports dataclass as property in .py, .json or .toml file.
         Warning: Exportable dataclasses can only contain:
             - builtin types 
             - dataclasses that only contain builtin types
     """
     assert path and property and object
     assert is_dataclass(object)
-    assert fs.get_file_extension(path) == '.py'
+    assert fs.get_file_extension(path) in ('.py', '.json', '.toml')
     assert force or not fs.path_exists(path)
 
-    result = format_dataclass(object, replaced_directory=replaced_directory)
-    with open(path, 'w') as f:
-        f.write( exported_dataclass_template.format(imports=imports, property=property, object=result) )
+    match fs.get_file_extension(path):
+        case '.json':
+            content = format_dataclass_json(property, object, replaced_directory=replaced_directory)
+        case '.toml':
+            content = format_dataclass_toml(property, object, replaced_directory=replaced_directory)
+        case _:
+            result = format_dataclass(object, replaced_directory=replaced_directory)
+            content = exported_dataclass_template.format(imports=imports, property=property, object=result)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    fs.invalidate(path)
+
+if __name__ == '__main__':
+    # round trip and benchmark: python -m indigo.import_export
+    from time import perf_counter
+    from tempfile import TemporaryDirectory
+    from indigo import Options, Subproject
+
+    def check(directory: str, sources: list[str]):
+        expected = Subproject(
+            name = 'odd',
+            directory = directory,
+            source_directory = "src (x=1), 'y'",
+            tests_directory = 'te"st',
+            options = Options(
+                warning_level = 3, 
+                explicit_include_directories = [ fs.join(directory, 'inc (1), a=b') ], 
+                explicit_properties = { 'k = (v)': 'a, b' }
+            ),
+            dependencies = [ 'dep' ],
+            sources = sources
+        )
+        for file in ('__init__.py', 'indigo.json', 'indigo.toml'):
+            path = fs.join(directory, file)
+            export_dataclass(path, 'INDIGO_SUBPROJECT', expected, 
+                imports = 'from indigo import fs, Options, Subproject', 
+                replaced_directory = directory
+            )
+            actual = import_dataclass(path, 'INDIGO_SUBPROJECT', Subproject)
+            assert actual == expected, f'{file}: {actual} != {expected}'
+            with open(path, 'r', encoding='utf-8') as f:
+                content = f.read()
+            export_dataclass(path, 'INDIGO_SUBPROJECT', actual, 
+                imports = 'from indigo import fs, Options, Subproject', 
+                replaced_directory = directory
+            )
+            with open(path, 'r', encoding='utf-8') as f:
+                assert f.read() == content, f'{file}: output is not deterministic'
+        assert is_declarative_manifest(open(fs.join(directory, '__init__.py')).read(), 'INDIGO_SUBPROJECT')
+
+    with TemporaryDirectory() as directory:
+        directory = fs.join(directory, "odd (dir), a=b 'q'")
+        fs.create_directory(directory)
+        fs.os.chdir(directory)
+        check(directory, [ 'a.ixx', "b (1), c=d.cxx", 'e\'f.cxx', 'main.cpp' ])
+
+        # toml has no null: nested None entries are dropped instead of failing the export
+        path = fs.join(directory, 'indigo.toml')
+        nested = Subproject(name = 'nested', directory = directory, 
+            options = Options(explicit_properties = { 'a': 'b', 'none': None }, explicit_libraries = [ None, 'x.lib' ])
+        )
+        export_dataclass(path, 'INDIGO_SUBPROJECT', nested, replaced_directory = directory)
+        imported = import_dataclass(path, 'INDIGO_SUBPROJECT', Subproject)
+        assert imported.options.explicit_properties == { 'a': 'b' }, imported.options.explicit_properties
+        assert imported.options.explicit_libraries == [ 'x.lib' ], imported.options.explicit_libraries
+
+        sources = [ f'dir{i // 1000}/source_{i}.cxx' for i in range(50000) ]
+        s = Subproject(name = 'big', directory = directory, sources = sources)
+        start = perf_counter()
+        formatted = format_dataclass(s, replaced_directory = directory)
+        print(f'format_dataclass: {len(sources)} sources, {len(formatted)} bytes in {perf_counter() - start:.3f}s')
+        for file in ('__init__.py', 'indigo.json', 'indigo.toml'):
+            path = fs.join(directory, file)
+            start = perf_counter()
+            export_dataclass(path, 'INDIGO_SUBPROJECT', s, 
+                imports = 'from indigo import fs, Options, Subproject', 
+                replaced_directory = directory
+            )
+            exported = perf_counter() - start
+            start = perf_counter()
+            assert import_dataclass(path, 'INDIGO_SUBPROJECT', Subproject) == s
+            print(f'{file}: export {exported:.3f}s, import {perf_counter() - start:.3f}s')
+        _Manifests.flush()
+        fs.os.chdir(fs.get_parent_directory(fs.get_parent_directory(directory)))
+    print('ok')
@@ -0,0 +1,378 @@
+import os
+import json
+import hashlib
+import urllib.error
+import urllib.request
+from queue import Queue
+from threading import Thread, Lock
+from typing import Callable
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor, Future, wait
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from indigo.filesystem import PathLike, create_directory, get_parent_directory, path_exists, invalidate
+from indigo.console_text_styles import cts_print, cts_print_warning
+from indigo.basic_shell import _Async_Command
+from indigo.msvc_remote import _Remote_Command, _Is_Remote_Compilable, _Ifc_Inputs
+
+# bumped whenever action keys or results change meaning
+_Cache_Version = 1
+_Default_Port = 7300
+# bounds every request, the cache is switched off after the first failure
+_Default_Timeout = 5.0
+_Default_Uploads = 4
+
+# link flags that read or write state kept between links
+_Stateful_Link_Prefixes = ('/INCREMENTAL', '/ILK:', '/LTCGOUT:', '/LTCG:INCREMENTAL', '/DEBUG:FASTLINK', '/GENPROFILE', '/USEPROFILE')
+
+def _Is_Cacheable(tool: str, args: list[str]) -> bool:
+    """
+        Checks that outputs of @tool invocation depend only on @args and input files.
+        Incremental, FASTLINK and profile guided links depend on previous links, they are never cached.
+    """
+    match tool.upper():
+        case 'CL.EXE':
+            return _Is_Remote_Compilable(args)
+        case 'LINK.EXE':
+            return not any(a.upper().startswith(_Stateful_Link_Prefixes) and a.upper() != '/INCREMENTAL:NO' for a in args)
+        case 'LIB.EXE':
+            return True
+        case _:
+            return False
+
+def _Digest(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+class _Cache_Error(OSError):
+    pass
+
+class _Remote_Cache:
+    """
+        Content addressed blobs (cas/<sha256>) plus action results (ac/<action key>) over HTTP GET and PUT.
+        Paths under @roots are stored relative to them, so checkouts at different locations share results.
+        Writes are skipped if @read_only, uploads run concurrently with the build.
+    """
+    def __init__(self,
+        url: str,
+        roots: dict[str, PathLike],
+        toolchain: str = '',
+        read_only: bool = False,
+        timeout: float = _Default_Timeout,
+        uploads: int = _Default_Uploads
+    ):
+        self.url = url.rstrip('/')
+        # longest first, so that build directory inside solution directory gets its own name
+        self.roots = sorted(((name, os.path.normpath(path)) for name, path in roots.items() if path), key=lambda r: len(r[1]), reverse=True)
+        self.toolchain = toolchain
+        self.read_only = read_only
+        self.timeout = timeout
+        self.available = True
+        self._uploader = ThreadPoolExecutor(max_workers=uploads, thread_name_prefix='indigo: upload') if not read_only else None
+        self._uploads: list[Future] = list()
+        self._lock = Lock()
+
+    def _Disable(self, e: Exception):
+        with self._lock:
+            if self.available:
+                self.available = False
+                cts_print_warning(section='cache', text=f'{self.url} is not available, building locally: {e}')
+
+    def _Request(self, method: str, path: str, data: bytes = None) -> bytes|None:
+        """
+            Returns None if there is no such entry.
+        """
+        request = urllib.request.Request(f'{self.url}/{path}', data=data, method=method)
+        if data is not None:
+            request.add_header('Content-Type', 'application/octet-stream')
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return response.read()
+        except urllib.error.HTTPError as e:
+            if e.code == 404:
+                return None
+            raise _Cache_Error(f'{method} {path}: HTTP {e.code}')
+        except (urllib.error.URLError, TimeoutError, ConnectionError) as e:
+            raise _Cache_Error(f'{method} {path}: {getattr(e, "reason", e)}')
+
+    def _Relative(self, text: str) -> str:
+        for name, root in self.roots:
+            text = text.replace(root, f'<{name}>')
+        return text
+
+    def _Absolute(self, text: str) -> str:
+        for name, root in self.roots:
+            text = text.replace(f'<{name}>', root)
+        return text
+
+    def _Action_Key(self, tool: str, args: list[str], inputs: list[PathLike]) -> str:
+        """
+            Hashes tool, toolchain version, arguments and contents of @inputs.
+            Ifc maps are hashed by content with relative paths, their names and ifc paths differ between checkouts.
+        """
+        names = dict()
+        digests = dict()
+        for path in sorted(set(inputs)):
+            with open(path, 'rb') as f:
+                content = f.read()
+            names[path] = self._Relative(path)
+            if path.endswith('.toml'):
+                content = self._Relative(content.decode()).encode()
+                # named by hash of absolute paths they map
+                names[path] = '<ifc map>'
+            digests[path] = _Digest(content)
+
+        key = hashlib.sha256()
+        args = [ names.get(a) or self._Relative(a) for a in args ]
+        key.update(json.dumps([ _Cache_Version, tool.upper(), self.toolchain, args ]).encode())
+        for path, digest in digests.items():
+            key.update(f'\0{names[path]}\0{digest}'.encode())
+        return key.hexdigest()
+
+    def lookup(self, key: str, outputs: list[PathLike]) -> str|None:
+        """
+            Downloads outputs of action @key, returns its stdout or None on a miss.
+        """
+        if not self.available:
+            return None
+        try:
+            result = self._Request('GET', f'ac/{key}')
+            if result is None:
+                return None
+            result = json.loads(result)
+            expected = { self._Relative(o) for o in outputs }
+            blobs = dict()
+            for name, digest in result['outputs'].items():
+                if name not in expected:
+                    return None
+                blob = self._Request('GET', f'cas/{digest}')
+                if blob is None or _Digest(blob) != digest:
+                    return None
+                blobs[self._Absolute(name)] = blob
+            for path, blob in blobs.items():
+                create_directory(get_parent_directory(path))
+                with open(path + '.download', 'wb') as f:
+                    f.write(blob)
+                os.replace(path + '.download', path)
+                invalidate(path)
+            return self._Absolute(result.get('stdout', ''))
+        except _Cache_Error as e:
+            self._Disable(e)
+        except (ValueError, KeyError) as e:
+            cts_print_warning(section='cache', text=f'malformed action result {key}: {e}')
+        return None
+
+    def store(self, key: str, outputs: list[PathLike], stdout: str):
+        """
+            Uploads existing @outputs and action result in background, see flush().
+        """
+        if self.read_only or not self.available:
+            return
+        blobs = dict()
+        for path in outputs:
+            if path_exists(path):
+                with open(path, 'rb') as f:
+                    blobs[self._Relative(path)] = f.read()
+        if not blobs:
+            return
+
+        def upload():
+            if not self.available:
+                return
+            try:
+                digests = dict()
+                for name, blob in blobs.items():
+                    digests[name] = _Digest(blob)
+                    self._Request('PUT', f'cas/{digests[name]}', blob)
+                # result goes last, so that it never references missing blobs
+                self._Request('PUT', f'ac/{key}', json.dumps({ 'outputs': digests, 'stdout': self._Relative(stdout) }).encode())
+            except _Cache_Error as e:
+                self._Disable(e)
+
+        with self._lock:
+            self._uploads.append(self._uploader.submit(upload))
+
+    def flush(self):
+        with self._lock:
+            uploads, self._uploads = self._uploads, list()
+        wait(uploads)
+
+@dataclass
+class _Cached_Command:
+    """
+        Looks action up in remote cache in a background thread, same interface as _Async_Command.
+        Runs the command on a miss, its outputs are stored once the job succeeds.
+    """
+    name: str
+    cache: _Remote_Cache
+    tool: str
+    # arguments without the tool name, as hashed into action key
+    args: list[str]
+    inputs: list[PathLike]
+    outputs: list[PathLike]
+    # launches local or remote command
+    run: Callable[[], _Async_Command|_Remote_Command]
+    logger: Callable[[str, str, str], None] = None
+    parser: Callable[[str, str, int], tuple[str, str, int]] = None
+    line_parser: Callable[[str], None] = None
+    log: PathLike = None
+
+    key: str = field(default=None, init=False)
+    _thread: Thread = field(default=None, init=False, repr=False)
+    _command: _Async_Command|_Remote_Command = field(default=None, init=False, repr=False)
+    _output: tuple[str, str, int]|BaseException = field(default=None, init=False, repr=False)
+
+    def _Watch(self, completed: Queue, token = None):
+        assert not self._thread
+
+        def lookup():
+            try:
+                try:
+                    inputs = self.inputs
+                    if self.tool.upper() == 'CL.EXE':
+                        inputs = [ *inputs, *_Ifc_Inputs(self.args) ]
+                    self.key = self.cache._Action_Key(self.tool, self.args, inputs)
+                    stdout = self.cache.lookup(self.key, self.outputs)
+                except OSError as e:
+                    # f.e. missing input, the tool reports it better
+                    stdout = None
+                if stdout is None:
+                    self._command = self.run()
+                    self._command._Watch(completed, self if token is None else token)
+                    return
+                if self.logger:
+                    self.logger('cache', self.name, f'hit {self.key[:16]}')
+                if self.log:
+                    with open(self.log, 'w') as f:
+                        f.write(stdout)
+                self._output = (stdout, '', 0)
+            except BaseException as e:
+                self._output = e
+            completed.put(self if token is None else token)
+
+        self._thread = Thread(target=lookup, name=f'indigo: {self.name} cache', daemon=True)
+        self._thread.start()
+
+    def _Cancel(self):
+        # lookup is short, the command is cancelled if it was launched on a miss
+        if self._command:
+            self._command._Cancel()
+
+    def _Await(self) -> tuple[str, str, int]:
+        self._thread.join()
+        if self._command:
+            self._output = self._command._Await()
+            return self._output
+        if isinstance(self._output, BaseException):
+            raise self._output
+        stdout, stderr, returncode = self._output
+        if self.line_parser:
+            for line in stdout.splitlines():
+                self.line_parser(line)
+        if self.logger:
+            self.logger('await', self.name, '')
+        if self.parser:
+            return self.parser(stdout, stderr, returncode)
+        return stdout, stderr, returncode
+
+    @property
+    def hit(self) -> bool:
+        # only meaningful once awaited
+        return self._command is None and isinstance(self._output, tuple)
+
+    @property
+    def peak_rss(self) -> int|None:
+        return getattr(self._command, 'peak_rss', None)
+
+    def _Store(self):
+        """
+            Called once the job succeeded, hits are not stored again.
+        """
+        if self._command and self.key and isinstance(self._output, tuple):
+            self.cache.store(self.key, self.outputs, self._output[0])
+
+
+class _Cache_Handler(BaseHTTPRequestHandler):
+    server: '_Cache_Server'
+
+    def _Path(self) -> PathLike|None:
+        kind, _, key = self.path.strip('/').partition('/')
+        if kind not in ('cas', 'ac') or len(key) != 64 or any(c not in '0123456789abcdef' for c in key):
+            self.send_error(400, 'expected /cas/<sha256> or /ac/<sha256>')
+            return None
+        return os.path.join(self.server.directory, kind, key[:2], key)
+
+    def do_GET(self):
+        path = self._Path()
+        if not path:
+            return
+        try:
+            with open(path, 'rb') as f:
+                content = f.read()
+        except FileNotFoundError:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(content)
+
+    do_HEAD = do_GET
+
+    def do_PUT(self):
+        path = self._Path()
+        if not path:
+            return
+        content = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.path.startswith('/cas/') and _Digest(content) != os.path.basename(path):
+            self.send_error(400, 'content does not match its digest')
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # concurrent uploads of the same entry write equal content
+        temporary = f'{path}.{os.getpid()}.{id(self)}'
+        with open(temporary, 'wb') as f:
+            f.write(content)
+        os.replace(temporary, path)
+        self.send_response(201)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format: str, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+class _Cache_Server(ThreadingHTTPServer):
+    """
+        Minimal cache server storing entries in @directory, meant for tests and small teams.
+    """
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], directory: PathLike, verbose: bool = False):
+        super().__init__(address, _Cache_Handler)
+        self.directory = directory
+        self.verbose = verbose
+
+
+def serve(host: str = '127.0.0.1', port: int = _Default_Port, directory: PathLike = '.indigo-cache', verbose: bool = False):
+    """
+        Runs cache server until interrupted.
+        Listens on localhost by default, requests are not authenticated.
+    """
+    directory = os.path.realpath(directory)
+    with _Cache_Server((host, port), directory, verbose) as server:
+        cts_print(section='cache', subsection=f'{host}:{server.server_address[1]}', text=f'serving {directory}')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    from argparse import ArgumentParser
+    parser = ArgumentParser('indigo.msvc_cache', description='indigo build cache server')
+    parser.add_argument('--host', type=str, default='127.0.0.1')
+    parser.add_argument('--port', '-p', type=int, default=_Default_Port)
+    parser.add_argument('--directory', '-d', type=str, default='.indigo-cache')
+    parser.add_argument('--verbose', '-v', action='store_true')
+    args = parser.parse_args()
+    serve(args.host, args.port, args.directory, args.verbose)
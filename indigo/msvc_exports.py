@@ -0,0 +1,141 @@
+import struct
+from typing import Iterable, NamedTuple
+
+from indigo.filesystem import PathLike, write_file_if_changed
+
+# {D1BAA1C7-BAEE-4ba9-AF20-FAF66AA4DCB8}, /bigobj object files
+_Bigobj_Class_Id = bytes.fromhex('c7a1bad1eebaa94baf20faf66aa4dcb8')
+
+_IMAGE_SCN_CNT_CODE = 0x00000020
+_IMAGE_SCN_LNK_COMDAT = 0x00001000
+_IMAGE_SYM_CLASS_EXTERNAL = 2
+
+class _Coff_Symbol(NamedTuple):
+    name: str
+    # False for data symbols, exported with DATA keyword
+    code: bool
+
+class _Coff_Error(ValueError):
+    pass
+
+def _Coff_Defined_Symbols(path: PathLike) -> list[_Coff_Symbol]:
+    """
+        Reads external symbols defined in object file @path.
+        Symbols of COMDAT sections (inline functions, templates, vtables) are skipped,
+            every module that uses them gets its own copy.
+        Raises _Coff_Error for anonymous objects, e.g. compiled with /GL.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    try:
+        return _Parse_Coff_Symbols(path, data)
+    except _Coff_Error:
+        raise
+    except (struct.error, IndexError, ValueError) as e:
+        raise _Coff_Error(f'{path}: malformed object file, {e}')
+
+def _Parse_Coff_Symbols(path: PathLike, data: bytes) -> list[_Coff_Symbol]:
+    sig1, sig2 = struct.unpack_from('<HH', data, 0)
+    if sig1 == 0 and sig2 == 0xFFFF:
+        version, = struct.unpack_from('<H', data, 4)
+        if version < 2 or data[12:28] != _Bigobj_Class_Id:
+            raise _Coff_Error(f'{path}: not a COFF object file, was it compiled with /GL?')
+        sections_count, symbols_offset, symbols_count = struct.unpack_from('<III', data, 44)
+        sections_offset, symbol_size, section_format = 56, 20, '<i'
+    else:
+        sections_count, _, symbols_offset, symbols_count, optional_header_size = struct.unpack_from('<HIIIH', data, 2)
+        sections_offset, symbol_size, section_format = 20 + optional_header_size, 18, '<h'
+
+    characteristics = [
+        struct.unpack_from('<I', data, sections_offset + 40 * i + 36)[0] for i in range(sections_count)
+    ]
+    strings_offset = symbols_offset + symbols_count * symbol_size
+
+    symbols = []
+    index = 0
+    while index < symbols_count:
+        offset = symbols_offset + index * symbol_size
+        section, = struct.unpack_from(section_format, data, offset + 12)
+        storage_class, aux_count = struct.unpack_from('<BB', data, offset + symbol_size - 2)
+        index += 1 + aux_count
+
+        if storage_class != _IMAGE_SYM_CLASS_EXTERNAL or section <= 0:
+            continue
+        flags = characteristics[section - 1]
+        if flags & _IMAGE_SCN_LNK_COMDAT:
+            continue
+
+        if data[offset:offset + 4] == b'\0\0\0\0':
+            name_offset, = struct.unpack_from('<I', data, offset + 4)
+            start = strings_offset + name_offset
+            name = data[start:data.index(b'\0', start)]
+        else:
+            name = data[offset:offset + 8].rstrip(b'\0')
+        name = name.decode(errors='replace')
+        if name.startswith(('.', '$', '__imp_')):
+            continue
+        symbols.append(_Coff_Symbol(name, bool(flags & _IMAGE_SCN_CNT_CODE)))
+    return symbols
+
+def exported_symbols(objects: Iterable[PathLike]) -> list[_Coff_Symbol]:
+    """
+        Returns sorted external symbols defined in @objects.
+    """
+    symbols = dict()
+    for obj in objects:
+        for symbol in _Coff_Defined_Symbols(obj):
+            symbols[symbol.name] = symbol
+    return sorted(symbols.values())
+
+def dump_module_definition(path: PathLike, library: str, symbols: Iterable[_Coff_Symbol]) -> bool:
+    """
+        Writes module definition (.def) file exporting @symbols from dynamic library @library.
+        Returns True if file was written, exports are unchanged otherwise.
+    """
+    lines = [ f'LIBRARY "{library}"', 'EXPORTS' ]
+    for symbol in symbols:
+        lines.append(f'\t{symbol.name}' if symbol.code else f'\t{symbol.name} DATA')
+    return write_file_if_changed(path, '\n'.join(lines) + '\n')
+
+
+if __name__ == '__main__':
+    import os
+    import tempfile
+
+    def coff(symbols: list[tuple[bytes, int, int]], sections: list[int]) -> bytes:
+        header = struct.pack('<HHIIIHH', 0x8664, len(sections), 0, 0, 0, 0, 0)
+        section_table = b''.join(b'.text\0\0\0' + bytes(28) + struct.pack('<I', c) for c in sections)
+        strings = b''
+        symbol_table = b''
+        for name, section, storage_class in symbols:
+            if len(name) > 8:
+                field = struct.pack('<II', 0, 4 + len(strings))
+                strings += name + b'\0'
+            else:
+                field = name.ljust(8, b'\0')
+            symbol_table += field + struct.pack('<IhHBB', 0, section, 0x20, storage_class, 0)
+        symbols_offset = len(header) + len(section_table)
+        header = struct.pack('<HHIIIHH', 0x8664, len(sections), 0, symbols_offset, len(symbols), 0, 0)
+        return header + section_table + symbol_table + struct.pack('<I', 4 + len(strings)) + strings
+
+    data = coff([
+        (b'?answer@@YAHXZ', 1, _IMAGE_SYM_CLASS_EXTERNAL),
+        (b'?value@@3HA', 2, _IMAGE_SYM_CLASS_EXTERNAL),
+        (b'?inline@@YAHXZ', 3, _IMAGE_SYM_CLASS_EXTERNAL),
+        (b'?local@@YAHXZ', 1, 3),
+        (b'printf', 0, _IMAGE_SYM_CLASS_EXTERNAL),
+    ], [ _IMAGE_SCN_CNT_CODE, 0x40, _IMAGE_SCN_CNT_CODE | _IMAGE_SCN_LNK_COMDAT ])
+
+    with tempfile.TemporaryDirectory() as directory:
+        obj = os.path.join(directory, 'a.obj')
+        with open(obj, 'wb') as f:
+            f.write(data)
+        symbols = exported_symbols([ obj ])
+        assert symbols == [ _Coff_Symbol('?answer@@YAHXZ', True), _Coff_Symbol('?value@@3HA', False) ], symbols
+
+        definition = os.path.join(directory, 'a.def')
+        assert dump_module_definition(definition, 'a.dll', symbols)
+        assert not dump_module_definition(definition, 'a.dll', symbols)
+        with open(definition) as f:
+            assert f.read() == 'LIBRARY "a.dll"\nEXPORTS\n\t?answer@@YAHXZ\n\t?value@@3HA DATA\n'
+    print('ok')
@@ -1,4 +1,7 @@
+from functools import cache
+
 from indigo.filesystem import PathLike, get_dot_path, join
+from indigo.options import LinkProfile
 
 class _CFlag:
     CStandard = '/std:c17'
@@ -32,6 +35,10 @@ class _CFlag:
     def DLLPath(path: PathLike):
         return f'/Fe{path}'
     
+    @staticmethod
+    def MultiProcessCompilation(processes: int):
+        return f'/MP{processes}'
+    
     EnableDebugInformation = '/Zi'
     LegacyDebugInformation = '/Z7'
     DisableOptimizations = '/Od'
@@ -44,6 +51,16 @@ class _CFlag:
     def PreincludeFile(file: PathLike):
         return f'/FI{file}'
 
+    @staticmethod
+    def CreatePrecompiledHeader(header: PathLike):
+        return f'/Yc{header}'
+    @staticmethod
+    def UsePrecompiledHeader(header: PathLike):
+        return f'/Yu{header}'
+    @staticmethod
+    def PCHPath(path: PathLike):
+        return f'/Fp{path}'
+
     @staticmethod
     def IncludeDirectory(dir: PathLike):
         from os import sep
@@ -57,7 +74,31 @@ class _LFlag:
     TreatWarningsAsErrors = '/WX'
     EnableDebugInformation = '/DEBUG:FULL'
     LinkTimeCodeGeneration = '/LTCG'
+    IncrementalLinkTimeCodeGeneration = '/LTCG:INCREMENTAL'
+    FastLinkDebugInformation = '/DEBUG:FASTLINK'
+    IncrementalLinking = '/INCREMENTAL'
+    DynamicLibrary = '/DLL'
+
+    @staticmethod
+    def IncrementalDatabasePath(path: PathLike):
+        return f'/ILK:{path}'
+
+    @staticmethod
+    def LTCGOutputPath(path: PathLike):
+        return f'/LTCGOUT:{path}'
     
+    @staticmethod
+    def GenerateProfile(pgd: PathLike):
+        return f'/GENPROFILE:PGD={pgd}'
+
+    @staticmethod
+    def UseProfile(pgd: PathLike):
+        return f'/USEPROFILE:PGD={pgd}'
+
+    @staticmethod
+    def ModuleDefinition(path: PathLike):
+        return f'/DEF:{path}'
+
     @staticmethod
     def DLLPath(path: PathLike):
         return f'/OUT:{path}'
@@ -157,32 +198,79 @@ def build_msvc_compile_flags(
     flags += debug.split(' ')
     return flags
 
+class _Link_Mode:
+    @staticmethod
+    def _Match(link_profile: str|None, disable_optimizations: bool) -> str:
+        if link_profile:
+            return link_profile
+        return LinkProfile.Incremental if disable_optimizations else LinkProfile.LtcgIncremental
+
+    @staticmethod
+    def auxiliary_files(link_profile: str, prefix: PathLike) -> list[PathLike]:
+        """
+            Files the linker keeps between links in @link_profile, named after @prefix.
+        """
+        match link_profile:
+            case LinkProfile.Incremental | LinkProfile.FastLink:
+                return [ f'{prefix}.ilk' ]
+            case LinkProfile.LtcgIncremental:
+                return [ f'{prefix}.iobj', f'{prefix}.ipdb' ]
+            case _:
+                return []
+
 def build_msvc_link_flags(
     warnings: bool = True,
-    debug: bool = True
+    debug: bool = True,
+    link_profile: str = LinkProfile.Full,
+    auxiliary_prefix: PathLike = None,
+    link_time_code_generation: bool = None
 ) -> list[str]:
+    """
+        @auxiliary_prefix is required by incremental profiles.
+        @link_time_code_generation defaults to optimized builds being non-debug ones.
+    """
     flags = [ _LFlag.MachineX64 ]
     
     if warnings:
         flags.append(_LFlag.TreatWarningsAsErrors)
+
+    if link_time_code_generation is None:
+        link_time_code_generation = not debug
     
-    if debug:
-        flags.append(_LFlag.EnableDebugInformation)
-    else:
-        flags.append(_LFlag.LinkTimeCodeGeneration)
+    match link_profile:
+        case LinkProfile.Incremental:
+            if debug:
+                flags.append(_LFlag.EnableDebugInformation)
+            flags.append(_LFlag.IncrementalLinking)
+            flags.append(_LFlag.IncrementalDatabasePath(f'{auxiliary_prefix}.ilk'))
+        case LinkProfile.FastLink:
+            flags.append(_LFlag.FastLinkDebugInformation)
+            flags.append(_LFlag.IncrementalLinking)
+            flags.append(_LFlag.IncrementalDatabasePath(f'{auxiliary_prefix}.ilk'))
+        case LinkProfile.LtcgIncremental:
+            if debug:
+                flags.append(_LFlag.EnableDebugInformation)
+            flags.append(_LFlag.IncrementalLinkTimeCodeGeneration)
+            flags.append(_LFlag.LTCGOutputPath(f'{auxiliary_prefix}.iobj'))
+        case _:
+            if debug:
+                flags.append(_LFlag.EnableDebugInformation)
+            if link_time_code_generation:
+                flags.append(_LFlag.LinkTimeCodeGeneration)
     
     return flags 
 
 def build_msvc_lib_flags(
     warnings: bool = True,
-    debug: bool = True
+    debug: bool = True,
+    link_time_code_generation: bool = None
 ) -> list[str]:
     flags = [ _LFlag.MachineX64 ]
 
     if warnings:
         flags.append(_LFlag.TreatWarningsAsErrors)
     
-    if not debug:
+    if link_time_code_generation if link_time_code_generation is not None else not debug:
         flags.append(_LFlag.LinkTimeCodeGeneration)
 
     return flags
@@ -251,19 +339,15 @@ def produce_header_unit_flags(
     
     return flags
 
+@cache
 def consume_header_unit_flags(
     hxx: PathLike,
     source_directory: PathLike,
     ifc_search_directory: PathLike
-) -> list[str]:
+) -> tuple[str]:
+    # same for every source that consumes header unit, computed once
     ifc = _Header_Unit.ifc(hxx, ifc_search_directory)
-
-    flags = []
-    
-    flags.append(_IfcFlag.IncludeGlobalHeaderUnit)
-    flags.append(f'{hxx}={ifc}')
-    
-    return flags
+    return ( _IfcFlag.IncludeGlobalHeaderUnit, f'{hxx}={ifc}' )
 
 def build_msvc_ifc_flags(
     header_units: set[PathLike],
@@ -273,7 +357,8 @@ def build_msvc_ifc_flags(
 ) -> list[str]:
     flags = []
 
-    for hxx in header_units:
+    # sorted for stable command lines
+    for hxx in sorted(header_units):
         flags += consume_header_unit_flags(hxx, source_directory, ifc_search_directory)
 
     if with_ifc_search_dir:
@@ -0,0 +1,97 @@
+from typing import Iterable, NamedTuple
+
+from indigo.filesystem import PathLike, path_exists, create_directory, write_file_if_changed, remove_file, get_parent_directory
+from indigo.msvc_flags import _IFC_MAP_TOML_MODULE_TEMPLATE, _IFC_MAP_TOML_HEADER_UNIT_TEMPLATE
+from indigo.target import CompilationError
+
+class _Ifc(NamedTuple):
+    # name of the target that produces ifc
+    target: str
+    # absolute path of .ixx or .hxx source
+    source: PathLike
+    ifc: PathLike
+
+# configuration => registry
+_Ifc_Registry_Instances: dict[str, '_Ifc_Registry'] = dict()
+class _Ifc_Registry:
+    """
+        Solution-wide registry of module name => ifc and header unit name => ifc, one per configuration.
+        Targets register their interfaces once per build, before anything is compiled.
+        Unrelated targets may declare the same name, a target only sees ifcs of its dependency closure.
+    """
+    def __init__(self):
+        # name => source => ifc
+        self.modules: dict[str, dict[PathLike, _Ifc]] = dict()
+        self.header_units: dict[str, dict[PathLike, _Ifc]] = dict()
+
+    @staticmethod
+    def _Instance(configuration: str = None) -> '_Ifc_Registry':
+        if configuration not in _Ifc_Registry_Instances:
+            _Ifc_Registry_Instances[configuration] = _Ifc_Registry()
+        return _Ifc_Registry_Instances[configuration]
+
+    @staticmethod
+    def _Register(registry: dict[str, dict[PathLike, _Ifc]], name: str, ifc: _Ifc):
+        registry.setdefault(name, dict())[ifc.source] = ifc
+
+    @staticmethod
+    def _Visible(registry: dict[str, dict[PathLike, _Ifc]], kind: str, name: str, targets: set[str]) -> _Ifc|None:
+        """
+            Returns ifc of @name declared by one of @targets, None if none of them declares it.
+            Raises CompilationError if more of them do, their users would see two different ifcs.
+        """
+        visible = [ ifc for ifc in registry.get(name, dict()).values() if ifc.target in targets ]
+        if len(visible) > 1:
+            raise CompilationError(
+                f'{kind} {name} is declared by both {visible[0].source} ({visible[0].target}) and {visible[1].source} ({visible[1].target})'
+            )
+        return visible[0] if visible else None
+
+    def register_module(self, name: str, ifc: _Ifc):
+        _Ifc_Registry._Register(self.modules, name, ifc)
+
+    def register_header_unit(self, name: str, ifc: _Ifc):
+        _Ifc_Registry._Register(self.header_units, name, ifc)
+
+    def module(self, name: str, targets: set[str]) -> _Ifc|None:
+        return _Ifc_Registry._Visible(self.modules, 'module', name, targets)
+
+    def header_unit(self, name: str, targets: set[str]) -> _Ifc|None:
+        return _Ifc_Registry._Visible(self.header_units, 'header unit', name, targets)
+
+    def check(self, targets: set[str]):
+        """
+            Raises CompilationError if any name is declared twice within @targets, f.e. a dependency closure.
+        """
+        for name in self.modules:
+            self.module(name, targets)
+        for name in self.header_units:
+            self.header_unit(name, targets)
+
+    @staticmethod
+    def _Declared_by(registry: dict[str, dict[PathLike, _Ifc]], targets: set[str]) -> list[str]:
+        return [ name for name, ifcs in registry.items() if any(ifc.target in targets for ifc in ifcs.values()) ]
+
+    def modules_of(self, targets: set[str]) -> list[str]:
+        return _Ifc_Registry._Declared_by(self.modules, targets)
+
+    def header_units_of(self, targets: set[str]) -> list[str]:
+        return _Ifc_Registry._Declared_by(self.header_units, targets)
+
+    def ifc_map(self, path: PathLike, modules: Iterable[str], header_units: Iterable[str], targets: set[str]) -> PathLike|None:
+        """
+            Writes ifc map of given registered names, as seen by @targets, to @path.
+            Unchanged map keeps its timestamp.
+            Returns None and removes @path if there is nothing to map.
+        """
+        content = ''.join(
+            [ _IFC_MAP_TOML_HEADER_UNIT_TEMPLATE % (name, self.header_unit(name, targets).ifc) for name in sorted(header_units) ] +
+            [ _IFC_MAP_TOML_MODULE_TEMPLATE % (name, self.module(name, targets).ifc) for name in sorted(modules) ]
+        )
+        if not content:
+            if path_exists(path):
+                remove_file(path)
+            return None
+        create_directory(get_parent_directory(path))
+        write_file_if_changed(path, content)
+        return path
@@ -0,0 +1,555 @@
+import os
+import hmac
+import json
+import shutil
+import socket
+import struct
+import tempfile
+import subprocess
+import socketserver
+from queue import Queue
+from threading import Thread, Semaphore
+from typing import Callable
+from dataclasses import dataclass, field
+
+from indigo.filesystem import PathLike, create_directory, get_parent_directory, invalidate
+from indigo.console_text_styles import cts_print, cts_print_warning
+from indigo.basic_shell import _Async_Command
+
+_Protocol_Version = 1
+_Default_Port = 7290
+# stands for worker's sandbox directory in arguments, ifc maps and diagnostics
+_Sandbox = '<indigo-sandbox>'
+_Connect_Timeout = 5.0
+# single compilation, including transfer of inputs and outputs
+_Compile_Timeout = 600.0
+
+# flags followed by a path operand
+_Path_Operands = ('/ifcOutput', '/ifcSearchDir', '/ifcMap', '/interface', '/Tp', '/Tc')
+# flags followed by name=ifc operand
+_Header_Unit_Flags = ('/headerUnit', '/headerUnit:angle', '/headerUnit:quote')
+# flags with glued path operand
+_Path_Prefixes = ('/Fo', '/FI', '/I')
+# precompiled headers, header unit exports and multiprocess batches are compiled locally
+_Local_Only_Prefixes = ('/Yc', '/Yu', '/Fp', '/MP', '/exportHeader', '@')
+# flags workers accept besides path flags, compilations with other flags stay local;
+#   anything that loads code (/B1, /Bx, /analyze:plugin, /d1, ...) or names files is left out
+_Allowed_Flags = (
+    '/c', '/EHsc', '/EHs', '/EHa', '/GR', '/GR-', '/Wall', '/WX', '/WX-', '/W0', '/W1', '/W2', '/W3', '/W4',
+    '/Z7', '/Od', '/O1', '/O2', '/Ox', '/Os', '/Ot', '/Oi', '/Oy', '/Oy-', '/Ob0', '/Ob1', '/Ob2', '/Ob3',
+    '/GL', '/Gy', '/Gw', '/GS', '/GS-', '/MD', '/MDd', '/MT', '/MTd', '/TP', '/TC',
+    '/utf-8', '/permissive-', '/bigobj', '/nologo', '/sdl', '/sdl-'
+)
+_Allowed_Prefixes = (
+    '/std:', '/Zc:', '/D', '/U', '/wd', '/we', '/wo', '/w1', '/w2', '/w3', '/w4',
+    '/diagnostics:', '/arch:', '/fp:', '/external:W'
+)
+
+class _Remote_Error(OSError):
+    """
+        Transport or worker failure, compilation falls back to the local machine.
+    """
+    pass
+
+def _Send(sock: socket.socket, header: dict, blobs: list[bytes] = ()):
+    """
+        Message is a length prefixed json header followed by raw blobs, their sizes are listed in header['blobs'].
+    """
+    header = dict(header, blobs=[ len(b) for b in blobs ])
+    payload = json.dumps(header).encode()
+    sock.sendall(struct.pack('>I', len(payload)) + payload)
+    for blob in blobs:
+        sock.sendall(blob)
+
+def _Receive_Exactly(sock: socket.socket, size: int) -> bytes:
+    chunks = []
+    while size > 0:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            raise _Remote_Error('connection closed by peer')
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+def _Receive(sock: socket.socket) -> tuple[dict, list[bytes]]:
+    size, = struct.unpack('>I', _Receive_Exactly(sock, 4))
+    header = json.loads(_Receive_Exactly(sock, size))
+    return header, [ _Receive_Exactly(sock, s) for s in header.pop('blobs', ()) ]
+
+def _Sandboxed(path: PathLike) -> str:
+    """
+        Maps local absolute path into the sandbox, f.e. "C:\\a\\b.cpp" => "<indigo-sandbox>/C/a/b.cpp"
+    """
+    drive, rest = os.path.splitdrive(os.path.abspath(path))
+    parts = [ p for p in (drive.replace(':', '').replace('\\', '/').strip('/'), rest.replace('\\', '/').strip('/')) if p ]
+    return '/'.join((_Sandbox, *parts))
+
+def _Toolchain(cl: PathLike) -> str:
+    """
+        MSVC version of cl.exe path, f.e. "...\\MSVC\\14.38.33130\\bin\\Hostx64\\x64\\cl.exe" => "14.38.33130"
+    """
+    parts = os.path.normpath(cl).split(os.sep)
+    for index, part in enumerate(parts[:-1]):
+        if part.upper() == 'MSVC':
+            return parts[index + 1]
+    return ''
+
+def _Is_Remote_Compilable(args: list[str]) -> bool:
+    """
+        Checks that cl.exe @args (without the tool name) compile a single object that could be relocated into a sandbox.
+    """
+    objects = [ a for a in args if a.startswith('/Fo') ]
+    if len(objects) != 1 or objects[0].endswith(('/', '\\')):
+        return False
+    return not any(a.startswith(_Local_Only_Prefixes) for a in args)
+
+def _Is_Allowed_Flag(arg: str) -> bool:
+    return arg in _Allowed_Flags or arg.startswith(_Allowed_Prefixes)
+
+def _Has_Allowed_Flags(args: list[str]) -> bool:
+    """
+        Checks that portable cl.exe @args only use flags that workers accept.
+    """
+    operand = None
+    for arg in args:
+        # operands are paths, they may start with / too
+        if operand or not arg.startswith(('/', '-')) or arg in _Path_Operands or arg in _Header_Unit_Flags:
+            pass
+        elif not arg.startswith(_Path_Prefixes) and not _Is_Allowed_Flag(arg):
+            return False
+        operand = arg if arg in _Path_Operands or arg in _Header_Unit_Flags else None
+    return True
+
+def _Check_Sandboxed(path: str):
+    """
+        Raises ValueError unless @path is relative to the sandbox placeholder and stays inside of it.
+    """
+    if not path.startswith(_Sandbox + '/'):
+        raise ValueError(f'path {path} is outside of the sandbox')
+    parts = path[len(_Sandbox) + 1:].replace('\\', '/').split('/')
+    if '..' in parts or (parts and ':' in parts[0]):
+        raise ValueError(f'path {path} is outside of the sandbox')
+
+def _Check_Args(args: list[str]):
+    """
+        Validates sandboxed cl.exe @args received by a worker, raises ValueError on anything
+            _Remote_Request._Build does not produce: unknown flags, response files and paths outside of the sandbox.
+    """
+    operand = None
+    for arg in args:
+        if operand in _Header_Unit_Flags:
+            _Check_Sandboxed(arg.partition('=')[2])
+        elif operand:
+            _Check_Sandboxed(arg)
+        elif arg in _Path_Operands or arg in _Header_Unit_Flags:
+            pass
+        elif arg.startswith(_Path_Prefixes):
+            prefix = next(p for p in _Path_Prefixes if arg.startswith(p))
+            _Check_Sandboxed(arg[len(prefix):])
+        elif arg.startswith(('/', '-', '@')):
+            if not _Is_Allowed_Flag(arg):
+                raise ValueError(f'flag {arg} is not allowed')
+        else:
+            # source
+            _Check_Sandboxed(arg)
+        operand = arg if arg in _Path_Operands or arg in _Header_Unit_Flags else None
+
+def _Portable_Args(args: list[str]) -> list[str]:
+    """
+        Replaces program database by debug information embedded in the object (/Z7),
+            shared .pdb can't be updated on another machine.
+    """
+    return [ '/Z7' if a == '/Zi' else a for a in args if a != '/FS' and not a.startswith('/Fd') ]
+
+def _Ifc_Inputs(args: list[str]) -> list[PathLike]:
+    """
+        Returns ifcs of header units, ifc maps and ifcs they map, referenced by cl.exe @args.
+    """
+    inputs = []
+    for operand, arg in zip(args, args[1:]):
+        if operand in _Header_Unit_Flags:
+            inputs.append(arg.partition('=')[2])
+        elif operand == '/ifcMap':
+            inputs.append(arg)
+            with open(arg, 'r') as f:
+                inputs += [ l[len('ifc = '):].strip("'") for l in f.read().splitlines() if l.startswith('ifc = ') ]
+    return inputs
+
+@dataclass
+class _Remote_Request:
+    args: list[str]
+    # sandboxed path => content
+    files: dict[str, bytes]
+    # sandboxed directories created before compilation
+    directories: list[str]
+    # sandboxed path => local path
+    outputs: dict[str, PathLike]
+    # sandboxed path => local path, to restore paths in diagnostics
+    paths: dict[str, PathLike]
+
+    @staticmethod
+    def _Build(args: list[str], inputs: list[PathLike], outputs: list[PathLike]) -> '_Remote_Request':
+        """
+            Relocates paths in portable cl.exe @args into the sandbox and reads @inputs.
+            Ifc maps and header units referenced by @args are shipped too.
+            Raises OSError if some input is missing.
+        """
+        paths: dict[str, PathLike] = dict()
+        def sandboxed(path: PathLike) -> str:
+            mapped = _Sandboxed(path)
+            paths[mapped] = path
+            return mapped
+
+        relocated = []
+        directories = []
+        operand = None
+        for arg in _Portable_Args(args):
+            if operand in _Header_Unit_Flags:
+                name, _, ifc = arg.partition('=')
+                relocated.append(f'{name}={sandboxed(ifc)}')
+            elif operand:
+                if operand in ('/ifcSearchDir', '/ifcOutput'):
+                    directories.append(sandboxed(arg if operand == '/ifcSearchDir' else os.path.dirname(arg)))
+                relocated.append(sandboxed(arg))
+            elif arg in _Path_Operands or arg in _Header_Unit_Flags:
+                relocated.append(arg)
+            elif arg in inputs:
+                relocated.append(sandboxed(arg))
+            else:
+                for prefix in _Path_Prefixes:
+                    if arg.startswith(prefix):
+                        path = arg[len(prefix):]
+                        if prefix == '/I':
+                            directories.append(sandboxed(path))
+                        elif prefix == '/Fo':
+                            directories.append(sandboxed(os.path.dirname(path)))
+                        relocated.append(prefix + sandboxed(path) + (os.sep if prefix == '/I' else ''))
+                        break
+                else:
+                    relocated.append(arg)
+            operand = arg if arg in _Path_Operands or arg in _Header_Unit_Flags else None
+
+        files = dict()
+        for path in dict.fromkeys((*inputs, *_Ifc_Inputs(args))):
+            if path.endswith('.toml'):
+                # ifc map
+                with open(path, 'r') as f:
+                    content = f.read()
+                for line in content.splitlines():
+                    if line.startswith('ifc = '):
+                        ifc = line[len('ifc = '):].strip("'")
+                        content = content.replace(f"'{ifc}'", f"'{sandboxed(ifc)}'")
+                files[sandboxed(path)] = content.encode()
+            else:
+                with open(path, 'rb') as f:
+                    files[sandboxed(path)] = f.read()
+
+        return _Remote_Request(
+            relocated, files, list(dict.fromkeys(directories)),
+            { sandboxed(o): o for o in outputs }, paths
+        )
+
+    def _Restore_Paths(self, text: str) -> str:
+        if _Sandbox not in text:
+            return text
+        # longest first, so that directories don't eat file paths
+        for mapped in sorted(self.paths, key=len, reverse=True):
+            local = self.paths[mapped]
+            text = text.replace(mapped, local).replace(mapped.replace('/', '\\'), local)
+        return text
+
+@dataclass
+class _Remote_Worker:
+    host: str
+    port: int
+    slots: int = 0
+    # jobs sent to this worker and not reaped yet
+    running: int = 0
+    # cleared after the first transport failure, no more jobs are sent then
+    alive: bool = True
+    # shared secret of the worker, see serve()
+    token: str = field(default=None, repr=False)
+
+    def __str__(self) -> str:
+        return f'{self.host}:{self.port}'
+
+    @staticmethod
+    def _Parse(address: str, token: str = None) -> '_Remote_Worker':
+        host, _, port = address.strip().rpartition(':')
+        if not host:
+            return _Remote_Worker(port or '127.0.0.1', _Default_Port, token=token)
+        if not port.isdigit():
+            raise ValueError(f'bad worker address "{address}", expected host[:port]')
+        return _Remote_Worker(host, int(port), token=token)
+
+    def _Request(self, header: dict, blobs: list[bytes] = (), timeout: float = _Connect_Timeout) -> tuple[dict, list[bytes]]:
+        try:
+            with socket.create_connection((self.host, self.port), timeout=_Connect_Timeout) as sock:
+                sock.settimeout(timeout)
+                if self.token:
+                    header = dict(header, token=self.token)
+                _Send(sock, header, blobs)
+                reply, blobs = _Receive(sock)
+        except (ValueError, struct.error) as e:
+            raise _Remote_Error(f'malformed reply: {e}')
+        if 'error' in reply:
+            raise _Remote_Error(reply['error'])
+        return reply, blobs
+
+    def _Connect(self, toolchain: str) -> bool:
+        """
+            Asks worker for its slots.
+            Workers with a different MSVC version are not used, their objects and ifcs would not be compatible.
+        """
+        try:
+            reply, _ = self._Request({ 'kind': 'hello', 'version': _Protocol_Version })
+        except OSError as e:
+            cts_print_warning(section='remote', text=f'worker {self} is not available: {e}')
+            return False
+        if reply.get('version') != _Protocol_Version:
+            cts_print_warning(section='remote', text=f'worker {self} speaks protocol {reply.get("version")}, expected {_Protocol_Version}')
+            return False
+        if toolchain and reply.get('toolchain') and reply['toolchain'] != toolchain:
+            cts_print_warning(section='remote', text=f'worker {self} has MSVC {reply["toolchain"]}, expected {toolchain}')
+            return False
+        self.slots = max(0, int(reply.get('slots', 0)))
+        cts_print(section='remote', subsection=str(self), text=f'{self.slots} slots')
+        return self.slots > 0
+
+    def _Compile(self, request: _Remote_Request) -> tuple[str, str, int]:
+        """
+            Sends compilation to the worker and writes produced outputs.
+            Returns (stdout, stderr, returncode) with local paths in diagnostics.
+        """
+        names = list(request.files)
+        reply, blobs = self._Request({
+            'kind': 'compile',
+            'args': request.args,
+            'files': names,
+            'directories': request.directories,
+            'outputs': list(request.outputs),
+        }, [ request.files[n] for n in names ], timeout=_Compile_Timeout)
+
+        for name, content in zip(reply.get('outputs', ()), blobs):
+            local = request.outputs.get(name)
+            if not local:
+                raise _Remote_Error(f'unexpected output {name}')
+            create_directory(get_parent_directory(local))
+            with open(local, 'wb') as f:
+                f.write(content)
+            invalidate(local)
+
+        return (
+            request._Restore_Paths(reply.get('stdout', '')),
+            request._Restore_Paths(reply.get('stderr', '')),
+            int(reply.get('returncode', 1))
+        )
+
+@dataclass
+class _Remote_Command:
+    """
+        Compiles on a remote worker in a background thread, same interface as _Async_Command.
+        Falls back to the local command if the worker fails to compile for reasons other than the sources.
+    """
+    name: str
+    worker: _Remote_Worker
+    # cl.exe arguments without the tool name
+    args: list[str]
+    inputs: list[PathLike]
+    outputs: list[PathLike]
+    # launches local command
+    fallback: Callable[[], _Async_Command]
+    logger: Callable[[str, str, str], None] = None
+    parser: Callable[[str, str, int], tuple[str, str, int]] = None
+    line_parser: Callable[[str], None] = None
+    log: PathLike = None
+
+    _thread: Thread = field(default=None, init=False, repr=False)
+    _local: _Async_Command = field(default=None, init=False, repr=False)
+    _output: tuple[str, str, int]|BaseException = field(default=None, init=False, repr=False)
+
+    def _Watch(self, completed: Queue, token = None):
+        assert not self._thread
+        if self.logger:
+            self.logger('remote', self.name, str(self.worker))
+
+        def compile():
+            try:
+                try:
+                    request = _Remote_Request._Build(self.args, self.inputs, self.outputs)
+                    self._output = self.worker._Compile(request)
+                except _Remote_Error as e:
+                    self.worker.alive = False
+                    raise
+                if self.log:
+                    with open(self.log, 'w') as f:
+                        f.write('\n'.join(o for o in self._output[:2] if o))
+            except OSError as e:
+                cts_print_warning(section='remote', text=f'{self.name} :: worker {self.worker} failed, compiling locally: {e}')
+                try:
+                    self._local = self.fallback()
+                    self._local._Watch(completed, self if token is None else token)
+                    return
+                except BaseException as e:
+                    self._output = e
+            except BaseException as e:
+                self._output = e
+            completed.put(self if token is None else token)
+
+        self._thread = Thread(target=compile, name=f'indigo: {self.name} remote', daemon=True)
+        self._thread.start()
+
+    def _Cancel(self):
+        # request sent to the worker can't be withdrawn, its result is dropped by the caller
+        if self._local:
+            self._local._Cancel()
+
+    def _Await(self) -> tuple[str, str, int]:
+        self._thread.join()
+        if self._local:
+            return self._local._Await()
+        if isinstance(self._output, BaseException):
+            raise self._output
+        stdout, stderr, returncode = self._output
+        if self.line_parser:
+            for line in stdout.splitlines():
+                self.line_parser(line)
+        if self.logger:
+            self.logger('await', self.name, '')
+        if self.parser:
+            return self.parser(stdout, stderr, returncode)
+        return stdout, stderr, returncode
+
+
+class _Remote_Worker_Handler(socketserver.BaseRequestHandler):
+    server: '_Remote_Worker_Server'
+
+    def handle(self):
+        try:
+            header, blobs = _Receive(self.request)
+            if self.server.token and not hmac.compare_digest(str(header.get('token', '')), self.server.token):
+                _Send(self.request, { 'error': 'unauthorized, worker token does not match' })
+                return
+            match header.get('kind'):
+                case 'hello':
+                    _Send(self.request, {
+                        'version': _Protocol_Version,
+                        'slots': self.server.slots,
+                        'toolchain': _Toolchain(self.server.compiler)
+                    })
+                case 'compile':
+                    with self.server.semaphore:
+                        reply, outputs = self.server._Compile(header, blobs)
+                    _Send(self.request, reply, outputs)
+                case kind:
+                    _Send(self.request, { 'error': f'unknown request {kind}' })
+        except (OSError, ValueError, struct.error) as e:
+            try:
+                _Send(self.request, { 'error': f'{type(e).__name__}: {e}' })
+            except OSError:
+                pass
+
+class _Remote_Worker_Server(socketserver.ThreadingTCPServer):
+    """
+        Compiles requests of remote clients by @compiler in temporary sandboxes, @slots at a time.
+        Only flags and paths that clients produce are accepted, requests must carry @token if it is set.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address: tuple[str, int], compiler: PathLike, slots: int, sandbox_root: PathLike = None, token: str = None):
+        super().__init__(address, _Remote_Worker_Handler)
+        self.compiler = compiler
+        self.slots = slots
+        self.semaphore = Semaphore(slots)
+        self.sandbox_root = sandbox_root
+        self.token = token
+
+    @staticmethod
+    def _Local_Path(sandbox: PathLike, name: str) -> PathLike:
+        if not name.startswith(_Sandbox + '/'):
+            raise ValueError(f'path {name} is outside of the sandbox')
+        relative = os.path.normpath(name[len(_Sandbox) + 1:])
+        if os.path.isabs(relative) or relative.startswith('..'):
+            raise ValueError(f'path {name} is outside of the sandbox')
+        return os.path.join(sandbox, relative)
+
+    def _Compile(self, header: dict, blobs: list[bytes]) -> tuple[dict, list[bytes]]:
+        if len(header['files']) != len(blobs):
+            raise ValueError('files and blobs mismatch')
+        _Check_Args(header['args'])
+        if self.sandbox_root:
+            os.makedirs(self.sandbox_root, exist_ok=True)
+        sandbox = os.path.realpath(tempfile.mkdtemp(prefix='indigo.', dir=self.sandbox_root))
+        try:
+            for directory in header['directories']:
+                os.makedirs(self._Local_Path(sandbox, directory), exist_ok=True)
+            for name, content in zip(header['files'], blobs):
+                path = self._Local_Path(sandbox, name)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                if name.endswith('.toml'):
+                    # ifc maps must not point compiler to files outside of the sandbox
+                    for line in content.decode(errors='replace').splitlines():
+                        if line.startswith('ifc = '):
+                            _Check_Sandboxed(line[len('ifc = '):].strip("'"))
+                    content = content.replace(_Sandbox.encode(), sandbox.encode())
+                with open(path, 'wb') as f:
+                    f.write(content)
+
+            args = [ a.replace(_Sandbox, sandbox) for a in header['args'] ]
+            r = subprocess.run(executable=self.compiler, args=[ 'CL.EXE', *args ], cwd=sandbox, capture_output=True)
+
+            def sandboxed(text: bytes) -> str:
+                return text.decode(errors='replace').strip().replace(sandbox, _Sandbox)
+
+            names = []
+            outputs = []
+            for name in header['outputs']:
+                path = self._Local_Path(sandbox, name)
+                if os.path.isfile(path):
+                    with open(path, 'rb') as f:
+                        outputs.append(f.read())
+                    names.append(name)
+            return {
+                'returncode': r.returncode,
+                'stdout': sandboxed(r.stdout),
+                'stderr': sandboxed(r.stderr),
+                'outputs': names
+            }, outputs
+        finally:
+            shutil.rmtree(sandbox, ignore_errors=True)
+
+
+def serve(host: str = '127.0.0.1', port: int = _Default_Port, slots: int = 0, sandbox_root: PathLike = None, compiler: PathLike = None, token: str = None):
+    """
+        Runs compile worker until interrupted. Listens on localhost by default.
+        Worker is meant for trusted networks only: sources may still #include any file readable by the worker.
+        Clients have to send @token if it is given, it is compared but not encrypted in transit.
+    """
+    if not compiler:
+        from indigo.msvc_shell import _Msvc, _Msvc_Tool
+        compiler = _Msvc._Instance()._Tool_Path(_Msvc_Tool.CL)
+    if not slots:
+        slots = os.cpu_count()
+    if not token and host not in ('127.0.0.1', 'localhost', '::1'):
+        cts_print_warning(section='remote', text=f'listening on {host} without a token, any peer may compile on this machine')
+    with _Remote_Worker_Server((host, port), compiler, slots, sandbox_root, token) as server:
+        cts_print(section='remote', subsection=f'{host}:{server.server_address[1]}', text=f'serving {slots} slots with {compiler}')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    from argparse import ArgumentParser
+    parser = ArgumentParser('indigo.msvc_remote', description='indigo compile worker')
+    parser.add_argument('--host', type=str, default='127.0.0.1')
+    parser.add_argument('--port', '-p', type=int, default=_Default_Port)
+    parser.add_argument('--slots', '-j', type=int, default=0)
+    parser.add_argument('--sandbox', type=str, help='directory for temporary sandboxes')
+    parser.add_argument('--compiler', type=str, help='cl.exe path, found in PATH by default')
+    parser.add_argument('--token', type=str, default=os.environ.get('INDIGO_WORKERS_TOKEN'),
+        help='shared secret clients have to send, INDIGO_WORKERS_TOKEN by default')
+    args = parser.parse_args()
+    serve(args.host, args.port, args.slots, args.sandbox, args.compiler, args.token)
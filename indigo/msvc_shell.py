@@ -1,30 +1,142 @@
+import subprocess
 from enum import Enum
+from queue import Queue
+from collections import deque
 from dataclasses import dataclass, field
 from typing import Callable
+from time import time
 
-from indigo.filesystem import PathLike, remove_file, get_file_name, get_file_line
+from indigo.filesystem import PathLike, join, remove_file, get_file_name, get_parent_directory, get_file_lines, write_file_if_changed, invalidate, detach_hardlinks
 
 from indigo.console_text_styles import *
-from indigo.basic_shell import _Shell_Exec, _Shell_Exec_Async, _Async_Command
+from indigo.basic_shell import _Shell_Exec, _Shell_Exec_Async, _Async_Command, _Shell_Engine, _Shell_Timeout, CancelledError
+from indigo.msvc_remote import _Remote_Worker, _Remote_Command, _Toolchain, _Is_Remote_Compilable, _Has_Allowed_Flags, _Portable_Args
+from indigo.msvc_cache import _Remote_Cache, _Cached_Command, _Is_Cacheable
+from indigo.events import emit, listening, JobQueued, JobStarted, JobFinished, CacheLookup, Linked
 
 
 class _Msvc_Error(RuntimeError):
     pass
 
+# command lines longer than this go through @response files
+_Response_File_Threshold = 2048
+
 class _Msvc_Tool(Enum):
     CL = 'CL.EXE'
     LINK = 'LINK.EXE'
     LIB = 'LIB.EXE'
+    PGOMGR = 'PGOMGR.EXE'
+
+class _Msvc_Output:
+    """
+        Parses MSVC tool output line by line while the tool is running.
+        Prints diagnostics as they are produced and collects unique error locations.
+    """
+    def __init__(self):
+        self.errors: dict[str, None] = dict()
+        self._first_line: str = None
+        self._lines = 0
+
+    def feed(self, line: str):
+        self._lines += 1
+        if self._lines == 1:
+            # source file name echoed by cl.exe
+            self._first_line = line
+            return
+        if self._first_line is not None:
+            if not self._first_line.startswith('Microsoft (R)'):
+                cts_print(text=self._first_line, text_style=cts_underline, tab='  ')
+            self._first_line = None
+
+        if not line:
+            return
+        elif line.startswith('Microsoft (R)') or line.startswith('Copyright (C)'):
+            return
+        elif 'error C' in line or 'error LNK' in line:
+            cts_print_error(text=line)
+            _ = line.split(':')
+            __ = _[0].strip()
+            if len(__) < 3:
+                # drive
+                __ = _[1].strip()
+            self.errors[__ if __.endswith(')') else line] = None
+        elif 'warning C' in line or 'warning LNK' in line:
+            cts_print_warning(text=line)
+        else:
+            cts_print_info(text=line)
 
-@dataclass 
+    def finish(self, 
+        stdout: str,
+        stderr: str,
+        returncode: int
+    ) -> tuple[str, str, int]:
+        if self.errors:
+            error = _Msvc_Error(*self.errors)
+            error.returncode = returncode
+            raise error
+        return stdout, stderr, returncode
+
+@dataclass(eq=False)
 class _Msvc_Job:
     name: str
     command: _Async_Command
     callback: Callable[[int], bool] = None
+    # jobs that have to succeed before this one is launched
+    dependencies: list['_Msvc_Job'] = field(default_factory=list)
+    # None while pending or running
+    succeeded: bool = None
+    # files produced by the job
+    outputs: list[PathLike] = field(default_factory=list)
+    # runs once dependencies succeed, returns False if outputs are up to date and the job is not launched
+    prepare: Callable[[], bool] = None
+    # files shipped to remote workers, None if the job is compiled locally only
+    inputs: list[PathLike] = None
+    # remote worker the job was sent to
+    worker: _Remote_Worker = None
+    # f.e. 'CL.EXE', or path of executed unit test
+    tool: str = None
+    # time of launch, None if the job was not launched
+    started: float = None
+    # exit code of the tool, None until reaped or if it could not be parsed
+    returncode: int = None
+
+    _launch: Callable[[_Remote_Worker], _Async_Command|_Remote_Command] = field(default=None, repr=False)
+    # number of dependencies that are not finished yet, the job is ready at 0
+    _waiting: int = field(default=0, repr=False)
+    # pending jobs that wait for this one
+    _dependents: list['_Msvc_Job'] = field(default_factory=list, repr=False)
+
+    def _Fail(self) -> bool:
+        """
+            Reports failed run to the callback, f.e. batched compilations attribute it to each source.
+            Errors raised by the callback are logged, the job fails either way.
+        """
+        if self.callback:
+            try:
+                self.callback(1)
+            except Exception as e:
+                cts_print_warning(section='task', text=f'in task {self.name}: {type(e).__name__}: {e}')
+        return False
+
+    def _Is_Up_To_Date(self) -> bool:
+        """
+            Runs prepare hook, job is finished without being launched if it returns False.
+        """
+        if not self.prepare:
+            return False
+        try:
+            if self.prepare():
+                return False
+            self.succeeded = self.callback(0) if self.callback else True
+        except (AssertionError, OSError, ValueError, _Msvc_Error) as e:
+            cts_print_warning(section='task', text=f'in task {self.name}: {type(e).__name__}: {e}')
+            self.succeeded = False
+        return True
 
     def _Await(self) -> bool:
         try:
             _, _, returncode = self.command._Await()
+            self.returncode = returncode
             if self.callback:
                 try:
                     return self.callback(returncode)
@@ -36,9 +148,21 @@ class _Msvc_Job:
             else: 
                 return returncode == 0
         except _Msvc_Error as e:
+            self.returncode = getattr(e, 'returncode', None)
             # consume error locations
             _Msvc._Error_Summary(e)
-            return False 
+            return self._Fail()
+        except _Shell_Timeout as e:
+            cts_print_warning(section='task', text=f'in task {self.name}: {e}')
+            return self._Fail()
+        except OSError as e:
+            # tool failed to launch, f.e. missing executable
+            self.returncode = None
+            cts_print_warning(section='task', text=f'in task {self.name}: {type(e).__name__}: {e}')
+            return self._Fail()
+        except CancelledError:
+            cts_print_warning(section='task', text=f'{self.name} :: cancelled')
+            return False
 
 _Msvc_Instance = None
 class _Msvc:
@@ -51,7 +175,23 @@ class _Msvc:
             from os import cpu_count
             jobs = cpu_count()
         self._max_jobs = jobs
+        # local processes, including synchronous ones, never exceed job slots
+        _Shell_Engine._Instance().resize(jobs)
+        # seconds a local job may run before it is killed, see set_timeout()
+        self._timeout: float = None
+        # compile workers, see connect_workers()
+        self._workers: list[_Remote_Worker] = list()
+        # see connect_cache()
+        self._cache: _Remote_Cache = None
+        # running jobs; finished ones are reaped in completion order
         self._jobs = list()
+        self._completed = Queue()
+        # scheduled jobs waiting for their dependencies or a free slot
+        self._pending = set()
+        # pending jobs whose dependencies are finished, in the order they became ready;
+        # compilations with hermetic inputs are kept apart as only they can go to remote workers
+        self._ready = deque()
+        self._ready_hermetic = deque()
 
         assert self._Available(), \
             "MSVC tools were not found. Try Launch-VSDevShell.ps1 [-Arch amd64] first."
@@ -102,48 +242,36 @@ class _Msvc:
         if not stdout:
             return stdout, stderr, returncode
 
-        stdoutlines = stdout.splitlines()
-        if len(stdoutlines) > 1 and not stdoutlines[0].startswith('Microsoft (R)'):
-            cts_print(text=stdoutlines[0], text_style=cts_underline, tab='  ')
-        
-        errors = list()
-        for line in stdoutlines[1:]:
-            if not line:
-                continue
-            elif line.startswith('Microsoft (R)') or line.startswith('Copyright (C)'):
-                continue
-            elif 'error C' in line or 'error LNK' in line:
-                cts_print_error(text=line)
-                _ = line.split(':')
-                __ = _[0].strip()
-                if len(__) < 3:
-                    # drive
-                    __ = _[1].strip()
-                errors.append(__ if __.endswith(')') else line)
-            elif 'warning C' in line or 'warning LNK' in line:
-                cts_print_warning(text=line)
-            else:
-                cts_print_info(text=line)
-        
-        if errors:
-            raise _Msvc_Error(*errors)
-
-        return stdout, stderr, returncode
+        output = _Msvc_Output()
+        for line in stdout.splitlines():
+            output.feed(line)
+        return output.finish(stdout, stderr, returncode)
         
     @staticmethod
     def _Error_Summary(err: _Msvc_Error):
         if err.args:
             cts_print(section='mvsc', text='error locations summary:')
-            # remove duplicates
+            # remove duplicates before touching any file
             locations = []
-            [ locations.append(l) for l in err.args if l not in locations ]
+            lines_by_file: dict[PathLike, set[int]] = dict()
+            for error_location in dict.fromkeys(err.args):
+                filename, _, line = error_location.rpartition('(')
+                # f.e. 'file.cpp(12,5)' with /diagnostics:column
+                line = line[:-1].split(',')[0]
+                if not filename or not line.isdigit():
+                    # f.e. 'LINK : fatal error LNK1104: ...'
+                    locations.append((error_location, None))
+                    continue
+                locations.append((filename, line))
+                lines_by_file.setdefault(filename, set()).add(int(line) - 1)
+            # read each file once
+            contents = { filename: get_file_lines(filename, lines) for filename, lines in lines_by_file.items() }
             # log locations
-            for error_location in locations:
-                _ = error_location.split('(')
-                assert len(_) == 2, f'bad error location: {error_location}'
-                filename, line = _
-                line = line[:-1]
-                line_content = get_file_line(filename, int(line) - 1) or 'N/A'
+            for filename, line in locations:
+                if line is None:
+                    cts_print(text=filename, tab='  ')
+                    continue
+                line_content = contents[filename].get(int(line) - 1) or 'N/A'
                 cts_print(
                     section=get_file_name(filename), 
                     section_style=cts_underline,
@@ -167,11 +295,32 @@ class _Msvc:
                 return self._link
             case _Msvc_Tool.LIB:
                 return self._lib
+            case _Msvc_Tool.PGOMGR:
+                # shipped next to the linker
+                return join(get_parent_directory(self._link), 'pgomgr.exe')
             case _:
                 raise ValueError(f'no such tool {tool}')
 
 
-    def _Exec(self, tool: _Msvc_Tool, args: tuple[str]|str) -> bool:
+    @staticmethod
+    def _Response_File_Args(args: list[str], response_file: PathLike = None) -> list[str]:
+        """
+            Moves tool arguments to @response_file if command line is too long.
+            Response file is only rewritten when its content changes.
+        """
+        if not response_file or sum(len(a) + 1 for a in args) < _Response_File_Threshold:
+            return args
+        content = '\n'.join( subprocess.list2cmdline((a, )) for a in args[1:] )
+        # tools read utf-16 response files with BOM, so non-ascii paths survive
+        write_file_if_changed(response_file, content, encoding='utf-16')
+        return [ args[0], f'@{response_file}' ]
+
+    def _Exec(self, 
+        tool: _Msvc_Tool, 
+        args: tuple[str]|str, 
+        response_file: PathLike = None, 
+        outputs: list[PathLike] = None
+    ) -> bool:
         try:
             is_build_job = isinstance(tool, _Msvc_Tool)
             executable = self._Tool_Path(tool)
@@ -180,76 +329,358 @@ class _Msvc:
                 args = [ tool.value if is_build_job else tool, *(args.split(' ')) ]
             else:
                 args = [ tool.value if is_build_job else tool, *args ]
+            args = _Msvc._Response_File_Args(args, response_file)
+            detach_hardlinks(*(outputs or ()))
                 
-            _, _, returncode = _Shell_Exec(
-                executable=executable, 
-                args=args,
-                logger=_Msvc._Default_Logger, 
-                parser=_Msvc._Parser if is_build_job else _Msvc._Default_Parser
-            )
+            try:
+                _, _, returncode = _Shell_Exec(
+                    executable=executable, 
+                    args=args,
+                    logger=_Msvc._Default_Logger, 
+                    parser=_Msvc._Parser if is_build_job else _Msvc._Default_Parser,
+                    timeout=self._timeout
+                )
+            finally:
+                invalidate(*(outputs or ()))
             return returncode == 0
         except _Msvc_Error as e:
             # consume error locations
             _Msvc._Error_Summary(e)
             return False
+        except _Shell_Timeout as e:
+            cts_print_warning(section='task', text=str(e))
+            return False
+        except OSError as e:
+            # tool failed to launch, f.e. missing executable
+            cts_print_warning(section='task', text=f'{type(e).__name__}: {e}')
+            return False
+
+    def set_timeout(self, seconds: float|None):
+        """
+            Kills local jobs, unit tests included, that run longer than @seconds, they fail then.
+        """
+        self._timeout = seconds or None
+
+    def connect_workers(self, addresses: list[str], token: str = None) -> int:
+        """
+            Adds remote compile workers at host[:port] @addresses, see indigo.msvc_remote.
+            @token is sent with every request if workers require one.
+            Returns number of remote slots.
+        """
+        toolchain = _Toolchain(self._cl)
+        for address in addresses:
+            if not address.strip():
+                continue
+            worker = _Remote_Worker._Parse(address, token)
+            if worker._Connect(toolchain):
+                self._workers.append(worker)
+        return self._Remote_slots()
+
+    def connect_cache(self, url: str, roots: dict[str, PathLike], read_only: bool = False):
+        """
+            Looks compilations, archives and links up in remote cache at @url before running them, see indigo.msvc_cache.
+            Results are uploaded unless @read_only.
+        """
+        self._cache = _Remote_Cache(url, roots, _Toolchain(self._cl), read_only)
+        cts_print(section='cache', subsection=self._cache.url, text='read-only' if read_only else 'read-write')
+
+    def _Remote_slots(self) -> int:
+        return sum(w.slots for w in self._workers if w.alive)
+
+    def _Local_jobs(self) -> int:
+        return sum(1 for j in self._jobs if not j.worker)
+
+    def _Free_worker(self) -> _Remote_Worker|None:
+        # least loaded first
+        workers = [ w for w in self._workers if w.alive and w.running < w.slots ]
+        return min(workers, key=lambda w: w.running / w.slots) if workers else None
+
+    def _Reap(self) -> bool:
+        """
+            Blocks until any running job finishes, then runs its callback.
+            Returns job's result.
+        """
+        job: _Msvc_Job = self._completed.get()
+        self._jobs.remove(job)
+        if job.worker:
+            job.worker.running -= 1
+        invalidate(*job.outputs)
+        job.succeeded = job._Await()
+        if job.succeeded and isinstance(job.command, _Cached_Command):
+            job.command._Store()
+        _Msvc._Emit_Finished(job)
+        self._Finished(job)
+        self._Dispatch()
+        return job.succeeded
+
+    @staticmethod
+    def _Emit_Finished(job: _Msvc_Job):
+        launched = job.started is not None
+        duration = time() - job.started if launched else 0.0
+        if listening(CacheLookup) and isinstance(job.command, _Cached_Command):
+            emit(CacheLookup(job.name, job.tool, job.command.key, bool(job.command.hit)))
+        if listening(JobFinished):
+            emit(JobFinished(
+                job.name, job.tool, bool(job.succeeded), job.returncode, duration,
+                getattr(job.command, 'peak_rss', None) if launched else None, 
+                str(job.worker) if job.worker else None, 
+                launched
+            ))
+        if listening(Linked) and job.tool in (_Msvc_Tool.LINK.value, _Msvc_Tool.LIB.value) and job.outputs:
+            emit(Linked(job.name, job.tool, job.outputs[0], bool(job.succeeded), duration, launched))
+
+    def _Make_Ready(self, job: _Msvc_Job):
+        (self._ready if job.inputs is None else self._ready_hermetic).append(job)
+
+    def _Finished(self, job: _Msvc_Job):
+        """
+            Moves pending jobs that only waited for @job to the ready queues.
+        """
+        for dependent in job._dependents:
+            dependent._waiting -= 1
+            if not dependent._waiting and dependent in self._pending:
+                self._Make_Ready(dependent)
+        job._dependents.clear()
+
+    def _Dispatch(self):
+        """
+            Launches ready jobs while there are free slots.
+            Local slots are taken first, compilations with hermetic inputs overflow to remote workers.
+            Jobs with failed dependencies are dropped.
+        """
+        while self._ready or self._ready_hermetic:
+            local = self._Local_jobs() < self._max_jobs
+            worker = None
+            if local:
+                # hermetic compilations may still find a remote worker, local slots go to the others first
+                job = (self._ready or self._ready_hermetic).popleft()
+            else:
+                worker = self._Free_worker() if self._ready_hermetic else None
+                if not worker:
+                    return
+                job = self._ready_hermetic.popleft()
+
+            self._pending.remove(job)
+            if all(d.succeeded for d in job.dependencies):
+                if job._Is_Up_To_Date():
+                    _Msvc._Emit_Finished(job)
+                    self._Finished(job)
+                    continue
+                job.worker = worker
+                # published outputs are hardlinked, tools may update them in place
+                detach_hardlinks(*job.outputs)
+                job.started = time()
+                job.command = job._launch(job.worker)
+                if job.worker:
+                    job.worker.running += 1
+                self._jobs.append(job)
+                job.command._Watch(self._completed, job)
+                if listening(JobStarted):
+                    emit(JobStarted(job.name, job.tool, str(job.worker) if job.worker else None))
+            else:
+                job.succeeded = False
+                cts_print_warning(section='task', text=f'{job.name} :: skipped, dependency failed')
+                _Msvc._Emit_Finished(job)
+                self._Finished(job)
 
     def _Fail_Fast(self):
+        """
+            Drops pending jobs and cancels running ones, their processes are killed.
+        """
+        for job in self._pending:
+            # jobs scheduled later must not wait for dropped ones
+            job.succeeded = False
+        self._pending.clear()
+        self._ready.clear()
+        self._ready_hermetic.clear()
         for job in self._jobs:
-            job._Await()
-        self._jobs.clear()
+            job.command._Cancel()
+        while self._jobs:
+            self._Reap()
 
-    def _Exec_Async(self, name: str, tool: _Msvc_Tool, args: tuple[str]|str, callback: Callable[[], bool] = None) -> bool:
-        while len(self._jobs) >= self._max_jobs:
-            job: _Msvc_Job = self._jobs.pop(0)
-            if not job._Await():
+    def _Exec_Async(self, 
+        name: str, 
+        tool: _Msvc_Tool, 
+        args: tuple[str]|str, 
+        callback: Callable[[], bool] = None,
+        dependencies: list[_Msvc_Job] = None,
+        log: PathLike = None,
+        response_file: PathLike = None,
+        outputs: list[PathLike] = None,
+        prepare: Callable[[], bool] = None,
+        inputs: list[PathLike] = None
+    ) -> _Msvc_Job:
+        """
+            Schedules job in the pool.
+            Job is launched once all of its @dependencies succeed.
+            Tool output is parsed while the job runs and spilled to @log if given.
+            Long command lines are passed through @response_file if given.
+            Cached filesystem state of @outputs is invalidated once the job finishes.
+            @prepare runs right before launch, the job is skipped as succeeded if it returns False.
+            Compilations may be sent to remote workers along with their @inputs (source, headers and ifcs).
+            Jobs with @inputs are looked up in remote cache first, if connected.
+            Returns scheduled job, or None if any other job has failed.
+        """
+        while len(self._jobs) >= self._max_jobs + self._Remote_slots():
+            if not self._Reap():
                 self._Fail_Fast()
-                return False
+                return None
 
         is_build_job = isinstance(tool, _Msvc_Tool)
         if isinstance(args, str):
             args = [ tool.value if is_build_job else tool, *(args.split(' ')) ]
         else:
             args = [ tool.value if is_build_job else tool, *args ]
+        cache_inputs = None
+        if self._cache and inputs is not None and is_build_job and _Is_Cacheable(tool.value, args[1:]):
+            cache_inputs = inputs
+            if tool == _Msvc_Tool.CL:
+                # objects must not depend on the shared .pdb
+                args = [ args[0], *_Portable_Args(args[1:]) ]
+        if tool != _Msvc_Tool.CL or not self._workers or not _Is_Remote_Compilable(args[1:]) \
+            or not _Has_Allowed_Flags(_Portable_Args(args[1:])):
+            inputs = None
+        tool_args = args[1:]
+        args = _Msvc._Response_File_Args(args, response_file)
 
         try:
             executable = self._Tool_Path(tool)
             logger = _Msvc._Default_Logger
-            parser = _Msvc._Default_Parser
-            if is_build_job:
-                parser = _Msvc._Parser
 
-            cmd = _Shell_Exec_Async(name, executable, args, logger, parser)
-            self._jobs.append( _Msvc_Job(name, cmd, callback) )
-            return True
+            def launch(worker: _Remote_Worker = None) -> _Async_Command|_Remote_Command:
+                if worker:
+                    output = _Msvc_Output()
+                    return _Remote_Command(name, worker, tool_args, inputs, list(outputs or ()), launch,
+                                           logger, output.finish, output.feed, log)
+                if is_build_job:
+                    output = _Msvc_Output()
+                    return _Shell_Exec_Async(name, executable, args, logger, output.finish, output.feed, log, self._timeout)
+                return _Shell_Exec_Async(name, executable, args, logger, _Msvc._Default_Parser, None, log, self._timeout)
+
+            def launch_cached(worker: _Remote_Worker = None) -> _Cached_Command:
+                output = _Msvc_Output()
+                return _Cached_Command(name, self._cache, tool.value, tool_args, cache_inputs, list(outputs or ()),
+                                       lambda: launch(worker), logger, output.finish, output.feed, log)
+
+            job = _Msvc_Job(
+                name, None, callback, 
+                dependencies=[ d for d in (dependencies or ()) if d ],
+                outputs=list(outputs or ()),
+                prepare=prepare,
+                inputs=inputs,
+                tool=tool.value if is_build_job else tool,
+                _launch=launch_cached if cache_inputs is not None else launch
+            )
+            self._pending.add(job)
+            for dependency in job.dependencies:
+                if dependency.succeeded is None:
+                    dependency._dependents.append(job)
+                    job._waiting += 1
+            if not job._waiting:
+                self._Make_Ready(job)
+            if listening(JobQueued):
+                emit(JobQueued(job.name, job.tool))
+            self._Dispatch()
+            return job
         except:
             self._Fail_Fast()
             raise
 
     
-    def produce_object(self, args: tuple[str]|str) -> bool:
-        return self._Exec(_Msvc_Tool.CL, args)
+    def produce_object(self, args: tuple[str]|str, response_file: PathLike = None, outputs: list[PathLike] = None) -> bool:
+        return self._Exec(_Msvc_Tool.CL, args, response_file, outputs)
 
-    def produce_object_async(self, path: PathLike, args: tuple[str]|str, callback: Callable[[int], bool] = None) -> bool:
-        return self._Exec_Async(path, _Msvc_Tool.CL, args, callback)
+    def produce_object_async(self, 
+        path: PathLike, 
+        args: tuple[str]|str, 
+        callback: Callable[[int], bool] = None,
+        dependencies: list[_Msvc_Job] = None,
+        log: PathLike = None,
+        response_file: PathLike = None,
+        outputs: list[PathLike] = None,
+        prepare: Callable[[], bool] = None,
+        inputs: list[PathLike] = None
+    ) -> _Msvc_Job:
+        return self._Exec_Async(path, _Msvc_Tool.CL, args, callback, dependencies, log, response_file, outputs, prepare, inputs)
     
     def await_jobs(self) -> bool:
-        if not self._jobs:
-            return True
         success = True
-        while self._jobs:
-            job = self._jobs.pop(0)
-            success = success and job._Await()
+        try:
+            while self._jobs or self._pending:
+                if not self._jobs:
+                    # only jobs with failed dependencies are left
+                    assert self._ready or self._ready_hermetic, 'pending jobs wait for each other'
+                    self._Dispatch()
+                    continue
+                if not self._Reap():
+                    success = False
+        except BaseException:
+            # f.e. KeyboardInterrupt, running processes are killed
+            self._Fail_Fast()
+            raise
+        if self._cache:
+            self._cache.flush()
         return success
         
     def produce_executable(self, args: tuple[str]|str) -> bool:
         return self._Exec(_Msvc_Tool.LINK, args)
+
+    def produce_executable_async(self, 
+        path: PathLike, 
+        args: tuple[str]|str, 
+        callback: Callable[[int], bool] = None,
+        dependencies: list[_Msvc_Job] = None,
+        log: PathLike = None,
+        response_file: PathLike = None,
+        outputs: list[PathLike] = None,
+        prepare: Callable[[], bool] = None,
+        inputs: list[PathLike] = None
+    ) -> _Msvc_Job:
+        return self._Exec_Async(path, _Msvc_Tool.LINK, args, callback, dependencies, log, response_file, outputs, prepare, inputs)
     
     def produce_dynamic_library(self, args: tuple[str]|str) -> bool:
         return self._Exec(_Msvc_Tool.LINK, args)
+
+    def produce_dynamic_library_async(self, 
+        path: PathLike, 
+        args: tuple[str]|str, 
+        callback: Callable[[int], bool] = None,
+        dependencies: list[_Msvc_Job] = None,
+        log: PathLike = None,
+        response_file: PathLike = None,
+        outputs: list[PathLike] = None,
+        prepare: Callable[[], bool] = None,
+        inputs: list[PathLike] = None
+    ) -> _Msvc_Job:
+        return self._Exec_Async(path, _Msvc_Tool.LINK, args, callback, dependencies, log, response_file, outputs, prepare, inputs)
         
+    def merge_profile_async(self, 
+        path: PathLike, 
+        args: tuple[str]|str, 
+        callback: Callable[[int], bool] = None,
+        dependencies: list[_Msvc_Job] = None,
+        log: PathLike = None,
+        outputs: list[PathLike] = None,
+        prepare: Callable[[], bool] = None
+    ) -> _Msvc_Job:
+        return self._Exec_Async(path, _Msvc_Tool.PGOMGR, args, callback, dependencies, log, None, outputs, prepare)
+
     def produce_static_library(self, args: tuple[str]|str) -> bool:
         return self._Exec(_Msvc_Tool.LIB, args)
 
+    def produce_static_library_async(self, 
+        path: PathLike, 
+        args: tuple[str]|str, 
+        callback: Callable[[int], bool] = None,
+        dependencies: list[_Msvc_Job] = None,
+        log: PathLike = None,
+        response_file: PathLike = None,
+        outputs: list[PathLike] = None,
+        prepare: Callable[[], bool] = None,
+        inputs: list[PathLike] = None
+    ) -> _Msvc_Job:
+        return self._Exec_Async(path, _Msvc_Tool.LIB, args, callback, dependencies, log, response_file, outputs, prepare, inputs)
+
 if __name__ == '__main__':
     def test():
         msvc = _Msvc()
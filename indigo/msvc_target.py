@@ -1,11 +1,16 @@
 from dataclasses import dataclass, field
 from typing import Callable
 from functools import cache, cached_property
+from time import time
+import os
+import shlex
+import hashlib
+import json
 
 from indigo.filesystem import *
 
 from indigo.msvc_flags import \
-    _CFlag, _LFlag, _IfcFlag, _Warnings_Mode, _Debug_Mode, \
+    _CFlag, _LFlag, _IfcFlag, _Warnings_Mode, _Debug_Mode, _Link_Mode, \
     build_msvc_compile_flags, \
     build_msvc_lib_flags, \
     build_msvc_link_flags, \
@@ -17,20 +22,68 @@ from indigo.msvc_flags import \
     build_msvc_cxx_flags, \
     build_msvc_uxx_flags, \
     dump_msvc_ifc_map, \
-    _Module, _Header_Unit, _Translation_Unit
+    _Module, _Header_Unit, _Translation_Unit, \
+    _IFC_MAP_TOML_MODULE_TEMPLATE, _IFC_MAP_TOML_HEADER_UNIT_TEMPLATE
 
 from indigo.console_text_styles import *
+from indigo.options import LinkProfile
+from indigo.source_scan import _Source_Scanner
+from indigo.msvc_modules import _Ifc, _Ifc_Registry
+from indigo.msvc_exports import exported_symbols, dump_module_definition
+from indigo.publish import _Artifact, publish_artifacts
+from indigo.events import emit, TargetStarted, TargetFinished, TargetCleaned, TestsStarted, TestStarted, TestFinished
 from indigo.msvc_shell import _Msvc, _Msvc_Error, _Msvc_Job
 from indigo.target import Target, CompilationError
 
+@dataclass(eq=False)
+class _Deferred_Compile:
+    # source path as passed to log_path and response_file_path
+    name: PathLike
+    # compiled file path as it appears in args
+    source: PathLike
+    args: list[str]
+    obj: PathLike
+    callback: Callable[[int], bool]
+    dependencies: list[_Msvc_Job]
+
 @dataclass
 class MsvcTarget(Target):
     ifc_search_directory: PathLike = None
+    # sources are scanned once for all configurations sharing this path
+    source_scan_path: PathLike = None
     
     _msvc: _Msvc = field(default_factory=_Msvc._Instance)
-    _deferred_commands: list[ Callable[[], bool] ] = field(default_factory=list)
+    _deferred_commands: list[_Deferred_Compile] = field(default_factory=list)
     _rebuilt_files: int = 0
 
+    # jobs scheduled in the current build
+    _compile_jobs: list[_Msvc_Job] = field(default_factory=list)
+    _library_job: _Msvc_Job = None
+    _executable_job: _Msvc_Job = None
+    _unit_test_jobs: dict[PathLike, _Msvc_Job] = field(default_factory=dict)
+
+    # unity batch file name => member sources, assigned once per build
+    _unity_batches: dict[PathLike, list[PathLike]] = None
+    # member source => unity batch file name
+    _unity_batch_of: dict[PathLike, PathLike] = None
+    _scheduled_unity_batches: set[PathLike] = field(default_factory=set)
+    _static_library_requested: bool = False
+
+    # precompiled header jobs by language (cxx), None if precompiled header is up to date
+    _precompiled_header_jobs: dict[bool, _Msvc_Job] = field(default_factory=dict)
+
+    # invariant flags, computed once per build
+    _compiler_flags: dict[bool, list[str]] = field(default_factory=dict)
+    _unit_test_flags: list[str] = None
+
+    _ifc_registry: _Ifc_Registry = None
+    _registered_interfaces: bool = False
+
+    # module name => .ixx source, scanned once per build
+    _module_interfaces_by_name: dict[str, PathLike] = None
+    # source path => (own header units, own modules, foreign header units, foreign modules)
+    _references: dict[PathLike, tuple[set, set, set, set]] = field(default_factory=dict)
+
     def __post_init__(self):
         Target.__post_init__(self)
 
@@ -40,51 +93,322 @@ class MsvcTarget(Target):
         if not path_exists(self.ifc_search_directory):
             create_directory(self.ifc_search_directory)
 
+        if not path_exists(self.log_directory):
+            create_directory(self.log_directory)
+
+        if not self._ifc_registry:
+            # module names are only unique within configuration
+            self._ifc_registry = _Ifc_Registry._Instance(self.configuration)
+
     def _on_clean(self):
         assert self.ifc_search_directory
         clean_directory(self.ifc_search_directory)
-        cts_print(section='project', subsection=self.name, text=f'cleaning :: {cts_okgreen("successful")}')
+        emit(TargetCleaned(self.name, self.configuration))
         
     def _on_build(self, building: bool):
-        if building:
-            cts_print(section='project', subsection=self.name, text=f'building :: {cts_warning("started")}')
-        else:
-            cts_print(section='project', subsection=self.name, text=f'building :: {cts_underline("no changes since last build")}')
+        emit(TargetStarted(self.name, self.configuration, building))
 
-    def _on_built(self, elapsed: float):
-        cts_print(section='project', subsection=self.name, text=f'building :: {cts_okgreen("finished")} in {elapsed:.3f}s')
+    def _on_built(self, elapsed: float, succeeded: bool = True):
+        emit(TargetFinished(self.name, self.configuration, elapsed, succeeded))
 
     def _on_test(self, running: bool):
-        if running:
-            cts_print(section='project', subsection=self.name, text=f'testing ;;')
-        else:
-            cts_print(section='project', subsection=self.name, text=f'testing :: {cts_underline("no changes since last build")}')
+        emit(TestsStarted(self.name, self.configuration, running))
 
     def _on_test_start(self, test: PathLike):
-        cts_print(
-            section='project',
-            subsection=self.name,
-            text=f'testing :: case {get_file_name(test, strip_ext=True)[len("test_"):]}'
-        )
+        emit(TestStarted(self.name, self.configuration, test))
     
     def _on_test_finish(self, test: PathLike, code: int):
-        if code == 0:
-            cts_print(
-                section='project',
-                subsection=self.name,
-                text=f'testing :: case {get_file_name(test, strip_ext=True)[len("test_"):]} ;; {cts_okgreen("SUCCESS")}'
-            )
-        else:
-            cts_print(
-                section='project',
-                subsection=self.name,
-                text=f'testing :: case {get_file_name(test, strip_ext=True)[len("test_"):]} ;; {cts_fail("FAILURE")}'
-            )
+        emit(TestFinished(self.name, self.configuration, test, code))
 
     def _on_config(self):
         cts_print_config_category('msvc')
         for property in ("ifc_search_directory", "ifc_map_path"):
             cts_print_config_pair(property.replace('_', ' '), getattr(self, property))
+        cts_print_config_pair('link profile', self.link_profile)
+        if self.is_dynamic_library:
+            cts_print_config_pair('dynamic library', self.dynamic_library_path)
+            cts_print_config_pair('module definition', self.module_definition_path)
+
+    @cached_property
+    def is_dynamic_library(self) -> bool:
+        """
+            Dynamic library targets produce .dll, static_library_path is its import library.
+        """
+        return self.options.dynamic_library and not self._Has_main()
+
+    def _Has_main(self) -> bool:
+        return any(get_file_name(source) in ('main.cpp', 'main.c') for source in self.source_files)
+
+    @cached_property
+    def link_profile(self) -> str:
+        profile = _Link_Mode._Match(self.options.link_profile, self.options.disable_optimizations)
+        if profile == LinkProfile.LtcgIncremental and (self.options.disable_optimizations or self.is_dynamic_library):
+            # no /GL objects to generate code for
+            return LinkProfile.Incremental
+        return profile
+
+    @cached_property
+    def whole_program_optimization(self) -> bool:
+        """
+            Objects are compiled with /GL and linked with /LTCG.
+            Dynamic libraries read their exports from COFF symbol tables, /GL objects don't have them.
+            Incremental linking is not available for /GL objects.
+        """
+        return not self.options.disable_optimizations \
+            and not self.is_dynamic_library \
+            and self.link_profile in (LinkProfile.Full, LinkProfile.LtcgIncremental)
+
+    def link_auxiliary_files(self, output: PathLike) -> list[PathLike]:
+        """
+            Files kept by the linker between links of @output, named after the link profile,
+                so that switching profiles doesn't reuse them.
+        """
+        return _Link_Mode.auxiliary_files(self.link_profile, self._Link_auxiliary_prefix(output))
+
+    def _Link_auxiliary_prefix(self, output: PathLike) -> PathLike:
+        return join(self.cache_directory, f'{get_file_name(output)}.{self.link_profile}')
+
+    def _Is_link_incomplete(self, output: PathLike) -> bool:
+        return not path_exists(output) or not all(path_exists(f) for f in self.link_auxiliary_files(output))
+
+    def _Linked_output(self) -> PathLike|None:
+        if self._Has_main():
+            return self.executable_path
+        if self.is_dynamic_library:
+            return self.dynamic_library_path
+        return None
+
+    @property
+    def profile_database_path(self) -> PathLike:
+        # kept between pgo runs, reused while linked inputs and training workloads are unchanged
+        return join(self.build_directory, 'pgo', f'{self.name}.pgd')
+
+    def _Profile_counts(self) -> list[PathLike]:
+        """
+            Returns .pgc files written by training runs of instrumented executable.
+        """
+        prefix = f'{get_file_name(self.profile_database_path, strip_ext=True)}!'
+        counts = []
+        for directory in (get_parent_directory(self.profile_database_path), self.build_directory):
+            # written by processes that don't report their outputs
+            invalidate(directory)
+            counts += [ join(directory, f) for f in list_directory(directory, prefix=prefix, suffix='.pgc') ]
+        return counts
+
+    @property
+    def module_definition_path(self) -> PathLike:
+        return join(self.cache_directory, f'{self.name}.def')
+
+    @property
+    def export_file_path(self) -> PathLike:
+        # written by lib.exe next to the import library
+        return join(self.build_directory, f'{self.name}.exp')
+
+    @cached_property
+    def log_directory(self) -> PathLike:
+        return join(self.build_directory, 'log')
+
+    def response_file_path(self, file: PathLike) -> PathLike:
+        """
+            Returns @response file path that long command lines producing given file are passed through.
+        """
+        assert self.cache_directory
+        return join(self.cache_directory, get_dot_path(file, add_ext='.rsp'))
+
+    def log_path(self, file: PathLike) -> PathLike:
+        """
+            Returns file path that raw tool output is written to, while producing given file.
+        """
+        return join(self.log_directory, get_dot_path(file, add_ext='.log'))
+
+    @cached_property
+    def source_scanner(self) -> _Source_Scanner:
+        assert self.cache_directory
+        return _Source_Scanner._Shared(self.source_scan_path or join(self.cache_directory, 'scan.json'))
+
+    def _Module_interfaces_by_name(self) -> dict[str, PathLike]:
+        if self._module_interfaces_by_name is None:
+            self._module_interfaces_by_name = dict()
+            for source in self.source_files:
+                if get_file_extension(source) == '.ixx':
+                    scan = self.source_scanner.scan(join(self.source_directory, source))
+                    if scan and scan.module:
+                        self._module_interfaces_by_name[scan.module] = source
+        return self._module_interfaces_by_name
+
+    def _Dependency_closure(self) -> set[str]:
+        """
+            Returns names of this target and of all targets it depends on transitively.
+        """
+        closure = { self.name }
+        for dependency in self._subtargets:
+            if isinstance(dependency, MsvcTarget):
+                closure |= dependency._Dependency_closure()
+            else:
+                closure.add(dependency.name)
+        return closure
+
+    def _Register_interfaces(self):
+        if self._registered_interfaces:
+            return
+        self._registered_interfaces = True
+        for dependency in self._subtargets:
+            if isinstance(dependency, MsvcTarget):
+                dependency._Register_interfaces()
+        for name, ixx in self._Module_interfaces_by_name().items():
+            source = join(self.source_directory, ixx)
+            self._ifc_registry.register_module(name, _Ifc(self.name, source, _Module.ifc(ixx, self.ifc_search_directory)))
+        for hxx in self.source_files:
+            if get_file_extension(hxx) == '.hxx':
+                source = join(self.source_directory, hxx)
+                self._ifc_registry.register_header_unit(hxx.replace('\\', '/'), _Ifc(self.name, source, _Header_Unit.ifc(hxx, self.ifc_search_directory)))
+        # same names in unrelated targets are fine, within dependency closure they are ambiguous
+        self._ifc_registry.check(self._Dependency_closure())
+
+    def _Resolve_references(self, source: PathLike, directory: PathLike = None) -> tuple[set, set, set, set]|None:
+        """
+            Follows imports and includes of @source transitively through header units and module interfaces,
+                Both of this target and of other targets registered in the solution,
+                And through ordinary headers found in include directories of the compilation.
+            Returns (own header units, own modules, foreign header units, foreign modules),
+                Or None if some source could not be scanned.
+        """
+        path = join(directory or self.source_directory, source)
+        if path in self._references:
+            return self._references[path]
+
+        self._Register_interfaces()
+        header_units = { hxx.replace('\\', '/'): hxx for hxx in self.source_files if get_file_extension(hxx) == '.hxx' }
+        # translation units included by unity batches
+        translation_units = { join(self.source_directory, s) for s in self.source_files if MsvcTarget._Is_leaf_source(s) }
+        module_interfaces = self._Module_interfaces_by_name()
+        registry = self._ifc_registry
+        closure = self._Dependency_closure()
+        # /I of the compilation, quoted includes are looked up next to the including file first
+        include_directories = list(dict.fromkeys((
+            directory or self.source_directory, 
+            self.source_directory, 
+            *(d.source_directory for d in self._subtargets)
+        )))
+
+        own_header_units, own_modules, foreign_header_units, foreign_modules = set(), set(), set(), set()
+        visited = set()
+        stack = [ path ]
+        while stack:
+            current = stack.pop()
+            if current in visited:
+                continue
+            visited.add(current)
+            scan = self.source_scanner.scan(current)
+            if scan is None:
+                self._references[path] = None
+                return None
+            for header in scan.headers:
+                if header in header_units:
+                    own_header_units.add(header_units[header])
+                    stack.append(join(self.source_directory, header_units[header]))
+                elif ifc := registry.header_unit(header, closure):
+                    foreign_header_units.add(header)
+                    stack.append(ifc.source)
+                elif header in translation_units:
+                    stack.append(header)
+                else:
+                    # ordinary header may import header units or modules, standard headers are not found
+                    for include_directory in (get_parent_directory(current), *include_directories):
+                        included = join(include_directory, header)
+                        if path_exists(included):
+                            stack.append(included)
+                            break
+            # module implementation units implicitly import their interface
+            for module in (*scan.imports, scan.module):
+                if module in module_interfaces:
+                    own_modules.add(module)
+                    stack.append(join(self.source_directory, module_interfaces[module]))
+                elif ifc := registry.module(module, closure):
+                    foreign_modules.add(module)
+                    stack.append(ifc.source)
+
+        own_header_units.discard(source)
+        self._references[path] = (own_header_units, own_modules, foreign_header_units, foreign_modules)
+        return self._references[path]
+
+    def _Remote_inputs(self, source: PathLike, args: list[str], directory: PathLike = None) -> list[PathLike]|None:
+        """
+            Returns files that compilation of @source needs besides the toolchain:
+                The source, headers it includes transitively and ifcs of modules of this target it imports.
+            Ifcs of header units and of other targets are found in @args by the remote client.
+            Returns None if neither remote workers nor remote cache are connected, or includes could not be resolved.
+        """
+        if not self._msvc._workers and not self._msvc._cache:
+            return None
+        references = self._Resolve_references(source, directory)
+        if references is None:
+            return None
+
+        include_directories = [ a[2:] for a in args if a.startswith('/I') ]
+        path = join(directory or self.source_directory, source)
+        inputs = [ path ]
+        stack = [ path ]
+        while stack:
+            current = stack.pop()
+            scan = self.source_scanner.scan(current)
+            if scan is None:
+                return None
+            for header in scan.headers:
+                if os.path.isabs(header):
+                    # unity batches include translation units by absolute paths
+                    return None
+                for include_directory in (get_parent_directory(current), *include_directories):
+                    included = join(include_directory, header)
+                    if path_exists(included):
+                        break
+                else:
+                    # standard and SDK headers are provided by the worker's toolchain
+                    continue
+                if included not in inputs:
+                    inputs.append(included)
+                    stack.append(included)
+
+        module_interfaces = self._Module_interfaces_by_name()
+        for module in sorted(references[1]):
+            inputs.append(_Module.ifc(module_interfaces[module], self.ifc_search_directory))
+        return inputs
+
+    def referenced_header_units(self, source: PathLike, directory: PathLike = None) -> set[PathLike]:
+        """
+            Returns header units of this target that @source imports or includes,
+                Directly or through other header units and module interfaces.
+            Only header units that were compiled so far are returned.
+        """
+        references = self._Resolve_references(source, directory)
+        if references is None:
+            # could not narrow down, passing all of them
+            return set(self.header_units)
+        return references[0] & self.header_units
+
+    def ifc_map_flags(self, source: PathLike, directory: PathLike = None, with_own_modules: bool = False) -> list[str]:
+        """
+            Returns /ifcMap flag with a minimal map of modules and header units that @source needs from other targets.
+            Modules of this target are mapped too if @with_own_modules, f.e. for sources compiled without /ifcSearchDir.
+        """
+        references = self._Resolve_references(source, directory)
+        registry = self._ifc_registry
+        if references is None:
+            # could not narrow down, mapping everything registered by dependencies
+            dependencies = set(d.name for d in self._subtargets)
+            header_units = registry.header_units_of(dependencies)
+            modules = registry.modules_of(dependencies)
+            if with_own_modules:
+                modules += list(self._Module_interfaces_by_name())
+        else:
+            _, own_modules, header_units, modules = references
+            if with_own_modules:
+                modules = modules | own_modules
+        # one map per source, rewritten in place
+        path = join(directory or self.source_directory, source)
+        map_path = join(self.ifc_search_directory, 'maps', f'{get_file_name(path)}.{hashlib.sha1(path.encode()).hexdigest()[:8]}.toml')
+        ifc_map = registry.ifc_map(map_path, modules, header_units, self._Dependency_closure())
+        return [ _IfcFlag.IfcMap, ifc_map ] if ifc_map else []
 
     @cached_property
     def ifc_map_path(self) -> PathLike:
@@ -92,31 +416,253 @@ class MsvcTarget(Target):
         return join(self.ifc_search_directory, 'ifcMap.toml')
 
     def dump_ifc_map(self) -> PathLike:
+        # dumped before the library is produced, so that dependent targets could compile in the meantime
         ifc_map = self.ifc_map_path
         if (self.header_units or self.module_interfaces) \
-            and path_exists(self.static_library_path) \
-            and is_modified_after(self.static_library_path, ifc_map):
+            and (self._rebuilt_files or not path_exists(ifc_map)):
             dump_msvc_ifc_map(
                 ifc_map, 
                 self.ifc_search_directory, 
                 self.module_interfaces, 
                 self.header_units
                 )
-            cts_print(section='project', subsection=self.name, text=f'wrote ifc map to {ifc_map}')
+            invalidate(ifc_map)
+            cts_print(section='project', subsection=self.display_name, text=f'wrote ifc map to {ifc_map}')
             return ifc_map
         else:
-            cts_print(section='project', subsection=self.name, text=f'ifc map :: {cts_underline("no changes since last build")}')
+            cts_print(section='project', subsection=self.display_name, text=f'ifc map :: {cts_underline("no changes since last build")}')
             return None
         
+    def is_relinking(self) -> bool:
+        return self._library_job is not None
+
+    def build(self, force: bool = False):
+        # duplicate module names are reported before anything is compiled
+        self._Register_interfaces()
+        output = self._Linked_output()
+        if output and self._Is_link_incomplete(output):
+            # f.e. link profile was switched, its auxiliary files don't exist yet
+            self._should_relink = True
+        # compilations update program database in place
+        detach_hardlinks(self.debug_information_path)
+        Target.build(self, force)
+
+    def await_build(self):
+        self.source_scanner.save()
+        if not self._msvc.await_jobs():
+            raise CompilationError()
+        if self._publish_requested:
+            self._publish_requested = False
+            self.publish_artifacts()
+
+    def published_artifacts(self) -> dict[str, _Artifact]:
+        """
+            Returns artifacts by their path relative to output_directory:
+                bin/ executable or dynamic library, their program databases and dynamic libraries of dependencies,
+                lib/ static or import library,
+                ifc/ interfaces of library targets with ifcMap.toml that maps them in output_directory.
+        """
+        artifacts: dict[str, _Artifact] = dict()
+        # written by cl.exe /Fd of every compilation, which doesn't report it as output
+        invalidate(self.debug_information_path)
+        def publish(relative: str, path: PathLike, kind: str):
+            if path_exists(path):
+                artifacts[relative] = _Artifact(path, kind)
+
+        if self._Has_main():
+            publish(f'bin/{self.name}.exe', self.executable_path, 'executable')
+            publish(f'bin/{self.name}.pdb', self.debug_information_path, 'debug_information')
+            for dll in self._Dependencies_dynamic_libraries():
+                publish(f'bin/{get_file_name(dll)}', dll, 'dynamic_library')
+            return artifacts
+
+        if self.is_dynamic_library:
+            publish(f'bin/{self.name}.dll', self.dynamic_library_path, 'dynamic_library')
+            publish(f'bin/{self.name}.pdb', self.debug_information_path, 'debug_information')
+            publish(f'lib/{self.name}.lib', self.static_library_path, 'import_library')
+        else:
+            publish(f'lib/{self.name}.lib', self.static_library_path, 'static_library')
+            publish(f'lib/{self.name}.pdb', self.debug_information_path, 'debug_information')
+
+        published_ifc_directory = join(self.output_directory, 'ifc')
+        ifc_map = []
+        for name, ixx in sorted(self._Module_interfaces_by_name().items()):
+            ifc = _Module.ifc(ixx, self.ifc_search_directory)
+            relative = os.path.relpath(ifc, self.ifc_search_directory).replace(os.sep, '/')
+            publish(f'ifc/{relative}', ifc, 'ifc')
+            ifc_map.append(_IFC_MAP_TOML_MODULE_TEMPLATE % (name, join(published_ifc_directory, relative)))
+        for hxx in sorted(h for h in self.source_files if get_file_extension(h) == '.hxx'):
+            ifc = _Header_Unit.ifc(hxx, self.ifc_search_directory)
+            relative = os.path.relpath(ifc, self.ifc_search_directory).replace(os.sep, '/')
+            publish(f'ifc/{relative}', ifc, 'ifc')
+            ifc_map.append(_IFC_MAP_TOML_HEADER_UNIT_TEMPLATE % (hxx.replace(os.sep, '/'), join(published_ifc_directory, relative)))
+        if ifc_map:
+            # kept unchanged between publishes with the same interfaces
+            path = join(self.build_directory, 'publish', 'ifcMap.toml')
+            create_directory(get_parent_directory(path))
+            write_file_if_changed(path, ''.join(ifc_map))
+            publish('ifc/ifcMap.toml', path, 'ifc_map')
+        return artifacts
+
+    def publish_artifacts(self):
+        assert self.output_directory
+        published = publish_artifacts(self.output_directory, self.published_artifacts(), 
+            target=self.name, 
+            configuration=self.configuration
+        )
+        cts_print(section='project', subsection=self.display_name, 
+            text=f'published to {self.output_directory} :: {published.updated} updated, {published.unchanged} unchanged, {published.removed} removed'
+        )
+
+    @staticmethod
+    def _Is_leaf_source(source: PathLike) -> bool:
+        # classic translation units and module implementation units are never imported by other sources
+        return get_file_extension(source) in ('.c', '.cpp', '.cxx')
+
     def resolve_modified_dependencies(self, modified_files: list[PathLike]) -> list[PathLike]:
-        if modified_files:
-            # TODO: incremental builds
+        self._Assign_unity_batches()
+        if self._unity_batches:
+            # batches that lost members are rebuilt too
+            for batch, members in self._unity_batches.items():
+                if is_modified_after(join(self.cache_directory, batch), self.cached_object_path(batch)):
+                    modified_files = modified_files + [ m for m in members if m not in modified_files ]
+
+        if self.options.precompiled_header:
+            # every translation unit depends on precompiled header
+            for cxx, extension in ((True, '.cpp'), (False, '.c')):
+                if any(get_file_extension(s) == extension for s in self.source_files) \
+                    and self._Precompiled_header_outdated(cxx):
+                    return self.source_files
+
+        if not all(MsvcTarget._Is_leaf_source(s) for s in modified_files):
+            # TODO: incremental builds of module units
             return self.source_files
-        return modified_files
+
+        # only modified translation units are compiled, objects of the rest are reused
+        # also when nothing was modified, but dependencies were relinked
+        modified = set(modified_files)
+        for source in self.source_files:
+            if source in modified:
+                continue
+            match get_file_extension(source):
+                case '.hxx':
+                    self.header_units.add(source)
+                case '.ixx':
+                    self.module_interfaces.add(source)
+                case '.cxx':
+                    self.module_implementations.add(source)
+                case '.c' | '.cpp':
+                    if get_file_name(source, strip_ext=True) == 'main':
+                        self.main_translation_unit = source
+                        continue
+                    self.translation_units.add(source)
+            self.object_files.add(self.cached_object_path(source))
+
+        if self.options.precompiled_header:
+            for cxx in (True, False):
+                obj = self.cached_object_path(get_file_name(self._Precompiled_header_source(cxx)))
+                if path_exists(obj):
+                    self.object_files.add(obj)
+
+        return [ s for s in self.source_files if s in modified ]
 
     def cached_object_path(self, source: PathLike) -> PathLike:
         assert self.cache_directory
+        if self.options.unity_build:
+            # members of unity batches are compiled into batch object
+            self._Assign_unity_batches()
+            source = self._unity_batch_of.get(source, source)
         return join(self.cache_directory, get_dot_path(source, add_ext='.obj'))
+
+    def _Assign_unity_batches(self):
+        """
+            Assigns eligible .cpp and .c sources to unity batches once per build and writes batch files.
+            Assignment is persisted in cache directory, sources keep their batch while they exist,
+                New sources fill the first batch with room, so an edit recompiles a single batch.
+        """
+        if self._unity_batches is not None:
+            return
+        self._unity_batches = dict()
+        self._unity_batch_of = dict()
+        if not self.options.unity_build:
+            return
+
+        state_path = join(self.cache_directory, 'unity.json')
+        state = dict()
+        if path_exists(state_path):
+            with open(state_path, 'r') as f:
+                state = json.load(f)
+
+        for extension in ('.cpp', '.c'):
+            candidates = [ 
+                s for s in self.source_files 
+                    if get_file_extension(s) == extension 
+                    and get_file_name(s, strip_ext=True) != 'main'
+                    and not match_glob(s, self.options.unity_exclude)
+            ]
+            sizes = { s: os.path.getsize(join(self.source_directory, s)) for s in candidates }
+            batches = [ [ m for m in batch if m in sizes ] for batch in state.get(extension, []) ]
+            assigned = set(m for batch in batches for m in batch)
+            for source in candidates:
+                if source in assigned:
+                    continue
+                for batch in batches:
+                    if len(batch) < self.options.unity_batch_size \
+                        and sum(sizes[m] for m in batch) + sizes[source] <= self.options.unity_batch_bytes:
+                        batch.append(source)
+                        break
+                else:
+                    batches.append([ source ])
+            # empty batches keep their place so that the following batches are not renamed
+            state[extension] = batches
+
+            for index, members in enumerate(batches):
+                if not members:
+                    continue
+                batch = f'unity.{index}{extension}'
+                write_file_if_changed(
+                    join(self.cache_directory, batch), 
+                    ''.join(f'#include "{join(self.source_directory, m)}"\n' for m in members)
+                )
+                self._unity_batches[batch] = members
+                for member in members:
+                    self._unity_batch_of[member] = batch
+
+        write_file_if_changed(state_path, json.dumps(state, indent=1))
+
+    def compile_unity_batch(self, batch: PathLike):
+        """
+            Compiles generated unity batch file once per build.
+        """
+        if batch in self._scheduled_unity_batches:
+            return
+        self._scheduled_unity_batches.add(batch)
+
+        cxx = get_file_extension(batch) == '.cpp'
+        obj = self.cached_object_path(batch)
+        args = self._Basic_compiler_flags(cxx)
+        if cxx:
+            args += build_msvc_cpp_flags(batch, 
+                self.referenced_header_units(batch, self.cache_directory), 
+                self.cache_directory, 
+                self.ifc_search_directory, 
+                self.cache_directory
+                )
+            args += self.ifc_map_flags(batch, self.cache_directory)
+        else:
+            args += build_msvc_c_flags(batch, 
+                self.cache_directory, 
+                self.cache_directory)
+        args += self._Precompiled_header_flags(cxx)
+
+        members = self._unity_batches[batch]
+        def callback(code: int) -> bool:
+            if code != 0:
+                return False
+            self.translation_units.update(members)
+            return True
+        
+        self._Defer_compile(batch, join(self.cache_directory, batch), args, callback, [ self._precompiled_header_jobs.get(cxx) ])
     
     def unit_test_object_path(self, uxx: PathLike) -> PathLike:
         assert self.cache_directory
@@ -138,12 +684,26 @@ class MsvcTarget(Target):
             self._on_test_finish(exe, code)
             return code == 0
         
-        return self._msvc._Exec_Async(get_file_name(exe), exe, tuple(), callback)
+        def prepare() -> bool:
+            self._Deploy_dynamic_libraries()
+            return True
+        
+        # unit test or libraries might still be linking
+        return bool(self._msvc._Exec_Async(
+            get_file_name(exe), exe, tuple(), callback, 
+            [ self._unit_test_jobs.get(exe), self._library_job, *self._Dependencies_library_jobs() ], 
+            self.log_path(get_file_name(exe)),
+            prepare=prepare
+        ))
 
     def await_unit_tests(self) -> bool:
+        self.source_scanner.save()
         return self._msvc.await_jobs()
 
     def compile_source_file(self, source: PathLike):
+        if self._unity_batch_of and source in self._unity_batch_of:
+            return self.compile_unity_batch(self._unity_batch_of[source])
+
         ext = get_file_extension(source)
         match ext:
             case '.c':
@@ -161,7 +721,12 @@ class MsvcTarget(Target):
             case _:
                 raise ValueError(f'unsupported source file extension: {ext}')
 
-    def _Basic_compiler_flags(self, cxx: bool = True):
+    def _Basic_compiler_flags(self, cxx: bool = True) -> list[str]:
+        if cxx not in self._compiler_flags:
+            self._compiler_flags[cxx] = self._Build_compiler_flags(cxx)
+        return list(self._compiler_flags[cxx])
+
+    def _Build_compiler_flags(self, cxx: bool = True) -> list[str]:
         warnings = _Warnings_Mode._Match(self.options.warning_level, self.options.treat_warnings_as_errors)
         debug = _Debug_Mode._Match(self.options.enable_debug_information, self.options.disable_optimizations, False)
         flags = build_msvc_compile_flags(
@@ -170,6 +735,8 @@ class MsvcTarget(Target):
             warnings=warnings, 
             debug=debug
             )
+        if not self.whole_program_optimization:
+            flags = [ f for f in flags if f != _CFlag.WholeProgramOptimization ]
         
         flags.append(_CFlag.IncludeDirectory(
             self.source_directory
@@ -177,18 +744,12 @@ class MsvcTarget(Target):
         ))
         
         for dependency in self._subtargets:
-            if not path_exists(dependency.static_library_path):
-                dependency.build()
-            assert path_exists(dependency.static_library_path)
+            MsvcTarget._Require_library(dependency)
 
             flags.append(_CFlag.IncludeDirectory(
                 dependency.source_directory
                 # relative_directory(dependency.source_directory, self.root_directory)
             ))
-            
-            if isinstance(dependency, MsvcTarget) and path_exists(dependency.ifc_map_path):
-                flags.append(_IfcFlag.IfcMap)
-                flags.append(dependency.ifc_map_path)
 
         # this options is ignored in linkless builds (cl.exe /c)
         # flags.append(_CFlag.EXEPath(self.executable_path))
@@ -199,40 +760,95 @@ class MsvcTarget(Target):
 
         return flags
     
+    @staticmethod
+    def _Require_library(dependency: Target):
+        if dependency.is_relinking():
+            return
+        if not path_exists(dependency.static_library_path):
+            dependency.build()
+        assert dependency.is_relinking() or path_exists(dependency.static_library_path)
+
     def _Dependencies_static_libraries(self) -> list[str]:
         libs = []
         
         for dependency in self._subtargets:
-            if not path_exists(dependency.static_library_path):
-                dependency.build()
-            assert path_exists(dependency.static_library_path)
-
+            MsvcTarget._Require_library(dependency)
             libs.append(dependency.static_library_path)
         
         return libs
+
+    def _Dependencies_library_jobs(self) -> list[_Msvc_Job]:
+        return [ d._library_job for d in self._subtargets if isinstance(d, MsvcTarget) and d._library_job ]
+
+    def _Dependencies_dynamic_libraries(self) -> list[PathLike]:
+        dlls = dict()
+        pending = list(self._subtargets)
+        while pending:
+            dependency = pending.pop()
+            if isinstance(dependency, MsvcTarget) and dependency.is_dynamic_library:
+                dlls[dependency.dynamic_library_path] = None
+            pending += dependency._subtargets
+        return list(dlls)
+
+    def _Deploy_dynamic_libraries(self):
+        """
+            Copies dynamic libraries of dependencies next to this Project's executables.
+        """
+        for dll in self._Dependencies_dynamic_libraries():
+            if path_exists(dll) and copy_file_if_newer(dll, join(self.build_directory, get_file_name(dll))):
+                cts_print(section='project', subsection=self.display_name, text=f'deployed {get_file_name(dll)}')
+
+    @staticmethod
+    def _Is_outdated(output: PathLike, inputs: list[PathLike]) -> bool:
+        return any(not path_exists(i) or is_modified_after(i, output) for i in inputs)
+
+    def _Link_prepare(self, output: PathLike, inputs: list[PathLike], auxiliary: list[PathLike] = ()) -> Callable[[], bool]:
+        """
+            Link jobs scheduled because dependencies were relinking are skipped 
+                if none of their @inputs changed, f.e. a dynamic library kept its exports.
+            Missing @auxiliary files of the link profile force a link.
+        """
+        def prepare() -> bool:
+            self._Deploy_dynamic_libraries()
+            if MsvcTarget._Is_outdated(output, inputs) or not all(path_exists(f) for f in auxiliary):
+                return True
+            cts_print(section='project', subsection=self.display_name, text=f'{get_file_name(output)} :: {cts_underline("inputs are unchanged")}')
+            return False
+        return prepare
     
+    def _Link_flags(self, output: PathLike) -> list[str]:
+        return build_msvc_link_flags(
+            self.options.warning_level > 0, 
+            self.options.enable_debug_information, 
+            self.link_profile, 
+            self._Link_auxiliary_prefix(output),
+            self.whole_program_optimization
+            )
+
     def _Basic_dll_flags(self):
-        flags = build_msvc_link_flags(self.options.warning_level > 0, self.options.enable_debug_information)
+        flags = self._Link_flags(self.dynamic_library_path)
 
+        flags.append( _LFlag.DynamicLibrary )
         flags.append( _LFlag.DLLPath(self.dynamic_library_path) )
-        flags += self._Dependencies_static_libraries()
 
         return flags
     
     def _Basic_exe_flags(self):
-        flags = build_msvc_link_flags(self.options.warning_level > 0, self.options.enable_debug_information)
+        flags = self._Link_flags(self.executable_path)
 
         flags.append( _LFlag.EXEPath(self.executable_path) )
-        
-        if path_exists(self.static_library_path):
-            flags.append(self.static_library_path)
-        else:
-            flags += self._Dependencies_static_libraries()
+        flags += self._Linked_libraries()
 
         return flags
 
+    def _Linked_libraries(self) -> list[PathLike]:
+        # static library contains dependencies' libraries
+        if self.is_relinking() or path_exists(self.static_library_path):
+            return [ self.static_library_path ]
+        return self._Dependencies_static_libraries()
+
     def _Basic_lib_flags(self):
-        flags = build_msvc_lib_flags(self.options.warning_level > 0, self.options.enable_debug_information)
+        flags = build_msvc_lib_flags(self.options.warning_level > 0, link_time_code_generation=self.whole_program_optimization)
     
         flags.append( _LFlag.LIBPath(self.static_library_path) )
         flags += self._Dependencies_static_libraries()
@@ -244,13 +860,15 @@ class MsvcTarget(Target):
         flags = self._Basic_compiler_flags()
         
         flags += build_msvc_hxx_flags(hxx, 
-            self.header_units, 
+            self.referenced_header_units(hxx), 
             self.source_directory, 
             self.ifc_search_directory, 
             self.cache_directory
             )
+        flags += self.ifc_map_flags(hxx)
         
-        if not self._msvc.produce_object(flags):
+        outputs = [ self.cached_object_path(hxx), _Header_Unit.ifc(hxx, self.ifc_search_directory) ]
+        if not self._msvc.produce_object(flags, self.response_file_path(hxx), outputs):
             raise CompilationError(hxx)
 
         self.header_units.add(hxx)
@@ -262,13 +880,15 @@ class MsvcTarget(Target):
         flags = self._Basic_compiler_flags()
         
         flags += build_msvc_ixx_flags(ixx, 
-            self.header_units, 
+            self.referenced_header_units(ixx), 
             self.source_directory, 
             self.ifc_search_directory, 
             self.cache_directory
             )
+        flags += self.ifc_map_flags(ixx)
         
-        if not self._msvc.produce_object(flags):
+        outputs = [ self.cached_object_path(ixx), _Module.ifc(ixx, self.ifc_search_directory) ]
+        if not self._msvc.produce_object(flags, self.response_file_path(ixx), outputs):
             raise CompilationError(ixx)
 
         self.module_interfaces.add(ixx)
@@ -279,205 +899,854 @@ class MsvcTarget(Target):
         args = self._Basic_compiler_flags()
         
         args += build_msvc_cxx_flags(cxx, 
-            self.header_units, 
+            self.referenced_header_units(cxx), 
             self.source_directory, 
             self.ifc_search_directory, 
             self.cache_directory
             )
+        args += self.ifc_map_flags(cxx)
 
-        def command() -> bool:
-            def callback(code: int) -> bool:
-                if code != 0:
-                    return False
-                self.module_implementations.add(cxx)
-                self.object_files.add(self.cached_object_path(cxx))
-                self._rebuilt_files += 1
-                return True
-            
-            if not self._msvc.produce_object_async(cxx, args, callback):
-                raise CompilationError(cxx)
-
+        def callback(code: int) -> bool:
+            if code != 0:
+                return False
+            self.module_implementations.add(cxx)
             return True
         
-        self._deferred_commands.append(command)
+        self._Defer_compile(cxx, join(self.source_directory, cxx), args, callback)
     
+    def precompiled_header_path(self, cxx: bool = True) -> PathLike:
+        assert self.cache_directory
+        return join(self.cache_directory, 'pch.cpp.pch' if cxx else 'pch.c.pch')
+
+    def _Precompiled_header_source(self, cxx: bool = True) -> PathLike:
+        # generated translation unit that only includes precompiled header
+        return join(self.cache_directory, 'pch.cpp' if cxx else 'pch.c')
+
+    def _Precompiled_header_stamp(self, cxx: bool = True) -> str:
+        # precompiled header is reproduced when header content or compiler flags change
+        # headers included by precompiled header are not tracked
+        header = join(self.source_directory, self.options.precompiled_header)
+        assert path_exists(header), f'no such precompiled header: {header}'
+        h = hashlib.sha1()
+        with open(header, 'rb') as f:
+            h.update(f.read())
+        h.update('\0'.join(self._Basic_compiler_flags(cxx)).encode())
+        return h.hexdigest()
+
+    def _Precompiled_header_outdated(self, cxx: bool = True) -> bool:
+        stamp = self.precompiled_header_path(cxx) + '.stamp'
+        if not path_exists(self.precompiled_header_path(cxx)) or not path_exists(stamp):
+            return True
+        with open(stamp, 'r') as f:
+            return f.read() != self._Precompiled_header_stamp(cxx)
+
+    def _Precompiled_header_flags(self, cxx: bool = True) -> list[str]:
+        """
+            Schedules precompiled header once per build if it's outdated.
+            Returns flags that use it.
+        """
+        header = self.options.precompiled_header
+        if not header:
+            return []
+
+        pch = self.precompiled_header_path(cxx)
+        source = self._Precompiled_header_source(cxx)
+        obj = self.cached_object_path(get_file_name(source))
+        if cxx not in self._precompiled_header_jobs:
+            job = None
+            if self._Precompiled_header_outdated(cxx):
+                write_file_if_changed(source, f'#include "{header}"\n')
+                stamp = self._Precompiled_header_stamp(cxx)
+
+                def callback(code: int) -> bool:
+                    if code != 0:
+                        return False
+                    write_file_if_changed(pch + '.stamp', stamp)
+                    return True
+
+                args = self._Basic_compiler_flags(cxx)
+                args += [ 
+                    _CFlag.CreatePrecompiledHeader(header), 
+                    _CFlag.PCHPath(pch), 
+                    _IfcFlag.ExplicitCXXTranslationUnit if cxx else _IfcFlag.ExplicitCTranslationUnit, 
+                    source, 
+                    _CFlag.OBJPath(obj) 
+                ]
+                job = self._msvc.produce_object_async(get_file_name(pch), args, callback,
+                    log=self.log_path(get_file_name(pch)),
+                    response_file=self.response_file_path(get_file_name(pch)),
+                    outputs=[ pch, obj ]
+                )
+                if not job:
+                    raise CompilationError(header)
+                self._compile_jobs.append(job)
+                self._rebuilt_files += 1
+            self._precompiled_header_jobs[cxx] = job
+            # precompiled header object carries debug information and has to be linked
+            self.object_files.add(obj)
+
+        return [ _CFlag.UsePrecompiledHeader(header), _CFlag.PreincludeFile(header), _CFlag.PCHPath(pch) ]
+
     def compile_c_translation_unit(self, c: PathLike):
         args = self._Basic_compiler_flags(cxx=False)
         
         args += build_msvc_c_flags(c,
             self.source_directory,
             self.cache_directory)
+        args += self._Precompiled_header_flags(cxx=False)
         
-        def command() -> bool:
-            def callback(code: int) -> bool:
-                if code != 0:
-                    return False
-                self.translation_units.add(c)
-                if get_file_name(c) == 'main.c':
-                    assert not self.main_translation_unit
-                    self.main_translation_unit = c
-                else:
-                    self.object_files.add(self.cached_object_path(c))
-                self._rebuilt_files += 1
-                return True
+        def callback(code: int) -> bool:
+            if code != 0:
+                return False
+            self.translation_units.add(c)
+            return True
 
-            if not self._msvc.produce_object_async(c, args, callback):
-                raise CompilationError(c)
+        if get_file_name(c) == 'main.c':
+            assert not self.main_translation_unit
+            self.main_translation_unit = c
+            # library is linked while main translation unit compiles
+            self.build_static_library()
+            self._rebuilt_files += 1
+            self._compile_jobs.append(self._Launch_compile(_Deferred_Compile(
+                c, join(self.source_directory, c), args, self.cached_object_path(c), callback, [ self._precompiled_header_jobs.get(False) ]
+            )))
+            return
 
-            return True
-        
-        self._deferred_commands.append(command)
+        self._Defer_compile(c, join(self.source_directory, c), args, callback, [ self._precompiled_header_jobs.get(False) ])
     
     def compile_cpp_translation_unit(self, cpp: PathLike):
         args = self._Basic_compiler_flags()
         
         args += build_msvc_cpp_flags(cpp, 
-            self.header_units, 
+            self.referenced_header_units(cpp), 
             self.source_directory, 
             self.ifc_search_directory, 
             self.cache_directory
             )
+        # main translation unit is compiled without /ifcSearchDir
+        args += self.ifc_map_flags(cpp, with_own_modules=get_file_name(cpp) == 'main.cpp')
+        args += self._Precompiled_header_flags()
         
         if get_file_name(cpp) == 'main.cpp':
             assert not self.main_translation_unit
             self.main_translation_unit = cpp
+            # library is linked while main translation unit compiles
             self.build_static_library()
-
-            if path_exists(self.ifc_map_path):
-                args.append(_IfcFlag.IfcMap)
-                args.append(self.ifc_map_path)
             
-            if not self._msvc.produce_object(args):
+            job = self._msvc.produce_object_async(cpp, args, 
+                dependencies=[ self._precompiled_header_jobs.get(True) ],
+                log=self.log_path(cpp), 
+                response_file=self.response_file_path(cpp),
+                outputs=[ self.cached_object_path(cpp) ],
+                inputs=self._Remote_inputs(cpp, args)
+            )
+            if not job:
                 raise CompilationError(cpp)
             
+            self._compile_jobs.append(job)
             self._rebuilt_files += 1
             return
         
-        def command() -> bool:
-            def callback(code: int) -> bool:
-                if code != 0:
-                    return False
-                self.translation_units.add(cpp)
-                self.object_files.add(self.cached_object_path(cpp))
-                self._rebuilt_files += 1
-                return True
-            
-            if not self._msvc.produce_object_async(cpp, args, callback):
-                raise CompilationError(cpp)
-            
+        def callback(code: int) -> bool:
+            if code != 0:
+                return False
+            self.translation_units.add(cpp)
             return True
-
-        self._deferred_commands.append(command)
+        
+        self._Defer_compile(cpp, join(self.source_directory, cpp), args, callback, [ self._precompiled_header_jobs.get(True) ])
 
     def compile_unit_test(self, uxx: PathLike) -> PathLike:
         obj = self.unit_test_object_path(uxx)
 
         args = build_msvc_compile_flags()
         args += build_msvc_uxx_flags(uxx, 
-            self.header_units, 
+            self.referenced_header_units(uxx, self.tests_directory), 
             self.tests_directory, 
             self.ifc_search_directory, 
             self.cache_directory)
+        args += self.ifc_map_flags(uxx, self.tests_directory, with_own_modules=True)
         
         args.append(_CFlag.PDBPath(self.unit_test_debug_information(uxx)))
+
+        if self._unit_test_flags is None:
+            self._unit_test_flags = self._Build_unit_test_flags()
+        args += self._unit_test_flags
+
+        job = self._msvc.produce_object_async(uxx, args, 
+            log=self.log_path(uxx), 
+            response_file=self.response_file_path(uxx),
+            outputs=[ obj ]
+        )
+        if not job:
+            raise CompilationError(uxx)
+
+        self._unit_test_jobs[obj] = job
+        return obj
+
+    def _Build_unit_test_flags(self) -> list[str]:
+        flags = []
         
-        args.append(_CFlag.IncludeDirectory(self.source_directory))
-        args.append(_CFlag.IncludeDirectory(self.tests_directory))
+        flags.append(_CFlag.IncludeDirectory(self.source_directory))
+        flags.append(_CFlag.IncludeDirectory(self.tests_directory))
 
         for dependency in self._subtargets:
-            if not path_exists(dependency.static_library_path):
-                dependency.build()
-            assert path_exists(dependency.static_library_path)
+            MsvcTarget._Require_library(dependency)
 
-            args.append(_CFlag.IncludeDirectory(
+            flags.append(_CFlag.IncludeDirectory(
                 dependency.source_directory
                 # relative_directory(dependency.source_directory, self.root_directory)
             ))
-            
-            if isinstance(dependency, MsvcTarget) and path_exists(dependency.ifc_map_path):
-                args.append(_IfcFlag.IfcMap)
-                args.append(dependency.ifc_map_path)
-        
-        if path_exists(self.ifc_map_path):
-            args.append(_IfcFlag.IfcMap)
-            args.append(self.ifc_map_path)
 
-        if not self._msvc.produce_object_async(uxx, args):
-            raise CompilationError(uxx)
+        return flags
 
-        return obj
+    def _Defer_compile(self, 
+        name: PathLike, 
+        source: PathLike, 
+        args: list[str], 
+        callback: Callable[[int], bool], 
+        dependencies: list[_Msvc_Job] = None
+    ):
+        obj = self.cached_object_path(name)
+        self._deferred_commands.append(_Deferred_Compile(name, source, args, obj, callback, dependencies or []))
+        self.object_files.add(obj)
+        self._rebuilt_files += 1
 
-    def _Await_deferred_commands(self):
-        if self._deferred_commands:
-            for command in self._deferred_commands:
-                if not command():
-                    self._deferred_commands.clear()
-                    raise CompilationError()
-            self._deferred_commands.clear()
+    def _Launch_compile(self, compile: _Deferred_Compile) -> _Msvc_Job:
+        job = self._msvc.produce_object_async(compile.name, compile.args, compile.callback, 
+            dependencies=compile.dependencies,
+            log=self.log_path(compile.name), 
+            response_file=self.response_file_path(compile.name),
+            outputs=[ compile.obj ],
+            inputs=self._Remote_inputs(compile.source, compile.args)
+        )
+        if not job:
+            raise CompilationError(compile.name)
+        return job
 
-        if not self._msvc.await_jobs():
-            raise CompilationError()
+    @staticmethod
+    def _Shared_compile_args(compile: _Deferred_Compile) -> tuple[str]:
+        # args without the compiled file, its /Tp or /Tc switch and /Fo
+        args = list(compile.args)
+        index = args.index(compile.source)
+        if index > 0 and args[index - 1] in (_IfcFlag.ExplicitCXXTranslationUnit, _IfcFlag.ExplicitCTranslationUnit):
+            del args[index - 1:index + 1]
+        else:
+            del args[index]
+        args.remove(_CFlag.OBJPath(compile.obj))
+        return tuple(args)
+
+    def _Launch_compile_batch(self, index: int, shared_args: tuple[str], batch: list[_Deferred_Compile]) -> _Msvc_Job:
+        """
+            Compiles @batch by a single cl.exe invocation into a batch directory.
+            Objects are moved to their cached paths, success of each source is attributed by its object.
+        """
+        name = f'batch.{index}'
+        directory = join(self.cache_directory, name)
+        create_directory(directory)
+
+        args = list(shared_args)
+        if self.options.batch_compilation_processes > 0:
+            args.append(_CFlag.MultiProcessCompilation(self.options.batch_compilation_processes))
+        args.append(_CFlag.OBJPath(directory + os.sep))
+        batch_objects = []
+        for compile in batch:
+            index = compile.args.index(compile.source)
+            if index > 0 and compile.args[index - 1] in (_IfcFlag.ExplicitCXXTranslationUnit, _IfcFlag.ExplicitCTranslationUnit):
+                args.append(compile.args[index - 1])
+            args.append(compile.source)
+            batch_object = join(directory, get_file_name(compile.source, add_ext='.obj', strip_ext=True))
+            # objects of previous builds would be attributed as successful
+            remove_file(batch_object)
+            batch_objects.append(batch_object)
+
+        def callback(code: int) -> bool:
+            succeeded = True
+            for compile, batch_object in zip(batch, batch_objects):
+                compiled = path_exists(batch_object)
+                if compiled:
+                    os.replace(batch_object, compile.obj)
+                    invalidate(batch_object, compile.obj)
+                compiled = compile.callback(0 if compiled else code or 1) and compiled
+                succeeded = succeeded and compiled
+            return succeeded and code == 0
+
+        job = self._msvc.produce_object_async(name, args, callback, 
+            dependencies=[ d for compile in batch for d in compile.dependencies ],
+            log=self.log_path(name), 
+            response_file=self.response_file_path(name),
+            outputs=[ *batch_objects, *(compile.obj for compile in batch) ]
+        )
+        if not job:
+            raise CompilationError(name)
+        return job
+
+    def _Launch_deferred_commands(self):
+        try:
+            if not self.options.batch_compilation:
+                for compile in self._deferred_commands:
+                    self._compile_jobs.append(self._Launch_compile(compile))
+                return
+
+            groups: dict[tuple[str], list[_Deferred_Compile]] = dict()
+            for compile in self._deferred_commands:
+                groups.setdefault(MsvcTarget._Shared_compile_args(compile), []).append(compile)
+
+            # batches are sized to keep all slots busy
+            slots = max(1, self._msvc._max_jobs)
+            index = 0
+            for shared_args, group in groups.items():
+                batch_size = max(1, -(-len(group) // slots))
+                batches: list[list[_Deferred_Compile]] = []
+                for compile in group:
+                    # objects are named by file name in batch directory
+                    stem = get_file_name(compile.source, strip_ext=True).lower()
+                    for batch in batches:
+                        if len(batch) < batch_size and all(get_file_name(c.source, strip_ext=True).lower() != stem for c in batch):
+                            batch.append(compile)
+                            break
+                    else:
+                        batches.append([ compile ])
+                for batch in batches:
+                    if len(batch) == 1:
+                        self._compile_jobs.append(self._Launch_compile(batch[0]))
+                    else:
+                        self._compile_jobs.append(self._Launch_compile_batch(index, shared_args, batch))
+                        index += 1
+        finally:
+            self._deferred_commands.clear()
 
     def build_unit_test(self, uxx: PathLike, obj: PathLike):
-        if not self._msvc.await_jobs():
-            raise CompilationError()
-        
-        args = build_msvc_link_flags()
+        exe = self.unit_test_executable(uxx)
+        args = self._Link_flags(exe)
 
-        args.append(_LFlag.EXEPath(self.unit_test_executable(uxx)))
-        args.append(obj)
+        args.append(_LFlag.EXEPath(exe))
 
-        if path_exists(self.static_library_path):
-            args.append(self.static_library_path)
-        else:
-            args += self._Dependencies_static_libraries()
+        inputs = [ obj, *self._Linked_libraries() ]
+        args += inputs
 
-        self._msvc.produce_executable(args)
+        job = self._msvc.produce_executable_async(
+            get_file_name(exe), 
+            args, 
+            dependencies=[ self._unit_test_jobs.get(obj), self._library_job, *self._Dependencies_library_jobs() ],
+            log=self.log_path(get_file_name(exe)),
+            response_file=self.response_file_path(get_file_name(exe)),
+            outputs=[ exe, self.unit_test_debug_information(uxx), *self.link_auxiliary_files(exe) ],
+            prepare=self._Link_prepare(exe, inputs, self.link_auxiliary_files(exe)),
+            inputs=inputs
+        )
+        if not job:
+            raise CompilationError(uxx)
+        
+        self._unit_test_jobs[exe] = job
 
     def build_dynamic_library(self):
         """
             Produces dynamic library from this Project's compiled object files.
+            Symbols defined by module interfaces and implementations are exported through generated .def file.
+            Import library is only regenerated when exports change, 
+                so dependents are not relinked after changes to implementation.
         """
-        pass
+        self._Launch_deferred_commands()
+
+        if not self._should_relink and not self._rebuilt_files \
+            and not self._Is_link_incomplete(self.dynamic_library_path) and path_exists(self.static_library_path):
+            cts_print(section='project', subsection=self.display_name, text=f'dynamic library :: {cts_underline("no changes since last build")}')
+            return
+
+        if self._should_relink:
+            cts_print(section='project', subsection=self.display_name, text=f'dynamic library :: dependencies were updated, relinking')
+
+        self.dump_ifc_map()
+
+        objects = sorted(self.object_files)
+        exporting_objects = [ obj for obj in objects if obj.endswith(('.ixx.obj', '.cxx.obj')) ]
+
+        def exports() -> bool:
+            if dump_module_definition(self.module_definition_path, get_file_name(self.dynamic_library_path), exported_symbols(exporting_objects)):
+                cts_print(section='project', subsection=self.display_name, text=f'dynamic library :: exports changed')
+                return True
+            return not path_exists(self.static_library_path) or not path_exists(self.export_file_path)
+
+        args = build_msvc_lib_flags(self.options.warning_level > 0)
+        args.append(_LFlag.ModuleDefinition(self.module_definition_path))
+        args.append(_LFlag.LIBPath(self.static_library_path))
+
+        exports_job = self._msvc.produce_static_library_async(
+            get_file_name(self.static_library_path), 
+            args, 
+            dependencies=self._compile_jobs,
+            log=self.log_path(get_file_name(self.static_library_path)),
+            outputs=[ self.static_library_path, self.export_file_path ],
+            prepare=exports,
+            inputs=[ self.module_definition_path ]
+        )
+        if not exports_job:
+            raise CompilationError(self.static_library_path)
+
+        args = self._Basic_dll_flags()
+        inputs = [ self.export_file_path, *objects, *self._Dependencies_static_libraries() ]
+        args += inputs
+
+        def callback(code: int) -> bool:
+            if code != 0:
+                self._on_built(time() - self._build_started, succeeded=False)
+                return False
+            self._on_built(time() - self._build_started)
+            return True
+
+        self._library_job = self._msvc.produce_dynamic_library_async(
+            get_file_name(self.dynamic_library_path), 
+            args, 
+            callback, 
+            [ exports_job, *self._compile_jobs, *self._Dependencies_library_jobs() ],
+            self.log_path(get_file_name(self.dynamic_library_path)),
+            self.response_file_path(get_file_name(self.dynamic_library_path)),
+            [ self.dynamic_library_path, self.debug_information_path, *self.link_auxiliary_files(self.dynamic_library_path) ],
+            self._Link_prepare(self.dynamic_library_path, inputs, self.link_auxiliary_files(self.dynamic_library_path)),
+            inputs
+        )
+        if not self._library_job:
+            raise CompilationError(self.dynamic_library_path)
 
     def build_static_library(self):
-        self._Await_deferred_commands()
+        self._static_library_requested = True
+        if self.is_dynamic_library:
+            return self.build_dynamic_library()
+        self._Launch_deferred_commands()
 
-        if not self._should_relink and self.object_files and path_exists(self.static_library_path) and not self._rebuilt_files:
-            cts_print(section='project', subsection=self.name, text=f'static library :: {cts_underline("no changes since last build")}')
+        if not self._should_relink and path_exists(self.static_library_path) and not self._rebuilt_files:
+            cts_print(section='project', subsection=self.display_name, text=f'static library :: {cts_underline("no changes since last build")}')
             return
 
         if self._should_relink:
-            cts_print(section='project', subsection=self.name, text=f'static library :: dependencies were updated, relinking')
+            cts_print(section='project', subsection=self.display_name, text=f'static library :: dependencies were updated, relinking')
+
+        self.dump_ifc_map()
 
         args = self._Basic_lib_flags()
         
-        for object in self.object_files:
+        # sorted for stable command lines
+        for object in sorted(self.object_files):
             args.append(object)
+        inputs = [ *self.object_files, *self._Dependencies_static_libraries() ]
 
-        self._msvc.produce_static_library(args)
-        self.dump_ifc_map()
+        def callback(code: int) -> bool:
+            if code != 0:
+                if not self.main_translation_unit:
+                    self._on_built(time() - self._build_started, succeeded=False)
+                return False
+            if not self.main_translation_unit:
+                self._on_built(time() - self._build_started)
+            return True
+
+        self._library_job = self._msvc.produce_static_library_async(
+            get_file_name(self.static_library_path), 
+            args, 
+            callback, 
+            [ *self._compile_jobs, *self._Dependencies_library_jobs() ],
+            self.log_path(get_file_name(self.static_library_path)),
+            self.response_file_path(get_file_name(self.static_library_path)),
+            [ self.static_library_path ],
+            self._Link_prepare(self.static_library_path, inputs),
+            inputs
+        )
+        if not self._library_job:
+            raise CompilationError(self.static_library_path)
 
     def build_executable(self):
-        self._Await_deferred_commands()
+        if self.main_translation_unit and not self._static_library_requested:
+            # main translation unit was not recompiled
+            self.build_static_library()
+        self._Launch_deferred_commands()
 
         if not self.main_translation_unit:
-            cts_print(section='project', subsection=self.name, text=f'executable :: no main translation unit')
+            cts_print(section='project', subsection=self.display_name, text=f'executable :: no main translation unit')
             return
         
-        if not self._should_relink and path_exists(self.executable_path) and not self._rebuilt_files:
-            cts_print(section='project', subsection=self.name, text=f'executable :: {cts_underline("no changes since last build")}')
+        if not self._should_relink and not self._Is_link_incomplete(self.executable_path) and not self._rebuilt_files:
+            cts_print(section='project', subsection=self.display_name, text=f'executable :: {cts_underline("no changes since last build")}')
             return
         
         if self._should_relink:
-            cts_print(section='project', subsection=self.name, text=f'executable :: dependencies were updated, relinking')
+            cts_print(section='project', subsection=self.display_name, text=f'executable :: dependencies were updated, relinking')
         
         args = self._Basic_exe_flags()
         
         args.append(self.cached_object_path(self.main_translation_unit))
+        inputs = [ self.cached_object_path(self.main_translation_unit), *self._Linked_libraries() ]
 
-        self._msvc.produce_executable(args)
+        def callback(code: int) -> bool:
+            if code != 0:
+                self._on_built(time() - self._build_started, succeeded=False)
+                return False
+            self._on_built(time() - self._build_started)
+            return True
+
+        self._executable_job = self._msvc.produce_executable_async(
+            get_file_name(self.executable_path), 
+            args, 
+            callback, 
+            [ *self._compile_jobs, self._library_job, *self._Dependencies_library_jobs() ],
+            self.log_path(get_file_name(self.executable_path)),
+            self.response_file_path(get_file_name(self.executable_path)),
+            [ self.executable_path, self.debug_information_path, *self.link_auxiliary_files(self.executable_path) ],
+            self._Link_prepare(self.executable_path, inputs, self.link_auxiliary_files(self.executable_path)),
+            inputs
+        )
+        if not self._executable_job:
+            raise CompilationError(self.executable_path)
+
+    def build_profile_guided_executable(self):
+        """
+            Links executable instrumented with /GENPROFILE, runs Options.pgo_training workloads,
+                merges their profile counts and relinks executable with /USEPROFILE.
+            Instrumentation and training are skipped while profile database is newer than linked inputs.
+        """
+        if not self._static_library_requested:
+            self.build_static_library()
+        self._Launch_deferred_commands()
+
+        if not self.main_translation_unit:
+            cts_print(section='project', subsection=self.display_name, text=f'executable :: no main translation unit')
+            return
+        if not self.whole_program_optimization:
+            raise CompilationError(f'{self.name}: profile-guided optimization requires optimized build with full or ltcg_incremental link profile')
+        if not self.options.pgo_training:
+            raise CompilationError(f'{self.name}: profile-guided optimization requires Options.pgo_training workloads')
+
+        pgd = self.profile_database_path
+        pgo_directory = get_parent_directory(pgd)
+        create_directory(pgo_directory)
+        # changed workloads invalidate the profile
+        workloads = join(pgo_directory, f'{self.name}.training')
+        write_file_if_changed(workloads, '\n'.join(self.options.pgo_training))
+
+        exe = self.executable_path
+        main = self.cached_object_path(self.main_translation_unit)
+        libraries = self._Linked_libraries()
+        inputs = [ main, *libraries, workloads ]
+
+        args = build_msvc_link_flags(
+            self.options.warning_level > 0, 
+            self.options.enable_debug_information, 
+            LinkProfile.Full, 
+            link_time_code_generation=True
+            )
+        args += [ _LFlag.EXEPath(exe), *libraries, main ]
+
+        training = dict(outdated=True)
+
+        def instrument() -> bool:
+            self._Deploy_dynamic_libraries()
+            training['outdated'] = MsvcTarget._Is_outdated(pgd, inputs)
+            if not training['outdated']:
+                cts_print(section='project', subsection=self.display_name, text=f'pgo :: {cts_underline("profile is up to date")}')
+                return False
+            for pgc in self._Profile_counts():
+                remove_file(pgc)
+            return True
+
+        instrument_job = self._msvc.produce_executable_async(
+            f'{get_file_name(exe)} :: instrumented', 
+            [ *args, _LFlag.GenerateProfile(pgd) ], 
+            None, 
+            [ *self._compile_jobs, self._library_job, *self._Dependencies_library_jobs() ],
+            self.log_path(f'{get_file_name(exe)}.instrumented'),
+            self.response_file_path(f'{get_file_name(exe)}.instrumented'),
+            [ exe, self.debug_information_path, pgd ],
+            instrument
+        )
+        if not instrument_job:
+            raise CompilationError(exe)
+
+        training_jobs = []
+        for index, command in enumerate(self.options.pgo_training):
+            executable, *command_args = ( a.strip('"').replace('{executable}', exe) for a in shlex.split(command, posix=False) )
+            job = self._msvc._Exec_Async(
+                f'{get_file_name(exe)} :: training {index}', 
+                executable, 
+                command_args, 
+                dependencies=[ instrument_job ], 
+                log=self.log_path(f'{get_file_name(exe)}.training.{index}'),
+                prepare=lambda: training['outdated']
+            )
+            if not job:
+                raise CompilationError(command)
+            training_jobs.append(job)
+
+        def merge() -> bool:
+            if not training['outdated']:
+                return False
+            counts = self._Profile_counts()
+            assert counts, 'training workloads produced no profile counts'
+            for pgc in counts:
+                if get_parent_directory(pgc) != pgo_directory:
+                    # pgomgr merges counts found next to profile database
+                    os.replace(pgc, join(pgo_directory, get_file_name(pgc)))
+                    invalidate(pgc)
+            return True
+
+        def merged(code: int) -> bool:
+            if code != 0:
+                return False
+            # counts would be merged again by the next instrumented run otherwise
+            for pgc in self._Profile_counts():
+                remove_file(pgc)
+            return True
+
+        merge_job = self._msvc.merge_profile_async(
+            get_file_name(pgd), 
+            [ '/merge', pgd ], 
+            merged, 
+            training_jobs, 
+            self.log_path(get_file_name(pgd)),
+            [ pgd ],
+            merge
+        )
+        if not merge_job:
+            raise CompilationError(pgd)
+
+        def callback(code: int) -> bool:
+            if code != 0:
+                self._on_built(time() - self._build_started, succeeded=False)
+                return False
+            self._on_built(time() - self._build_started)
+            return True
+
+        self._executable_job = self._msvc.produce_executable_async(
+            f'{get_file_name(exe)} :: optimized', 
+            [ *args, _LFlag.UseProfile(pgd) ], 
+            callback, 
+            [ merge_job ],
+            self.log_path(f'{get_file_name(exe)}.optimized'),
+            self.response_file_path(f'{get_file_name(exe)}.optimized'),
+            [ exe, self.debug_information_path ]
+        )
+        if not self._executable_job:
+            raise CompilationError(exe)
 
 
 if __name__ == '__main__':
-    pass
+    # builds a subproject by stub tools and checks their command lines: python -m indigo.msvc_target
+    # stub tools are python scripts launched through their #! line, so the check runs on POSIX only
+    import sys
+    import tempfile
+    import threading
+    import indigo.msvc_shell as msvc_shell
+    from indigo.options import Options
+    from indigo.msvc_remote import _Remote_Worker_Server, _Remote_Worker, _Toolchain
+
+    _Stub_Tool = f"""#!{sys.executable}
+import os, sys, json
+# launched through #! line, so argv[0] is the script path, f.e. .../cl.exe
+tool = os.path.basename(sys.argv[0]).upper()
+args = []
+for arg in sys.argv[1:]:
+    if arg.startswith('@'):
+        with open(arg[1:], encoding='utf-16') as f:
+            args += [ line.strip('"') for line in f.read().splitlines() ]
+    else:
+        args.append(arg)
+with open(os.path.join(os.path.dirname(os.path.realpath(__file__)), 'commands.jsonl'), 'a') as f:
+    f.write(json.dumps(dict(tool=tool, args=args, argv=sys.argv[1:])) + '\\n')
+
+sources = [ a for a in args if a.endswith(('.cpp', '.c')) and os.path.isfile(a) ]
+outputs = []
+for arg in args:
+    if arg.startswith('/Fo') and arg.endswith(os.sep):
+        outputs += [ os.path.join(arg[3:], os.path.splitext(os.path.basename(s))[0] + '.obj') for s in sources ]
+    elif arg.startswith('/Fo'):
+        outputs.append(arg[3:])
+    elif arg.startswith('/OUT:'):
+        outputs.append(arg[5:])
+    elif arg.startswith('/Fd'):
+        outputs.append(arg[3:])
+    elif arg.startswith('/Fp') and any(a.startswith('/Yc') for a in args):
+        outputs.append(arg[3:])
+    elif arg.startswith('/GENPROFILE:PGD='):
+        outputs.append(arg[16:])
+if tool == 'PGOMGR.EXE':
+    outputs.append(args[-1])
+# instrumented executable writes profile counts next to profile database
+counts = [ a[16:-4] + '!1.pgc' for a in args if a.startswith('/GENPROFILE:PGD=') ]
+for output in outputs:
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        if output.endswith('.exe'):
+            f.write('#!/bin/sh\\n' + ''.join(f'touch "{{c}}"\\n' for c in counts))
+    if output.endswith('.exe'):
+        os.chmod(output, 0o755)
+"""
+
+    def test():
+        """
+            Checks precompiled header, batch compilation, response files, profile-guided optimization,
+                publishing of a static library, references through ordinary headers and compilation by a localhost worker.
+        """
+        if os.name == 'nt':
+            print('[stub tools need POSIX, skipped]')
+            return
+
+        with tempfile.TemporaryDirectory() as tmp:
+            tools = join(tmp, 'tools')
+            create_directory(tools)
+            for tool in ('cl.exe', 'link.exe', 'lib.exe', 'pgomgr.exe'):
+                with open(join(tools, tool), 'w') as f:
+                    f.write(_Stub_Tool)
+                os.chmod(join(tools, tool), 0o755)
+
+            class _Stub_Msvc(_Msvc):
+                def _Available(self) -> bool:
+                    self._cl, self._link, self._lib = ( join(tools, t) for t in ('cl.exe', 'link.exe', 'lib.exe') )
+                    return True
+
+            def commands() -> dict[str, list[dict]]:
+                """
+                    Returns and forgets tool invocations since last call, by tool name.
+                """
+                log = join(tools, 'commands.jsonl')
+                invalidate(log)
+                invocations = dict()
+                if not path_exists(log):
+                    return invocations
+                with open(log, 'r') as f:
+                    for line in f:
+                        invocation = json.loads(line)
+                        invocations.setdefault(invocation['tool'], []).append(invocation)
+                remove_file(log)
+                return invocations
+
+            source_directory = join(tmp, 'app', 'src')
+            create_directory(source_directory)
+            sources = { 'pch.h': '#pragma once\n', 'a.cpp': '', 'b.cpp': '', 'c.cpp': '', 'main.cpp': 'int main() {}\n' }
+            for name, content in sources.items():
+                with open(join(source_directory, name), 'w') as f:
+                    f.write(content)
+
+            # cl.exe is passed through response file whenever it's given one
+            msvc_shell._Response_File_Threshold = 0
+            # two slots split three sources with same flags into batches of two and one
+            msvc = _Stub_Msvc(jobs=2)
+            build_directory = join(tmp, '.build', 'app')
+
+            def build(pgo: bool = False, **options) -> MsvcTarget:
+                target = MsvcTarget(
+                    name = 'app',
+                    root_directory = join(tmp, 'app'),
+                    source_directory = source_directory,
+                    output_directory = join(tmp, '.output', 'app'),
+                    build_directory = build_directory,
+                    cache_directory = join(build_directory, 'obj'),
+                    ifc_search_directory = join(build_directory, 'ifc'),
+                    source_scan_path = join(build_directory, 'scan.json'),
+                    source_files = [ 'a.cpp', 'b.cpp', 'c.cpp', 'main.cpp' ],
+                    options = Options(precompiled_header='pch.h', batch_compilation=True, **options),
+                    _msvc = msvc
+                )
+                if pgo:
+                    target.pgo()
+                else:
+                    target.build(force=False)
+                target.await_build()
+                return target
+
+            target = build()
+            compiled = commands()['CL.EXE']
+            pch = target.precompiled_header_path()
+            assert all(len(c['argv']) == 1 and c['argv'][0].startswith('@') for c in compiled), compiled
+            assert _CFlag.CreatePrecompiledHeader('pch.h') in compiled[0]['args'], 'precompiled header is compiled first'
+            assert _CFlag.PCHPath(pch) in compiled[0]['args']
+            for c in compiled[1:]:
+                assert _CFlag.UsePrecompiledHeader('pch.h') in c['args'] and _CFlag.PCHPath(pch) in c['args'], c
+            batches = sorted(len([ a for a in c['args'] if get_file_name(a) in sources ]) for c in compiled[1:])
+            assert batches == [ 1, 1, 2 ], f'main, c.cpp and batch of a.cpp and b.cpp expected: {batches}'
+            assert path_exists(target.response_file_path('batch.0'))
+            print('[precompiled header is used by batches, commands go through response files]')
+
+            build()
+            assert 'CL.EXE' not in commands(), 'nothing to compile'
+            with open(join(source_directory, 'pch.h'), 'a') as f:
+                f.write('#include <vector>\n')
+            build()
+            compiled = commands()['CL.EXE']
+            assert len(compiled) == 4 and _CFlag.CreatePrecompiledHeader('pch.h') in compiled[0]['args'], compiled
+            print('[modified precompiled header rebuilds every source]')
+
+            optimized = dict(disable_optimizations=False, link_profile=LinkProfile.Full, pgo_training=[ '{executable} --train' ])
+            target = build(pgo=True, **optimized)
+            pgd = target.profile_database_path
+            invoked = commands()
+            links = [ c['args'] for c in invoked['LINK.EXE'] ]
+            assert len(links) == 2 and _LFlag.GenerateProfile(pgd) in links[0] and _LFlag.UseProfile(pgd) in links[1], links
+            assert [ c['args'] for c in invoked['PGOMGR.EXE'] ] == [ [ '/merge', pgd ] ], invoked['PGOMGR.EXE']
+            assert not target._Profile_counts(), 'merged counts are removed'
+            print('[executable is instrumented, trained, merged and relinked with profile]')
+
+            build(pgo=True, **optimized)
+            links = [ c['args'] for c in commands()['LINK.EXE'] ]
+            assert len(links) == 1 and _LFlag.UseProfile(pgd) in links[0], links
+            print('[unchanged executable is relinked with cached profile]')
+
+            # fresh build directory is listed before the build writes to it
+            library_directory = join(tmp, 'lib', 'src')
+            create_directory(library_directory)
+            with open(join(library_directory, 'l.cpp'), 'w') as f:
+                f.write('')
+            with snapshot():
+                library = MsvcTarget(
+                    name = 'lib',
+                    root_directory = join(tmp, 'lib'),
+                    source_directory = library_directory,
+                    output_directory = join(tmp, '.output', 'lib'),
+                    build_directory = join(tmp, '.build', 'lib'),
+                    source_files = [ 'l.cpp' ],
+                    _msvc = msvc
+                )
+                library.publish()
+                library.await_build()
+            commands()
+            for published in ('lib/lib.lib', 'lib/lib.pdb'):
+                assert path_exists(join(library.output_directory, published)), f'{published} is not published'
+            print('[static library is published with its program database]')
+
+            references_directory = join(tmp, 'references', 'src')
+            create_directory(join(references_directory, 'detail'))
+            sources = { 'x.hxx': '#pragma once\n', 'detail/common.h': 'import "x.hxx";\n', 'r.cpp': '#include "detail/common.h"\n#include <vector>\n' }
+            for name, content in sources.items():
+                with open(join(references_directory, name), 'w') as f:
+                    f.write(content)
+            references = MsvcTarget(
+                name = 'references',
+                root_directory = join(tmp, 'references'),
+                source_directory = references_directory,
+                build_directory = join(tmp, '.build', 'references'),
+                source_files = [ 'x.hxx', 'r.cpp' ],
+                _msvc = msvc
+            )
+            resolved = references._Resolve_references('r.cpp')
+            assert resolved and resolved[0] == { 'x.hxx' }, f'header unit imported by included header expected: {resolved}'
+            print('[header units imported through ordinary headers are referenced]')
+
+            server = _Remote_Worker_Server(('127.0.0.1', 0), join(tools, 'cl.exe'), 1, join(tmp, 'sandbox'), token='secret')
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            address = f'127.0.0.1:{server.server_address[1]}'
+            try:
+                assert not _Remote_Worker._Parse(address, 'wrong')._Connect(_Toolchain(msvc._cl)), 'wrong token is rejected'
+                assert msvc.connect_workers([ address ], 'secret') == 1
+                source = join(source_directory, 'c.cpp')
+                obj = join(build_directory, 'remote.obj')
+                # without local slots hermetic compilations overflow to workers
+                msvc._max_jobs = 0
+                args = [ '/c', '/EHsc', '/std:c++latest', _IfcFlag.ExplicitCXXTranslationUnit, source, _CFlag.OBJPath(obj) ]
+                job = msvc.produce_object_async('remote.obj', args, outputs=[ obj ], inputs=[ source ])
+                assert job.inputs is not None, 'compilation is sent to workers'
+                assert msvc.await_jobs() and job.worker, 'compiled by worker'
+                compiled = commands()['CL.EXE']
+                assert len(compiled) == 1 and source not in compiled[0]['args'], f'sandboxed source expected: {compiled}'
+                invalidate(obj)
+                assert path_exists(obj), 'object is sent back'
+                print('[worker compiles in sandbox and sends object back]')
+            finally:
+                server.shutdown()
+                server.server_close()
+    test()
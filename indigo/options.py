@@ -1,4 +1,4 @@
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, fields, replace
 
 from indigo.filesystem import PathLike, path_exists, get_dot_path
 
@@ -9,6 +9,16 @@ class WarningLevel:
     Max = 4
     All = 5
 
+class LinkProfile:
+    # link from scratch, /LTCG for optimized builds
+    Full = 'full'
+    # /INCREMENTAL, patches executable in place using .ilk
+    Incremental = 'incremental'
+    # /DEBUG:FASTLINK /INCREMENTAL, debug information is left in object files
+    FastLink = 'fastlink'
+    # /LTCG:INCREMENTAL, only functions affected by changes are recompiled using .iobj
+    LtcgIncremental = 'ltcg_incremental'
+
 @dataclass
 class Options:
     enable_rtti: bool = True
@@ -16,6 +26,23 @@ class Options:
     disable_optimizations: bool = True
     warning_level: int = WarningLevel.All
     treat_warnings_as_errors: bool = True
+    # header relative to source directory, precompiled once and force-included in every .cpp and .c
+    precompiled_header: PathLike = None
+    # .cpp and .c sources are compiled in generated batches, except for main and @unity_exclude globs
+    unity_build: bool = False
+    unity_batch_size: int = 16
+    unity_batch_bytes: int = 256 * 1024
+    unity_exclude: list[str] = field(default_factory=list)
+    # .cxx, .cpp and .c sources with identical flags are compiled by a single cl.exe invocation
+    batch_compilation: bool = False
+    # cl.exe /MP<n> for batches, 0 to compile batch sources sequentially
+    batch_compilation_processes: int = 0
+    # library is linked as .dll with import .lib, symbols of module units are exported
+    dynamic_library: bool = False
+    # one of LinkProfile, None picks incremental for debug and ltcg_incremental for optimized builds
+    link_profile: str = None
+    # command lines run by pgo command to train instrumented executable, {executable} is replaced with its path
+    pgo_training: list[str] = field(default_factory=list)
 
     # whatever corner cases
     # TODO: implement
@@ -26,6 +53,16 @@ class Options:
     explicit_libraries: list[PathLike] = field(default_factory=list)
     explicit_properties: dict[str, str] = field(default_factory=dict)
 
+    def _Configured(self, overrides: dict) -> 'Options':
+        """
+            Returns copy of these options with @overrides of a solution configuration applied.
+        """
+        names = { f.name for f in fields(Options) }
+        for name in overrides:
+            if name not in names:
+                raise ValueError(f'unknown option "{name}"')
+        return replace(self, **overrides)
+
     @staticmethod
     def _Release(**kwargs) -> 'Options':
         return Options(
@@ -43,3 +80,10 @@ class Options:
             assert isinstance(options, Options)
             return options
         return Options()
+
+# used by solutions that don't declare configurations
+_Default_Configurations: dict[str, dict] = {
+    'debug': dict(enable_debug_information=True, disable_optimizations=True),
+    'release': dict(enable_debug_information=False, disable_optimizations=False, treat_warnings_as_errors=False),
+    'relwithdebinfo': dict(enable_debug_information=True, disable_optimizations=False, treat_warnings_as_errors=False),
+}
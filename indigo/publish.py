@@ -0,0 +1,90 @@
+import json
+import hashlib
+from typing import NamedTuple
+
+from indigo.filesystem import PathLike, join, _Stat, create_directory, get_parent_directory, \
+    materialize_file, remove_file, write_file_if_changed
+
+_Manifest_Version = 1
+_Manifest_Name = 'manifest.json'
+
+class _Artifact(NamedTuple):
+    # absolute path of the built file
+    source: PathLike
+    # f.e. 'executable', 'debug_information', 'ifc'
+    kind: str
+
+class _Published(NamedTuple):
+    updated: int
+    unchanged: int
+    removed: int
+
+def _Digest(path: PathLike) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _Read_Manifest(path: PathLike) -> dict:
+    try:
+        with open(path, 'r') as f:
+            manifest = json.load(f)
+        if manifest.get('version') == _Manifest_Version:
+            return manifest
+    except (OSError, ValueError):
+        pass
+    return dict()
+
+def publish_artifacts(directory: PathLike, artifacts: dict[str, _Artifact], **properties) -> _Published:
+    """
+        Materializes @artifacts (relative path => artifact) in @directory, only changed files are updated.
+        Files published before that are no longer artifacts are removed.
+        Writes manifest.json with @properties and size, mtime and sha256 of every file,
+            digests of unchanged files are taken from the previous manifest.
+    """
+    manifest_path = join(directory, _Manifest_Name)
+    previous = _Read_Manifest(manifest_path).get('files', dict())
+
+    files = dict()
+    updated = unchanged = 0
+    for relative in sorted(artifacts):
+        artifact = artifacts[relative]
+        path = join(directory, relative)
+        create_directory(get_parent_directory(path))
+        if materialize_file(artifact.source, path):
+            updated += 1
+        else:
+            unchanged += 1
+        st = _Stat(path)
+        entry = previous.get(relative)
+        if not entry or entry.get('size') != st.st_size or entry.get('mtime_ns') != st.st_mtime_ns:
+            entry = dict(size=st.st_size, mtime_ns=st.st_mtime_ns, sha256=_Digest(path))
+        files[relative] = dict(entry, kind=artifact.kind)
+
+    removed = 0
+    for relative in previous:
+        if relative not in files:
+            remove_file(join(directory, relative))
+            removed += 1
+
+    manifest = dict(version=_Manifest_Version, **properties, files=files)
+    write_file_if_changed(manifest_path, json.dumps(manifest, indent=2, sort_keys=True))
+    return _Published(updated, unchanged, removed)
+
+
+if __name__ == '__main__':
+    import os
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as root:
+        source = os.path.join(root, 'a.exe')
+        with open(source, 'wb') as f:
+            f.write(b'a')
+        directory = os.path.join(root, 'out')
+        artifacts = { 'bin/a.exe': _Artifact(source, 'executable') }
+        assert publish_artifacts(directory, artifacts) == _Published(1, 0, 0)
+        assert publish_artifacts(directory, artifacts) == _Published(0, 1, 0)
+        assert publish_artifacts(directory, dict()) == _Published(0, 0, 1)
+        assert not os.path.exists(os.path.join(directory, 'bin', 'a.exe'))
+    print('ok')
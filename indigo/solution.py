@@ -3,7 +3,8 @@ from argparse import ArgumentParser, Namespace
 from dataclasses import dataclass, field, is_dataclass
 
 import indigo.filesystem as fs
-from indigo.options import Options
+import indigo.events as events
+from indigo.options import Options, _Default_Configurations
 from indigo.subproject import Subproject
 from indigo.target import Target
 from indigo.import_export import import_dataclass, export_dataclass
@@ -11,6 +12,12 @@ from indigo.import_export import import_dataclass, export_dataclass
 # from indigo.templates import *
 # from indigo.project import Project
 
+def _Environment_Flag(name: str) -> bool:
+    """
+        Returns True if environment variable @name is set to 1, true, yes or on, False if it's unset or anything else.
+    """
+    return fs.os.environ.get(name, '').strip().lower() in ('1', 'true', 'yes', 'on')
+
 @dataclass
 class Solution:
     name: str
@@ -18,10 +25,15 @@ class Solution:
     build_directory: fs.PathLike = None
     output_directory: fs.PathLike = None
     subprojects: list[str] = field(default_factory=list)
+    # configuration name => Options overrides, f.e. { 'release': { 'disable_optimizations': False } }
+    configurations: dict[str, dict] = field(default_factory=dict)
     
     _imported_subprojects: dict[str, Subproject] = field(default_factory=dict, repr=False, hash=False, compare=False, init=False, kw_only=True)
     
-    _targets: dict[str, Target] = field(default_factory=dict, repr=False, hash=False, compare=False, init=False, kw_only=True)
+    # (configuration, subproject name) => target
+    _targets: dict[tuple[str, str], Target] = field(default_factory=dict, repr=False, hash=False, compare=False, init=False, kw_only=True)
+    # subproject name => resolved sources, shared by all configurations
+    _resolved_sources: dict[str, list[str]] = field(default_factory=dict, repr=False, hash=False, compare=False, init=False, kw_only=True)
 
     def _Project_source_directory(self, project_name: str, subdirectory: fs.PathLike = 'src'):
         assert self.directory
@@ -76,6 +88,9 @@ class Solution:
             'rebuild', 
             'clean', 
             'test',
+            'pgo',
+            'publish',
+            'install',
             'config'
         ])
 
@@ -94,24 +109,78 @@ class Solution:
 
         parser.add_argument('--target', '-T', type=str, choices=targets)
 
-        parser.add_argument('--config', '-C', type=str)
+        parser.add_argument('--config', '-C', type=str, 
+            help=f'comma separated configurations or "all": {", ".join(self._Configurations())}')
 
         parser.add_argument('--build_directory', '-B', type=str)
         parser.add_argument('--output_directory', '-O', type=str)
+        parser.add_argument('--workers', '-W', type=str, default=fs.os.environ.get('INDIGO_WORKERS'),
+            help='comma separated host[:port] of remote compile workers (python -m indigo.msvc_remote), INDIGO_WORKERS by default')
+        parser.add_argument('--workers_token', type=str, default=fs.os.environ.get('INDIGO_WORKERS_TOKEN'),
+            help='shared secret of remote compile workers, INDIGO_WORKERS_TOKEN by default')
+        parser.add_argument('--cache', type=str, default=fs.os.environ.get('INDIGO_CACHE'),
+            help='url of remote build cache (python -m indigo.msvc_cache), INDIGO_CACHE by default')
+        parser.add_argument('--cache_read_only', action='store_true', default=_Environment_Flag('INDIGO_CACHE_READ_ONLY'),
+            help='look results up without uploading, INDIGO_CACHE_READ_ONLY=1 by default')
+        parser.add_argument('--timeout', type=float, default=fs.os.environ.get('INDIGO_TIMEOUT'),
+            help='seconds a local job or unit test may run before it is killed, INDIGO_TIMEOUT by default')
+        parser.add_argument('--events', type=str, default=fs.os.environ.get('INDIGO_EVENTS'),
+            help='append build events to this JSON-lines file, INDIGO_EVENTS by default')
+        parser.add_argument('--metrics', type=str, default=fs.os.environ.get('INDIGO_METRICS'),
+            help='write build metrics to this Prometheus textfile, INDIGO_METRICS by default')
         
         # parser.add_argument('--build-version', '-b', type=str)
 
         return parser
 
     
-    def target(self, subproject: Subproject, build_directory: fs.PathLike, output_directory: fs.PathLike) -> Target:
-        if subproject.name in self._targets:
-            return self._targets[subproject.name]
+    def _Configurations(self) -> dict[str, dict]:
+        return self.configurations or _Default_Configurations
+
+    def _Requested_configurations(self, config: str|None) -> list[str|None]:
+        """
+            Returns [ None ] if no configuration was requested, subprojects are built with their own options then.
+        """
+        if not config:
+            return [ None ]
+        available = self._Configurations()
+        if config == 'all':
+            return list(available)
+        requested = [ c.strip() for c in config.split(',') if c.strip() ]
+        for name in requested:
+            if name not in available:
+                raise ValueError(f'unknown configuration \"{name}\", expected one of: {", ".join(available)}')
+        return requested
+
+    def _Resolved_sources(self, subproject: Subproject, build_directory: fs.PathLike) -> list[str]:
+        # source directories are scanned once for all configurations
+        if subproject.name not in self._resolved_sources:
+            self._resolved_sources[subproject.name] = subproject.resolve_sources(
+                fs.join(build_directory, subproject.name, 'sources.json')
+            )
+        return self._resolved_sources[subproject.name]
+    
+    def target(self, 
+        subproject: Subproject, 
+        build_directory: fs.PathLike, 
+        output_directory: fs.PathLike, 
+        configuration: str = None
+    ) -> Target:
+        if (configuration, subproject.name) in self._targets:
+            return self._targets[(configuration, subproject.name)]
         
         from indigo.msvc_target import MsvcTarget as CXXTarget
 
-        target_build_directory = fs.join(build_directory, subproject.name)
-        target_output_directory = fs.join(output_directory, subproject.name),
+        options = subproject.options
+        configuration_build_directory = build_directory
+        configuration_output_directory = output_directory
+        if configuration:
+            options = options._Configured(self._Configurations()[configuration])
+            configuration_build_directory = fs.join(build_directory, configuration)
+            configuration_output_directory = fs.join(output_directory, configuration)
+
+        target_build_directory = fs.join(configuration_build_directory, subproject.name)
+        target_output_directory = fs.join(configuration_output_directory, subproject.name)
 
         subproject._Normalize_Sources()
 
@@ -124,12 +193,14 @@ class Solution:
             build_directory = target_build_directory,
             cache_directory = fs.join(target_build_directory, 'obj'),
             ifc_search_directory = fs.join(target_build_directory, 'ifc'),
+            source_scan_path = fs.join(build_directory, subproject.name, 'scan.json'),
+            configuration = configuration,
             dependencies = subproject.dependencies,
-            source_files = subproject.sources,
-            options = subproject.options
+            source_files = self._Resolved_sources(subproject, build_directory),
+            options = options
         )
 
-        self._targets[subproject.name] = cxxtarget
+        self._targets[(configuration, subproject.name)] = cxxtarget
 
         for dependency_name in subproject.dependencies:
             dependency = self.find_subproject(dependency_name)
@@ -137,7 +208,8 @@ class Solution:
             cxxtarget._subtargets.append(self.target(
                 dependency, 
                 build_directory, 
-                output_directory
+                output_directory,
+                configuration
             ))
         
         return cxxtarget
@@ -156,20 +228,55 @@ class Solution:
         if not output_directory:
             output_directory = fs.join(self.directory, '.output')
 
-        def target_on_command(target_name: str):
-            if target_name not in self._targets:
-                self.target(
-                    self.find_subproject(target_name),
-                    build_directory, output_directory
-                ).on_command(args)
-            else:
-                self._targets[target_name].on_command(args)
-
-        if args.target and args.target != 'all':
-            target_on_command(args.target)
-        else:
-            for subproject_name in self.subprojects:
-                target_on_command(subproject_name)
+        def target_on_command(target_name: str, configuration: str) -> Target:
+            target = self.target(
+                self.find_subproject(target_name),
+                build_directory, output_directory,
+                configuration
+            )
+            # targets share the job pool, await them all at once
+            target.on_command(args, wait=False)
+            return target
+
+        configurations = self._Requested_configurations(args.config)
+
+        if args.workers or args.cache or args.timeout:
+            from indigo.msvc_shell import _Msvc
+            msvc = _Msvc._Instance()
+            if args.timeout:
+                msvc.set_timeout(float(args.timeout))
+            if args.workers:
+                msvc.connect_workers(args.workers.split(','), args.workers_token)
+            if args.cache:
+                msvc.connect_cache(args.cache, {
+                    'solution': self.directory,
+                    'build': build_directory,
+                    'output': output_directory
+                }, args.cache_read_only)
+
+        subscribers = []
+        if args.events:
+            subscribers.append(events.subscribe(events.JsonLinesSubscriber(args.events)))
+        if args.metrics:
+            subscribers.append(events.subscribe(events.PrometheusSubscriber(args.metrics)))
+
+        try:
+            # existence and modification times are read once per directory
+            with fs.snapshot():
+                targets = []
+                for configuration in configurations:
+                    if args.target and args.target != 'all':
+                        targets.append(target_on_command(args.target, configuration))
+                    else:
+                        for subproject_name in self.subprojects:
+                            targets.append(target_on_command(subproject_name, configuration))
+                
+                for target in targets:
+                    target.await_build()
+        finally:
+            # files are flushed even if the build failed
+            for subscriber in subscribers:
+                events.unsubscribe(subscriber)
 
 
 
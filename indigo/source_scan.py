@@ -0,0 +1,105 @@
+import re
+import json
+from typing import NamedTuple
+
+from indigo.filesystem import PathLike, _Stat, create_directory, get_parent_directory, write_file_if_changed
+
+# import <a.hxx>; | export import "b.hxx"; | import c.d; | export module e; | module f; | #include <g.hxx>
+_Directive = re.compile(
+    rb'^[ \t]*(?:export[ \t]+)?(import|module)[ \t]+([^;\r\n]*?)[ \t]*;'
+    rb'|^[ \t]*#[ \t]*include[ \t]*([<"][^>"\r\n]*[>"])',
+    re.MULTILINE
+)
+
+class _Source_Scan(NamedTuple):
+    # header names referenced by import or #include, without <> or ""
+    headers: tuple[str]
+    # names of imported modules
+    imports: tuple[str]
+    # name of the module declared by this source if any
+    module: str|None
+
+def _Scan(content: bytes) -> _Source_Scan:
+    headers = dict()
+    imports = dict()
+    module = None
+    for match in _Directive.finditer(content):
+        keyword, name, included = match.groups()
+        if included:
+            headers[included[1:-1].decode(errors='replace')] = None
+            continue
+        name = name.decode(errors='replace').strip()
+        if not name:
+            # global module fragment, "module;"
+            continue
+        if keyword == b'module':
+            if not name.startswith(':'):
+                module = name
+        elif name[0] in '<"':
+            headers[name[1:-1]] = None
+        elif not name.startswith(':'):
+            imports[name] = None
+    return _Source_Scan(tuple(headers), tuple(imports), module)
+
+# path => scanner shared by targets of all configurations
+_Shared_Scanners: dict[PathLike, '_Source_Scanner'] = dict()
+
+class _Source_Scanner:
+    """
+        Scans sources for import, module and #include directives.
+        Results are cached by file mtime and size, and persisted in @path.
+    """
+    @staticmethod
+    def _Shared(path: PathLike) -> '_Source_Scanner':
+        if path not in _Shared_Scanners:
+            _Shared_Scanners[path] = _Source_Scanner(path)
+        return _Shared_Scanners[path]
+
+    def __init__(self, path: PathLike = None):
+        self.path = path
+        self._scans: dict[PathLike, list] = dict()
+        self._modified = False
+        if path:
+            try:
+                with open(path, 'r') as f:
+                    self._scans = json.load(f)
+            except (OSError, ValueError):
+                pass
+
+    def scan(self, source: PathLike) -> _Source_Scan|None:
+        """
+            Returns None if @source does not exist.
+        """
+        st = _Stat(source)
+        if not st:
+            return None
+        cached = self._scans.get(source)
+        if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+            return _Source_Scan(tuple(cached[2]), tuple(cached[3]), cached[4])
+        with open(source, 'rb') as f:
+            result = _Scan(f.read())
+        self._scans[source] = [ st.st_mtime_ns, st.st_size, *result ]
+        self._modified = True
+        return result
+
+    def save(self):
+        if self.path and self._modified:
+            create_directory(get_parent_directory(self.path))
+            write_file_if_changed(self.path, json.dumps(self._scans, separators=(',', ':'), sort_keys=True))
+            self._modified = False
+
+
+if __name__ == '__main__':
+    scan = _Scan(b'''module;
+#include <c_header.h>
+#  include "local.hxx"
+export module a.b;
+
+import <header_unit.hxx>;
+export import "quoted.hxx";
+import c.d;
+import :partition;
+''')
+    assert scan == _Source_Scan(('c_header.h', 'local.hxx', 'header_unit.hxx', 'quoted.hxx'), ('c.d', ), 'a.b'), scan
+    assert _Scan(b'module a.b;\nimport std;\n') == _Source_Scan((), ('std', ), 'a.b')
+    print('ok')
@@ -3,6 +3,7 @@ from dataclasses import dataclass, field
 import indigo.filesystem as fs
 from indigo.options import Options
 from indigo.import_export import import_dataclass, export_dataclass
+from indigo.console_text_styles import cts_print_warning
 from indigo.templates import *
 from indigo.target import Target
 
@@ -15,16 +16,24 @@ class Subproject:
     options: Options = field(default_factory=Options)
     dependencies: list[str] = field(default_factory=list)
     sources: list[str] = field(default_factory=list)
+    # glob patterns relative to source directory, f.e. [ '**/*.ixx', '**/*.cxx' ]
+    include: list[str] = field(default_factory=list)
+    exclude: list[str] = field(default_factory=list)
+    # sources with extensions of other build systems => names indigo expects, not built until renamed, see migrate()
+    renames: dict[str, str] = field(default_factory=dict)
 
     @staticmethod
     def _Import(path: fs.PathLike) -> 'Subproject':
         return import_dataclass(path, 'INDIGO_SUBPROJECT', Subproject)
 
     def _Normalize_Sources(self):
+        self.sources = Subproject._Normalized_Sources(self.sources)
+
+    @staticmethod
+    def _Normalized_Sources(sources: list[str]) -> list[str]:
         # remove duplicates and move main translation unit to the end
         # source files remain in the same order
-        sources = [] 
-        [ sources.append(s) for s in self.sources if s not in sources ] 
+        sources = list(dict.fromkeys(sources))
 
         main_c = None
         main_cpp = None
@@ -44,7 +53,46 @@ class Subproject:
             assert not main_c
             sources.append(main_cpp)
         
-        self.sources = sources
+        return sources
+
+    # discovered sources are ordered by kind first, so header units and interfaces precede their users
+    _Sources_Order = { '.hxx': 0, '.ixx': 1, '.cxx': 2, '.c': 3, '.cpp': 4 }
+
+    # source file extensions of other build systems => indigo source types
+    _Migrated_Extensions = {
+        '.hxx': '.hxx',
+        '.ixx': '.ixx',
+        '.cppm': '.ixx',
+        '.mpp': '.ixx',
+        '.cxx': '.cxx',
+        '.c': '.c',
+        '.cpp': '.cpp',
+        '.cc': '.cpp'
+    }
+
+    @staticmethod
+    def _Sorted_Sources(sources: list[str]) -> list[str]:
+        return sorted(sources, key=lambda file: (Subproject._Sources_Order[fs.get_file_extension(file)], file))
+
+    def resolve_sources(self, index_path: fs.PathLike = None) -> list[str]:
+        """
+            Returns explicit sources followed by sources matching @include but not @exclude.
+            Globbed sources are ordered deterministically, main translation unit is always last.
+            Directory listings are cached in @index_path.
+        """
+        if not self.include:
+            return Subproject._Normalized_Sources(self.sources)
+
+        abs_source_directory = fs.join(self.directory, self.source_directory)
+        listed = set(fs.os.path.normcase(fs.os.path.normpath(s)) for s in self.sources)
+        globbed = []
+        for file in fs.find_files(abs_source_directory, self.include, self.exclude, index_path):
+            if fs.get_file_extension(file) not in Subproject._Sources_Order:
+                continue
+            file = fs.os.path.normpath(file)
+            if fs.os.path.normcase(file) not in listed:
+                globbed.append(file)
+        return Subproject._Normalized_Sources(self.sources + Subproject._Sorted_Sources(globbed))
 
     def _Export(self, path: fs.PathLike, force: bool = True):
         self._Normalize_Sources()
@@ -74,15 +122,26 @@ class Subproject:
     def migrate(directory: fs.PathLike,
         source_directory: fs.PathLike = 'src',
         tests_directory: fs.PathLike = 'test',
-        include_directory: fs.PathLike = 'include'
+        include_directory: fs.PathLike = 'include',
+        exclude: list[str] = (),
+        update: bool = False,
+        rename_extensions: bool = False
     ) -> 'Subproject':
         """
             Attempts to migrate subproject from other build system to indigo.
-            Scans f'{directory}/{source_directory}' for source files.
+            Scans f'{directory}/{source_directory}' for source files in parallel,
+                Skipping files and directories matched by gitignore-style @exclude rules.
             Generates f'{directory}/__init__.py'.
             
-            You might need to adjust the source file extensions accordingly.
-                f.e. CMake uses .cppm for module interfaces
+            Source file extensions are mapped to indigo types (see _Migrated_Extensions),
+                f.e. CMake uses .cppm for module interfaces, indigo builds them as .ixx.
+                Files are only renamed on disk if @rename_extensions is set,
+                Otherwise they are recorded in Subproject.renames and left out of the build.
+                Files whose indigo name is already taken are never renamed and are left out of sources.
+
+            If @update is set and f'{directory}/__init__.py' already exists,
+                Removed source files are dropped and new ones are appended,
+                Manually ordered sources keep their order.
 
             You might need to extract the `int main(int, char**)` function to main.cpp,
                 If subproject is expected to produce executable.
@@ -98,7 +157,13 @@ class Subproject:
         directory = directory if fs.os.path.isabs(directory) else fs.join(fs.current_directory(), directory)
         __init__py = fs.join(directory, '__init__.py')
         if fs.path_exists(__init__py):
-            return Subproject._Import(__init__py)
+            subproject = Subproject._Import(__init__py)
+            if update:
+                subproject._Update_Sources(
+                    *Subproject._Scan_Sources(fs.join(directory, subproject.source_directory), exclude, rename_extensions),
+                    __init__py
+                )
+            return subproject
         
         abs_source_directory = fs.join(directory, source_directory)
         abs_tests_directory = fs.join(directory, tests_directory)
@@ -110,24 +175,7 @@ class Subproject:
         if not fs.path_exists(abs_include_directory):
             include_directory = None
         
-        sources = []
-        for dir, _, files in fs.os.walk(abs_source_directory, topdown=False):
-            for file in files:
-                match fs.get_file_extension(file):
-                    case '.hxx':
-                        pass
-                    case '.ixx':
-                        pass
-                    case '.cxx':
-                        pass
-                    case '.c':
-                        pass
-                    case '.cpp':
-                        pass
-                    case _:
-                        continue
-                abs_file = fs.join(dir, file)
-                sources.append(fs.relative_directory(abs_file, abs_source_directory))
+        sources, renames = Subproject._Scan_Sources(abs_source_directory, exclude, rename_extensions)
 
         assert sources, f'source files were not found in directory \'{abs_source_directory}\''
 
@@ -142,11 +190,59 @@ class Subproject:
             sources = sources,
             dependencies = [],
             source_directory = source_directory,
-            tests_directory = tests_directory
+            tests_directory = tests_directory,
+            renames = renames
         )
         subproject._Export(__init__py)
         return subproject
 
+    @staticmethod
+    def _Scan_Sources(abs_source_directory: fs.PathLike, exclude: list[str], rename_extensions: bool) -> tuple[list[str], dict[str, str]]:
+        """
+            Returns (sources, renames), see migrate().
+        """
+        assert fs.path_exists(abs_source_directory), f'no such directory: {abs_source_directory}'
+        sources = []
+        renames = dict()
+        collisions = []
+        for file in fs.scan_directory(abs_source_directory, exclude):
+            extension = fs.get_file_extension(file)
+            migrated_extension = Subproject._Migrated_Extensions.get(extension.lower())
+            if not migrated_extension:
+                continue
+            if migrated_extension != extension:
+                file = fs.os.path.normpath(file)
+                migrated_file = file[:-len(extension)] + migrated_extension
+                abs_migrated_file = fs.join(abs_source_directory, migrated_file)
+                if fs.path_exists(abs_migrated_file):
+                    # not buildable under its own name and can't be renamed
+                    collisions.append((file, migrated_file))
+                elif rename_extensions:
+                    fs.os.rename(fs.join(abs_source_directory, file), abs_migrated_file)
+                    fs.invalidate(fs.join(abs_source_directory, file), abs_migrated_file)
+                    sources.append(migrated_file)
+                else:
+                    renames[file] = migrated_file
+                continue
+            sources.append(file)
+
+        for file, migrated_file in collisions:
+            cts_print_warning(section='migrate', text=f'{file} :: left out of sources, {migrated_file} already exists')
+        if renames:
+            cts_print_warning(section='migrate',
+                text=f'{len(renames)} sources with foreign extensions are listed in renames, not built until renamed (rename_extensions=True)')
+        return Subproject._Sorted_Sources([ fs.os.path.normpath(file) for file in dict.fromkeys(sources) ]), renames
+
+    def _Update_Sources(self, sources: list[str], renames: dict[str, str], __init__py: fs.PathLike):
+        found = { fs.os.path.normcase(s): s for s in sources }
+        kept = [ s for s in self.sources if fs.os.path.normcase(fs.os.path.normpath(s)) in found ]
+        listed = set(fs.os.path.normcase(fs.os.path.normpath(s)) for s in kept)
+        updated = Subproject._Normalized_Sources(kept + [ s for k, s in found.items() if k not in listed ])
+        if updated != self.sources or renames != self.renames:
+            self.sources = updated
+            self.renames = renames
+            self._Export(__init__py)
+
     @staticmethod
     def generate(path: fs.PathLike,
         with_hxx: bool = True,
@@ -294,3 +390,29 @@ class Subproject:
         self.dependencies.append(name)
         self.export(True)
 
+
+if __name__ == '__main__':
+    def test():
+        """
+            Checks that migrated sources are buildable when foreign extensions collide with indigo ones.
+        """
+        import tempfile
+        # manifests are imported as indigo.Subproject, not as this module's class
+        from indigo import Subproject
+        with tempfile.TemporaryDirectory() as tmp:
+            directory = fs.join(tmp, 'migrated')
+            fs.os.makedirs(fs.join(directory, 'src'))
+            for file in ('a.cc', 'a.cpp', 'b.cc', 'm.cppm', 'main.cpp'):
+                open(fs.join(directory, 'src', file), 'w').close()
+
+            subproject = Subproject.migrate(directory)
+            assert subproject.sources == [ 'a.cpp', 'main.cpp' ], subproject.sources
+            assert subproject.renames == { 'b.cc': 'b.cpp', 'm.cppm': 'm.ixx' }, subproject.renames
+
+            subproject = Subproject.migrate(directory, update=True, rename_extensions=True)
+            assert subproject.renames == {}, subproject.renames
+            resolved = subproject.resolve_sources()
+            assert 'a.cc' not in resolved and all(fs.get_file_extension(s) in Subproject._Sources_Order for s in resolved), resolved
+            assert fs.path_exists(fs.join(directory, 'src', 'a.cc')), 'colliding file is kept on disk'
+            print(f'[migrated sources are buildable: {resolved}]')
+    test()
@@ -8,7 +8,8 @@ from indigo.filesystem import PathLike, \
     create_directory, remove_directory, \
     clean_directory, list_directory, \
     relative_directory, current_directory, \
-    is_modified_after, get_dot_path, get_file_name, get_file_extension
+    is_modified_after, get_dot_path, get_file_name, get_file_extension, \
+    snapshot
 
 from indigo.options import Options
 from indigo.console_text_styles import *
@@ -31,6 +32,8 @@ class Target(ABC):
     cache_directory: PathLike = None
     tests_directory: PathLike = None
     output_directory: PathLike = None
+    # name of solution configuration, None if options are used as declared by subproject
+    configuration: str = None
 
     header_units: set[PathLike] = field(default_factory=set)
     module_interfaces: set[PathLike] = field(default_factory=set)
@@ -45,6 +48,9 @@ class Target(ABC):
     _subtargets: list['Target'] = field(default_factory=list, init=False, repr=False, hash=False, compare=False, kw_only=True)
     _is_visited: bool = field(default=False, init=False, repr=False, hash=False, compare=False, kw_only=True)
     _should_relink: bool = field(default=False, init=False, repr=False, hash=False, compare=False, kw_only=True)
+    _build_started: float = field(default=0.0, init=False, repr=False, hash=False, compare=False, kw_only=True)
+    _profile_guided: bool = field(default=False, init=False, repr=False, hash=False, compare=False, kw_only=True)
+    _publish_requested: bool = field(default=False, init=False, repr=False, hash=False, compare=False, kw_only=True)
 
     def __post_init__(self):
         assert self.name
@@ -68,6 +74,10 @@ class Target(ABC):
         if not self.root_directory:
             self.root_directory = current_directory()
 
+    @property
+    def display_name(self) -> str:
+        return f'{self.name}:{self.configuration}' if self.configuration else self.name
+
     @property
     def executable_path(self) -> PathLike:
         return join(self.build_directory, f'{self.name}.exe')
@@ -136,6 +146,7 @@ class Target(ABC):
         if not modified_files:
             for subtarget in self._subtargets:
                 if not subtarget.static_library_path \
+                    or subtarget.is_relinking() \
                     or is_modified_after(subtarget.static_library_path, self.static_library_path):
                     self._should_relink = True
                     break
@@ -145,18 +156,36 @@ class Target(ABC):
         self._on_build(True)
 
         from time import time
-        _start = time()
+        self._build_started = time()
 
         for modified_file in modified_files:
             self.compile_source_file(modified_file)
         
-        if self.main_translation_unit:
+        # might finish asynchronously, calls _on_built once the artifact is produced
+        if self.main_translation_unit and self._profile_guided:
+            self.build_profile_guided_executable()
+        elif self.main_translation_unit:
             self.build_executable()
         else:
             self.build_static_library()
 
-        _finish = time()
-        self._on_built(_finish - _start)
+    def pgo(self):
+        """
+            Builds this Target with profile-guided optimization of its executable.
+            Libraries are built as usual, they are optimized as part of executables linking them.
+        """
+        self._profile_guided = True
+        # executable is relinked even if nothing was modified
+        self._should_relink = True
+        self.build(force=False)
+
+    def publish(self):
+        """
+            Builds this Target and publishes its artifacts to output_directory once the build is awaited.
+        """
+        assert self.output_directory
+        self._publish_requested = True
+        self.build(force=False)
 
     def test(self, force: bool = False):
         if not self.tests_directory or not path_exists(self.tests_directory):
@@ -177,7 +206,10 @@ class Target(ABC):
             obj = self.compile_unit_test(uxx)
             self.build_unit_test(uxx, obj)
 
-        unit_test_exes = list_directory(self.build_directory, prefix='test_', suffix='.exe')
+        # unit tests that are still being linked are not listed yet
+        unit_test_exes = set(list_directory(self.build_directory, prefix='test_', suffix='.exe'))
+        unit_test_exes.update( get_file_name(self.unit_test_executable(uxx)) for uxx in unit_tests_to_build )
+        unit_test_exes = sorted(unit_test_exes)
         self._on_test(bool(unit_test_exes))
 
         for exe in unit_test_exes:
@@ -189,6 +221,19 @@ class Target(ABC):
             raise TestingError()
 
 
+    def is_relinking(self) -> bool:
+        """
+            Returns True if this Target's library is being (re)produced in the current build.
+        """
+        return False
+
+    def await_build(self):
+        """
+            Awaits asynchronous build steps if any.
+            Raises CompilationError on failure.
+        """
+        pass
+
     @abstractmethod
     def resolve_modified_dependencies(self, modified_files: list[PathLike]) -> list[PathLike]:
         """
@@ -257,6 +302,13 @@ class Target(ABC):
         """
         pass
 
+    @abstractmethod
+    def publish_artifacts(self):
+        """
+            Materializes built artifacts in output_directory and writes their manifest.
+        """
+        pass
+
     @abstractmethod
     def compile_header_unit(self, hxx: PathLike):
         pass
@@ -283,7 +335,7 @@ class Target(ABC):
 
 
     @abstractmethod
-    def build_unit_test(self, obj: PathLike):
+    def build_unit_test(self, uxx: PathLike, obj: PathLike):
         """
             Produces unit test executable from given .obj file.
         """
@@ -309,11 +361,18 @@ class Target(ABC):
             Produces executable from this Project's compiled object files if main translation unit was discovered.
         """
         pass
+
+    @abstractmethod
+    def build_profile_guided_executable(self):
+        """
+            Produces executable instrumented for profiling, trains it and relinks it optimized with collected profile.
+        """
+        pass
     
     def print_config(self):
-        #cts_print(section='project', subsection=self.name, text=f'configuration')
+        #cts_print(section='project', subsection=self.display_name, text=f'configuration')
         print()
-        print(f'[{cts_header("project")}: {cts_okcyan(self.name)}]')
+        print(f'[{cts_header("project")}: {cts_okcyan(self.display_name)}]')
         cts_print_config_category('directories')
         for dir in ("root directory", "source directory", "tests directory", "build directory", "cache directory"):
             cts_print_config_pair(dir, getattr(self, dir.replace(' ', '_')))
@@ -356,17 +415,27 @@ class Target(ABC):
 
         self._on_config()
 
-    def on_command(self, args: Namespace):
-        for subtarget in self._subtargets:
-            if subtarget._is_visited:
-                continue
-            subtarget.on_command(args)
+    def on_command(self, args: Namespace, wait: bool = True):
+        """
+            Executes command on subtargets and then on this Target.
+            If @wait is False, asynchronous build steps are left running, 
+                caller has to await_build() later.
+        """
+        with snapshot():
+            for subtarget in self._subtargets:
+                if subtarget._is_visited:
+                    continue
+                subtarget.on_command(args, wait=False)
+
+            self._is_visited = True
 
-        self._is_visited = True
+            if not args.target or args.target == self.name:
+                self._on_command(args)
 
-        if args.target and not args.target == self.name:
-            return
+            if wait:
+                self.await_build()
 
+    def _on_command(self, args: Namespace):
         match args.command:
             case 'build': 
                 self.build(force=False)
@@ -376,6 +445,10 @@ class Target(ABC):
                 self.clean()
             case 'test': 
                 self.test()
+            case 'pgo':
+                self.pgo()
+            case 'publish' | 'install':
+                self.publish()
             case 'config':
                 self.print_config()
             case _: